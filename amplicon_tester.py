@@ -1,9 +1,24 @@
+import argparse
 import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from amplicon_tester._taxonomy import Taxonomy, deepest_matching_rank, core_species_name
-from amplicon_tester._vsearch import run_vsearch_if_needed, parse_vsearch
-from amplicon_tester._io_utils import load_expected_taxonomy, load_amplicon_json, write_fasta, save_summary
-from amplicon_tester._stats import taxonomy_stats
+import pandas as pd
+from amplicon_tester._taxonomy import Taxonomy
+from amplicon_tester._vsearch import run_vsearch_sharded, load_best_hits_frame, iter_vsearch_pipe, collect_top_k_hits
+from amplicon_tester._io_utils import load_expected_taxonomy, iter_amplicon_json, iter_fasta, write_fasta, save_summary, save_parquet, open_text, strip_compression_suffix
+from amplicon_tester._stats import taxonomy_stats, patch_taxonomy_stats, STATS_INPUT_COLUMNS
+from amplicon_tester._ipcr import PrimerPair, iter_pcr_amplicons
+from amplicon_tester._derep import dereplicate_to_fasta, iter_unique_amplicons, save_members, load_members, member_ids, write_singletons
+from amplicon_tester._summary import summarize_frame, hits_to_frame, region_hits
+from amplicon_tester._cache import StageCache
+from amplicon_tester._batch import PrimerJob, load_primer_jobs, run_batch, share_per_job
+from amplicon_tester._profiling import RunProfiler
+from amplicon_tester._pipeline import Stage, StageGraph
+from amplicon_tester._kmer import ensure_kmer_index, classify_kmer
+from amplicon_tester._faidx import ensure_fasta_index
+from amplicon_tester._incremental import RunFingerprint, reference_hashes, amplicon_hashes, changed_summary_rows
 
 # --- Logging setup ---
 logging.basicConfig(
@@ -17,65 +32,591 @@ VSEARCH_DB_PATH =    Path("/home/erick/Documents/unite-test/silva-16S-primer-tes
 TAXONOMY_FILE_PATH = Path("/home/erick/Documents/unite-test/silva-16S-primer-tester/taxonomy.results.txt")
 IPCR_JSON =          Path("/home/erick/Documents/unite-test/silva-16S-primer-tester/results.json")
 
+# Where amplicons come from: "ipcr_json" reads IPCR_JSON, "builtin" scans
+# REFERENCE_FASTA with the in-process in silico PCR engine.
+AMPLICON_SOURCE =    "ipcr_json"
+REFERENCE_FASTA =    VSEARCH_DB_PATH
+PRIMER_REGION =      "ITS"
+PRIMER_PAIR =        PrimerPair(forward="CTACCTGCGGARGGATCA", reverse="GAGATCCRTTGYTRAAAGTT")
+PCR_MAX_MISMATCHES = 0
+PCR_MIN_LENGTH =     50
+PCR_MAX_LENGTH =     2000
+PCR_PROCESSES =      None   # None = all cores
+
+# Collapse identical amplicons so VSEARCH aligns each unique sequence once.
+DEREPLICATE =        True
+
+VSEARCH_ID =         0.97
+# VSEARCH layout: VSEARCH_SHARDS concurrent processes x VSEARCH_THREADS threads each.
+# Queries are split into shards of equal total residues; failed shards retry on their own.
+VSEARCH_SHARDS =     1
+VSEARCH_THREADS =    24
+VSEARCH_RETRIES =    2
+# Hits reported per query (vsearch --maxaccepts). With more than 1, a sequence whose equally
+# good top hits come from several lineages is flagged "ambiguous" and only counts as
+# differentiable if all of them match at species level. At most this many hits per query
+# are held in memory, however many vsearch writes.
+VSEARCH_MAXACCEPTS = 1
+# Pipe mode streams amplicons into vsearch's stdin and parses hits from its stdout while
+# it runs. Intermediate FASTA/TSV files (and the stage cache) are skipped unless exported.
+VSEARCH_PIPE =       False
+PIPE_EXPORT_FASTA =  False
+PIPE_EXPORT_TSV =    False
+
+# Region mode classifies each amplicon against the other amplicons of the same primer pair
+# (leave-one-out) instead of against full-length VSEARCH_DB_PATH sequences, so
+# "differentiable" means the amplified region alone tells the taxa apart. Only amplicons
+# that are unique after dereplication need aligning; identical amplicons hit each other
+# at 100%. Works with the vsearch classifier, without pipe mode.
+REGION_DB =          False
+
+# Classifier: "vsearch" aligns every amplicon (exact); "kmer" screens them in-process
+# against a persistent k-mer index of VSEARCH_DB_PATH, built once in KMER_INDEX_DIR and
+# reused by later runs. Identity is estimated from shared k-mers, so confirm shortlisted
+# primer pairs with "vsearch". Needs no vsearch binary.
+CLASSIFIER =         "vsearch"
+KMER_INDEX_DIR =     Path(".kmer_index")
+KMER_SIZE =          11
+KMER_PROCESSES =     None   # None = all cores
+# K-mers found in more references than this are neither looked up nor scored, which keeps
+# conserved regions from dominating the run time (None = look up all).
+KMER_MAX_POSTINGS =  10_000
+
+# Stage artifacts are cached by input content + parameters, so switching primers,
+# databases or VSEARCH settings never reuses stale results.
+CACHE_DIR =          ".stage_cache"
+CACHE_MAX_BYTES =    50 * 1024**3
+# Completion markers of the summary, stats and Parquet stages, inside each work directory.
+STAGE_MARKER_DIR =   ".stages"
+# Offset index of VSEARCH_DB_PATH for --drilldown (None = "<db>.fai"). When it cannot be
+# written there, it goes to CACHE_DIR/.faidx/; failing that, the database is scanned.
+REFERENCE_FAI =      None
+
+# Incremental mode keeps a fingerprint of each finished run (reference and amplicon hash,
+# lineage and summary fields per sequence, best hit per amplicon) in INCREMENTAL_DIR inside
+# the work directory. After a database update only new or changed amplicons, and those whose
+# best hit was changed or removed, are aligned against the whole database; the rest only
+# against the new and changed references. The taxonomy stats are patched with the changed
+# summary rows. With more than INCREMENTAL_MAX_CHANGED (fraction) of the references or
+# amplicons changed, VSEARCH reruns in full. VSEARCH classifier only, without pipe or region mode.
+INCREMENTAL =        False
+INCREMENTAL_DIR =    ".incremental"
+INCREMENTAL_MAX_CHANGED = 0.5
+
 FASTA_OUT =          "all_amplicons.fasta"
+REGION_QUERIES_OUT = "all_amplicons.singletons.fasta"
+MEMBERS_OUT =        "all_amplicons.members.tsv"
 VSEARCH_TSV_OUT =    "all_amplicons.vsearch.tsv"
 SUMMARY_JSONL =      "differentiation_summary.vsearch.jsonl"
 SUMMARY_CSV =        "differentiation_summary.vsearch.csv"
 TAX_STATS_CSV =      "taxonomy_summary.csv"
+# Also write typed Parquet copies (summary and taxonomy stats, next to their CSVs) for
+# the Streamlit app to load directly. Needs pyarrow or fastparquet; skipped otherwise.
+WRITE_PARQUET =      True
 
-def summarize(expected, amplicons, vsearch_hits):
-    logger.info("Building summary for each expected taxonomy entry.")
-    summary = []
-    for seq_id, exp_tax in expected.items():
-        out = {
-            "sequence_id": seq_id,
-            "expected_taxonomy": str(exp_tax),
-            "amplifies": False,
-            "differentiable": False,
-            "deepest_rank": None,
-            "top_vsearch_taxonomy": None,
-            "top_vsearch_pident": None,
-            "top_vsearch_sseqid": None
-        }
-        amplicon = amplicons.get(seq_id)
-        top = vsearch_hits.get(seq_id)
-        if amplicon:
-            out["amplifies"] = True
-            if top and top.taxonomy:
-                out["top_vsearch_taxonomy"] = str(top.taxonomy)
-                out["top_vsearch_pident"] = top.pident
-                out["top_vsearch_sseqid"] = top.sseqid
-                match_rank = deepest_matching_rank(top.taxonomy, exp_tax)
-                out["deepest_rank"] = match_rank
-                out["differentiable"] = match_rank in {"species"}
-        summary.append(out)
-    logger.info("Checking for genus-to-species upgrades (core name match).")
-    for row in summary:
-        if (row["amplifies"] == "True" or row["amplifies"] == True) and row.get("deepest_rank") == "genus":
-            exp_core = core_species_name(row["expected_taxonomy"])
-            hit_core = core_species_name(row["top_vsearch_taxonomy"] or "")
-            if exp_core and hit_core and exp_core == hit_core:
-                row["deepest_rank"] = "species"
-                row["differentiable"] = "True"
-    logger.info("Summary building complete.")
-    return summary
+# Each run writes a JSON report (wall/CPU time, peak RSS, records/s per stage) into its
+# work directory. PROFILE_STAGE names one stage (e.g. "summarize") to capture in detail:
+# PROFILE_MODE "cprofile" writes profile.<stage>.prof, "tracemalloc" the top allocation sites.
+RUN_REPORT =         "run_report.json"
+PROFILE_STAGE =      None
+PROFILE_MODE =       "cprofile"
 
-def main():
-    logger.info("Pipeline started.")
-    expected = load_expected_taxonomy(TAXONOMY_FILE_PATH, Taxonomy, logger)
-    amplicons = load_amplicon_json(IPCR_JSON, logger)
-    import os
-    if not os.path.exists(FASTA_OUT):
-        write_fasta(amplicons, FASTA_OUT, logger)
+# Batch mode (--batch JOBS.tsv): per-pair work files go to BATCH_WORK_DIR/<name>/,
+# and each pair's taxonomy summary lands in PRIMER_OUT_DIR/<REGION>_<FWD>_<REV>.csv.
+BATCH_WORK_DIR =     Path("batch_runs")
+PRIMER_OUT_DIR =     Path("primers")
+BATCH_WORKERS =      4
+
+def amplicon_stage_params(job):
+    params = {"source": "ipcr_json" if job.ipcr_json else "builtin", "dereplicate": DEREPLICATE}
+    if not job.ipcr_json:
+        params.update({
+            "forward": job.pair.forward,
+            "reverse": job.pair.reverse,
+            "max_mismatches": PCR_MAX_MISMATCHES,
+            "min_length": PCR_MIN_LENGTH,
+            "max_length": PCR_MAX_LENGTH,
+        })
+    return params
+
+def amplicon_stream(job, logger):
+    """Returns an iterator of (sequence ID, amplicon) pairs for the job's primer pair."""
+    if job.ipcr_json:
+        return iter_amplicon_json(job.ipcr_json, logger)
+    return iter_pcr_amplicons(
+        REFERENCE_FASTA, job.pair, logger,
+        max_mismatches=PCR_MAX_MISMATCHES,
+        min_length=PCR_MIN_LENGTH,
+        max_length=PCR_MAX_LENGTH,
+        processes=PCR_PROCESSES
+    )
+
+def write_amplicons(job, fasta_out, members_out, logger):
+    """Generates the amplicon FASTA; returns (amplified IDs, dereplication members or None)."""
+    stream = amplicon_stream(job, logger)
+    if DEREPLICATE:
+        members = dereplicate_to_fasta(stream, fasta_out, logger)
+        save_members(members, members_out, logger)
+        return member_ids(members), members
+    return write_fasta(stream, fasta_out, logger), None
+
+def classify_piped(job, fasta_out, members_out, vsearch_tsv_out, profiler, logger):
+    """Streams amplicons through VSEARCH without intermediate files; returns (amplified IDs, members or None, top-hit loader, None)."""
+    with profiler.stage("amplicons+vsearch") as stage:
+        stream = amplicon_stream(job, logger)
+        amplified = set()
+        members = {} if DEREPLICATE else None
+
+        def first_per_id():
+            for seq_id, amplicon in stream:
+                if seq_id not in amplified:
+                    amplified.add(seq_id)
+                    yield seq_id, amplicon["seq"]
+
+        queries = iter_unique_amplicons(stream, members) if DEREPLICATE else first_per_id()
+        rows = iter_vsearch_pipe(
+            queries, VSEARCH_DB_PATH, logger,
+            identity=VSEARCH_ID,
+            threads=VSEARCH_THREADS,
+            fasta_export=fasta_out if PIPE_EXPORT_FASTA else None,
+            tsv_export=vsearch_tsv_out if PIPE_EXPORT_TSV else None,
+            maxaccepts=VSEARCH_MAXACCEPTS
+        )
+        # Subject lineages are looked up by summarize_frame, so parsing needs no expected taxonomy
+        # and runs while it is still loading.
+        vsearch_hits = hits_to_frame(collect_top_k_hits(rows, VSEARCH_MAXACCEPTS, logger))
+        if members is not None:
+            if PIPE_EXPORT_FASTA:
+                save_members(members, members_out, logger)
+            amplified = member_ids(members)
+        stage.records = len(amplified)
+    # Pipe mode has no stage-cache keys, so its results are never resumed.
+    return amplified, members, lambda: vsearch_hits, None
+
+def cached_amplicons(job, cache, fasta_out, members_out, profiler, logger):
+    """Writes the amplicon FASTA through the stage cache; returns (amplified IDs, members or None, cache key)."""
+    amplicon_input = job.ipcr_json or REFERENCE_FASTA
+    amplicon_artifacts = {"amplicons.fasta": fasta_out}
+    if DEREPLICATE:
+        amplicon_artifacts["members.tsv"] = members_out
+    with profiler.stage("amplicons") as stage:
+        amplicon_key = cache.key("amplicons", [amplicon_input], amplicon_stage_params(job))
+        stage.cached = cache.fetch(amplicon_key, amplicon_artifacts)
+        if stage.cached:
+            if DEREPLICATE:
+                members = load_members(members_out, logger)
+                amplicons = member_ids(members)
+            else:
+                members = None
+                amplicons = {seq_id for seq_id, _ in iter_fasta(fasta_out)}
+        else:
+            amplicons, members = write_amplicons(job, fasta_out, members_out, logger)
+            cache.store(amplicon_key, amplicon_artifacts)
+        # A restored FASTA keeps the cached file's modification time, so an old offset index could look current.
+        if os.path.exists(f"{fasta_out}.fai"):
+            os.remove(f"{fasta_out}.fai")
+        stage.records = len(amplicons)
+    return amplicons, members, amplicon_key
+
+def region_vsearch(fasta_out, members, vsearch_tsv_out, logger):
+    """Aligns the amplicons that are unique after dereplication against all other amplicons (REGION_DB mode)."""
+    queries = fasta_out
+    if members is not None:
+        queries = os.path.join(os.path.dirname(vsearch_tsv_out), REGION_QUERIES_OUT)
+        if not write_singletons(fasta_out, members, queries, logger):
+            open_text(vsearch_tsv_out, "w").close()
+            return
+    run_vsearch_sharded(
+        queries, fasta_out, vsearch_tsv_out, logger,
+        identity=VSEARCH_ID,
+        shards=VSEARCH_SHARDS,
+        threads_per_shard=VSEARCH_THREADS,
+        retries=VSEARCH_RETRIES,
+        exclude_self=True
+    )
+
+def classification_params(kmer_index=None):
+    """Returns the parameters that determine the classification hits (part of their cache key)."""
+    params = {"id": VSEARCH_ID, "strand": "both"}
+    if kmer_index is not None:
+        params.update({"classifier": "kmer", "k": kmer_index.k, "max_postings": KMER_MAX_POSTINGS, "scoring": 2})
+    if REGION_DB:
+        params.update({"db": "amplicons", "dereplicate": DEREPLICATE})
+    elif VSEARCH_MAXACCEPTS != 1:
+        params["maxaccepts"] = VSEARCH_MAXACCEPTS
+    return params
+
+def cached_vsearch(cache, fasta_out, vsearch_tsv_out, members, n_queries, kmer_index, fingerprint, profiler, logger):
+    """
+    Classifies the amplicon FASTA (VSEARCH, or the k-mer index when given) through the stage cache; returns the cache key.
+
+    On a cache miss with a matching run fingerprint, VSEARCH only aligns what the database
+    update touched (see `RunFingerprint.update_hits`).
+    """
+    vsearch_artifacts = {"hits.tsv": vsearch_tsv_out}
+    params = classification_params(kmer_index)
+    inputs = [fasta_out] if REGION_DB else [fasta_out, VSEARCH_DB_PATH]
+    with profiler.stage("vsearch" if kmer_index is None else "kmer_classify") as stage:
+        vsearch_key = cache.key("vsearch", inputs, params)
+        stage.cached = cache.fetch(vsearch_key, vsearch_artifacts)
+        if not stage.cached:
+            if REGION_DB:
+                region_vsearch(fasta_out, members, vsearch_tsv_out, logger)
+            elif kmer_index is not None:
+                classify_kmer(
+                    fasta_out, kmer_index, vsearch_tsv_out, logger,
+                    identity=VSEARCH_ID,
+                    processes=KMER_PROCESSES,
+                    max_hits=VSEARCH_MAXACCEPTS,
+                    max_postings=KMER_MAX_POSTINGS
+                )
+            else:
+                def align(queries, db_path, tsv_out):
+                    run_vsearch_sharded(
+                        queries, db_path, tsv_out, logger,
+                        identity=VSEARCH_ID,
+                        shards=VSEARCH_SHARDS,
+                        threads_per_shard=VSEARCH_THREADS,
+                        retries=VSEARCH_RETRIES,
+                        maxaccepts=VSEARCH_MAXACCEPTS
+                    )
+
+                updated = fingerprint is not None and fingerprint.matches(params) and fingerprint.update_hits(
+                    fasta_out, str(VSEARCH_DB_PATH), vsearch_tsv_out, align, logger, INCREMENTAL_MAX_CHANGED,
+                    top_k=VSEARCH_MAXACCEPTS
+                )
+                if not updated:
+                    align(fasta_out, VSEARCH_DB_PATH, vsearch_tsv_out)
+            cache.store(vsearch_key, vsearch_artifacts)
+        stage.records = n_queries
+    return vsearch_key
+
+def load_kmer_index(profiler, logger):
+    """Opens the reference k-mer index, building it on first use."""
+    with profiler.stage("kmer_index") as stage:
+        index = ensure_kmer_index(str(VSEARCH_DB_PATH), str(KMER_INDEX_DIR), KMER_SIZE, logger, KMER_PROCESSES)
+        stage.records = index.meta["n_sequences"]
+    return index
+
+def run_params(job):
+    """Returns the settings recorded in a job's run report."""
+    params = {
+        "job": job.name,
+        "forward": job.pair.forward,
+        "reverse": job.pair.reverse,
+        "amplicon_source": "ipcr_json" if job.ipcr_json else "builtin",
+        "dereplicate": DEREPLICATE,
+        "vsearch_db": str(VSEARCH_DB_PATH),
+        "vsearch_id": VSEARCH_ID,
+        "vsearch_maxaccepts": VSEARCH_MAXACCEPTS,
+        "classifier": CLASSIFIER,
+        "region_db": REGION_DB,
+        "incremental": INCREMENTAL,
+        "vsearch_pipe": VSEARCH_PIPE,
+        "vsearch_shards": VSEARCH_SHARDS,
+        "vsearch_threads": VSEARCH_THREADS,
+    }
+    if not job.ipcr_json:
+        params["pcr_processes"] = PCR_PROCESSES or os.cpu_count()
+    if CLASSIFIER == "kmer":
+        params.update({"kmer_size": KMER_SIZE, "kmer_max_postings": KMER_MAX_POSTINGS})
+    return params
+
+def new_profiler(name, work_dir, logger):
+    return RunProfiler(name, logger, out_dir=work_dir, profile_stage=PROFILE_STAGE, profile_mode=PROFILE_MODE)
+
+def pipeline_stages(job, expected, cache, work_dir, stats_csv, profiler, logger):
+    """
+    Returns the stage graph of one primer pair.
+
+    Loading the expected taxonomy only meets the amplicon/VSEARCH chain at the summary, so
+    it runs alongside amplicon generation and VSEARCH. The summary, taxonomy stats and
+    Parquet stages are resumed from completion markers when their inputs (identified by
+    the stage-cache keys of the amplicons and VSEARCH hits) are unchanged. In incremental
+    mode a last stage fingerprints the run for the next database update.
+    """
+    fasta_out = os.path.join(work_dir, FASTA_OUT)
+    members_out = os.path.join(work_dir, MEMBERS_OUT)
+    vsearch_tsv_out = os.path.join(work_dir, VSEARCH_TSV_OUT)
+    summary_jsonl = os.path.join(work_dir, SUMMARY_JSONL)
+    summary_csv = os.path.join(work_dir, SUMMARY_CSV)
+    summary_parquet = str(Path(strip_compression_suffix(summary_csv)).with_suffix(".parquet"))
+    stats_parquet = str(Path(strip_compression_suffix(stats_csv)).with_suffix(".parquet"))
+
+    if CLASSIFIER not in ("vsearch", "kmer"):
+        raise ValueError(f"CLASSIFIER must be 'vsearch' or 'kmer', got {CLASSIFIER!r}")
+    if REGION_DB and CLASSIFIER != "vsearch":
+        raise ValueError("REGION_DB needs CLASSIFIER = 'vsearch'")
+    incremental = INCREMENTAL and CLASSIFIER == "vsearch" and not REGION_DB and not VSEARCH_PIPE
+    fingerprint = RunFingerprint(os.path.join(work_dir, INCREMENTAL_DIR)) if incremental else None
+    if VSEARCH_PIPE and CLASSIFIER == "vsearch" and not REGION_DB:
+        classify = "amplicons+vsearch"
+        stages = [Stage(classify, lambda _: classify_piped(job, fasta_out, members_out, vsearch_tsv_out, profiler, logger))]
     else:
-        logger.info(f"{FASTA_OUT} already exists, skipping FASTA writing.")
-    run_vsearch_if_needed(FASTA_OUT, VSEARCH_DB_PATH, VSEARCH_TSV_OUT, logger)
-    vsearch_hits = parse_vsearch(VSEARCH_TSV_OUT, expected, logger)
-    summary = summarize(expected, amplicons, vsearch_hits)
-    save_summary(summary, SUMMARY_JSONL, SUMMARY_CSV, logger)
+        classify = "vsearch"
+
+        loaded = []
+
+        def load_hits():
+            # Loaded once, by the summary stage, and reused by the fingerprint stage.
+            if not loaded:
+                with profiler.stage("load_hits") as stage:
+                    # Region mode keeps one leave-one-out hit per amplicon, so ties are not listed there.
+                    top_k = 1 if REGION_DB else VSEARCH_MAXACCEPTS
+                    loaded.append(load_best_hits_frame(vsearch_tsv_out, logger, top_k=top_k))
+                    stage.records = len(loaded[0])
+            return loaded[0]
+
+        def vsearch(inputs):
+            amplicons, members, amplicon_key = inputs["amplicons"]
+            vsearch_key = cached_vsearch(
+                cache, fasta_out, vsearch_tsv_out, members, len(members or amplicons), inputs.get("kmer_index"),
+                fingerprint, profiler, logger
+            )
+            # The hits are loaded by the summary stage, and not at all when it is resumed.
+            return amplicons, members, load_hits, f"{amplicon_key}:{vsearch_key}"
+
+        stages = [Stage("amplicons", lambda _: cached_amplicons(job, cache, fasta_out, members_out, profiler, logger))]
+        if CLASSIFIER == "kmer":
+            # The index is opened (or built) while the amplicons are generated.
+            stages.append(Stage("kmer_index", lambda _: load_kmer_index(profiler, logger)))
+            stages.append(Stage(classify, vsearch, deps=("amplicons", "kmer_index")))
+        else:
+            stages.append(Stage(classify, vsearch, deps=("amplicons",)))
+
+    def results_key(inputs):
+        classification_key = inputs[classify][3]
+        if classification_key is None:
+            return None
+        return cache.key("results", [TAXONOMY_FILE_PATH], {"classification": classification_key, "stats_csv": stats_csv})
+
+    def resumed(name, result):
+        with profiler.stage(name) as stage:
+            stage.cached = True
+        return result
+
+    def summary(inputs):
+        amplicons, members, load_hits, _ = inputs[classify]
+        expected_taxa = inputs["expected_taxonomy"]
+        vsearch_hits = load_hits()
+        with profiler.stage("summarize") as stage:
+            if REGION_DB:
+                vsearch_hits = region_hits(vsearch_hits, members, expected_taxa)
+            frame = summarize_frame(
+                expected_taxa, amplicons, vsearch_hits, logger, members=members, hits_by_member=REGION_DB
+            )
+            stage.records = len(frame)
+        with profiler.stage("save_summary") as stage:
+            save_summary(frame, summary_jsonl, summary_csv, logger)
+            stage.records = len(frame)
+        return frame
+
+    def stats(inputs):
+        with profiler.stage("taxonomy_stats") as stage:
+            summary_frame = inputs["summary"]
+            if fingerprint is not None and not isinstance(summary_frame, str) and fingerprint.stats_current(stats_csv):
+                removed, added = changed_summary_rows(fingerprint.load_fingerprint(), summary_frame)
+                frame = patch_taxonomy_stats(stats_csv, removed, added, stats_csv, logger)
+            else:
+                frame = taxonomy_stats(summary_frame, stats_csv, logger)
+            stage.records = len(frame)
+        return frame
+
+    def save_fingerprint(inputs):
+        _, members, load_hits, _ = inputs[classify]
+        summary_frame = inputs["summary"]
+        if isinstance(summary_frame, str):
+            with open_text(summary_frame) as fh:
+                summary_frame = pd.read_csv(fh, usecols=["sequence_id"] + STATS_INPUT_COLUMNS)
+        hits = load_hits()
+        with profiler.stage("fingerprint") as stage:
+            fingerprint.save(
+                reference_hashes(str(VSEARCH_DB_PATH), logger), amplicon_hashes(fasta_out, members),
+                summary_frame, hits, classification_params(), stats_csv, logger
+            )
+            stage.records = len(summary_frame)
+
+    def parquet(inputs):
+        with profiler.stage("parquet") as stage:
+            # Resumed stages hand over their CSV paths instead of frames.
+            summary_frame = inputs["summary"]
+            if isinstance(summary_frame, str):
+                with open_text(summary_frame) as fh:
+                    summary_frame = pd.read_csv(fh, dtype={"shared_by_taxa": "Int64", "tied_taxa": "Int64"})
+            stats_frame = inputs["taxonomy_stats"]
+            if isinstance(stats_frame, str):
+                with open_text(stats_frame) as fh:
+                    stats_frame = pd.read_csv(fh)
+            save_parquet(summary_frame, summary_parquet, logger)
+            save_parquet(stats_frame.drop(columns=["Rank Summary"]), stats_parquet, logger)
+            stage.records = len(summary_frame) + len(stats_frame)
+
+    stages += [
+        Stage("expected_taxonomy", lambda _: expected()),
+        Stage(
+            "summary", summary, deps=("expected_taxonomy", classify),
+            outputs=(summary_jsonl, summary_csv),
+            fingerprint=results_key, resume=lambda _: resumed("summarize", summary_csv)
+        ),
+        Stage(
+            "taxonomy_stats", stats, deps=("summary", classify),
+            outputs=(stats_csv,),
+            fingerprint=results_key, resume=lambda _: resumed("taxonomy_stats", stats_csv)
+        ),
+    ]
+    if WRITE_PARQUET:
+        stages.append(Stage(
+            "parquet", parquet, deps=("summary", "taxonomy_stats", classify),
+            outputs=(summary_parquet, stats_parquet),
+            fingerprint=results_key, resume=lambda _: resumed("parquet", None)
+        ))
+    if fingerprint is not None:
+        state_dir = fingerprint.path
+        stages.append(Stage(
+            "fingerprint", save_fingerprint, deps=("summary", "taxonomy_stats", classify),
+            outputs=tuple(os.path.join(state_dir, f) for f in (RunFingerprint.FINGERPRINT, RunFingerprint.HITS, RunFingerprint.STATE)),
+            fingerprint=results_key, resume=lambda _: resumed("fingerprint", None)
+        ))
+    return stages
 
-    taxonomy_stats(SUMMARY_CSV, TAX_STATS_CSV, logger)
+def run_pipeline(job, expected, cache, work_dir, stats_csv, logger, profiler=None):
+    """
+    Runs one primer pair from amplicons to taxonomy stats, writing work files, completion
+    markers and the run report under work_dir.
+
+    `expected` is a callable returning the expected taxonomy; it is called on a stage thread,
+    concurrently with amplicon generation and VSEARCH.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    profiler = profiler or new_profiler(job.name, work_dir, logger)
+    report = os.path.join(work_dir, RUN_REPORT)
+    graph = StageGraph(
+        pipeline_stages(job, expected, cache, work_dir, stats_csv, profiler, logger),
+        logger, marker_dir=os.path.join(work_dir, STAGE_MARKER_DIR)
+    )
+    try:
+        graph.run()
+    except BaseException:
+        profiler.write_report(report, "failed", run_params(job))
+        raise
+    profiler.write_report(report, "ok", run_params(job))
+    return stats_csv
+
+def expected_loader(profiler, logger):
+    """Returns a callable that loads the expected taxonomy, timed as a profiler stage."""
+    def load():
+        with profiler.stage("load_expected_taxonomy") as stage:
+            expected = load_expected_taxonomy(TAXONOMY_FILE_PATH, Taxonomy, logger)
+            stage.records = len(expected)
+        return expected
+    return load
+
+def drilldown(sequence_ids, work_dir=".", out=sys.stdout):
+    """
+    Writes the amplicon and the top-hit reference sequence of each sequence ID as FASTA.
+
+    Sequences are read through `.fai` offset indexes of the amplicon FASTA and of
+    VSEARCH_DB_PATH (built on first use, see REFERENCE_FAI), so no FASTA is scanned
+    per lookup.
+    """
+    with open_text(os.path.join(work_dir, SUMMARY_CSV)) as fh:
+        summary = pd.read_csv(
+            fh, usecols=["sequence_id", "top_vsearch_sseqid"], dtype=object
+        ).set_index("sequence_id")["top_vsearch_sseqid"]
+    members_tsv = os.path.join(work_dir, MEMBERS_OUT)
+    rep_of = {}
+    if os.path.exists(members_tsv):
+        rep_of = {seq_id: rep for rep, ids in load_members(members_tsv, logger).items() for seq_id in ids}
+    fallback_dir = os.path.join(CACHE_DIR, ".faidx")
+    amplicon_index = ensure_fasta_index(os.path.join(work_dir, FASTA_OUT), logger, fallback_dir=fallback_dir)
+    reference_index = ensure_fasta_index(
+        str(VSEARCH_DB_PATH), logger, str(REFERENCE_FAI) if REFERENCE_FAI else None, fallback_dir
+    )
+    amplicons = dict(amplicon_index.fetch_many(rep_of.get(seq_id, seq_id) for seq_id in sequence_ids))
+    top_hits = [summary.get(seq_id) for seq_id in sequence_ids]
+    references = dict(reference_index.fetch_many(hit for hit in top_hits if isinstance(hit, str)))
+    for seq_id, hit in zip(sequence_ids, top_hits):
+        if seq_id not in summary.index:
+            logger.warning(f"{seq_id} is not in {SUMMARY_CSV}")
+            continue
+        amplicon = amplicons.get(rep_of.get(seq_id, seq_id))
+        if amplicon is not None:
+            out.write(f">{seq_id} amplicon\n{amplicon}\n")
+        if isinstance(hit, str) and references.get(hit) is not None:
+            out.write(f">{hit} top_hit_of={seq_id}\n{references[hit]}\n")
+    amplicon_index.close()
+    reference_index.close()
+
+def main():
+    logger.info("Pipeline started.")
+    cache = StageCache(CACHE_DIR, CACHE_MAX_BYTES, logger)
+    job = PrimerJob(PRIMER_REGION, PRIMER_PAIR, str(IPCR_JSON) if AMPLICON_SOURCE == "ipcr_json" else None)
+    profiler = new_profiler(job.name, ".", logger)
+    run_pipeline(job, expected_loader(profiler, logger), cache, ".", TAX_STATS_CSV, logger, profiler)
     logger.info("Pipeline finished successfully.")
 
+def batch_main(jobs_tsv, workers=BATCH_WORKERS):
+    """Evaluates every primer pair in jobs_tsv, sharing the parsed reference inputs across pairs."""
+    global PCR_PROCESSES, KMER_PROCESSES, VSEARCH_THREADS
+    logger.info("Batch pipeline started.")
+    jobs = load_primer_jobs(jobs_tsv)
+    # Every pair runs its own PCR pool and VSEARCH threads; split the budgets so that
+    # `workers` pairs at once use the cores one pair would.
+    cpus = os.cpu_count() or 1
+    PCR_PROCESSES = share_per_job(PCR_PROCESSES or cpus, workers, len(jobs))
+    KMER_PROCESSES = share_per_job(KMER_PROCESSES or cpus, workers, len(jobs))
+    VSEARCH_THREADS = share_per_job(VSEARCH_THREADS, workers, len(jobs))
+    logger.info(
+        f"Per pair: {PCR_PROCESSES} PCR processes, {KMER_PROCESSES} k-mer processes, "
+        f"{VSEARCH_SHARDS} x {VSEARCH_THREADS} VSEARCH threads"
+    )
+    cache = StageCache(CACHE_DIR, CACHE_MAX_BYTES, logger)
+    # The shared stages go in BATCH_WORK_DIR/run_report.json; each pair has its own report.
+    profiler = new_profiler("batch", str(BATCH_WORK_DIR), logger)
+    os.makedirs(BATCH_WORK_DIR, exist_ok=True)
+    os.makedirs(PRIMER_OUT_DIR, exist_ok=True)
+    report = os.path.join(BATCH_WORK_DIR, RUN_REPORT)
+    params = {"jobs": [job.name for job in jobs], "workers": workers, "taxonomy": str(TAXONOMY_FILE_PATH)}
+
+    # The expected taxonomy loads once in the background; pairs start generating amplicons
+    # and running VSEARCH right away and only wait for it at their summary stage.
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="expected") as loader:
+        expected = loader.submit(expected_loader(profiler, logger))
+        # Hash the reference inputs once up front so concurrent jobs only hit the digest memo.
+        cache.file_digest(str(VSEARCH_DB_PATH))
+        if any(job.ipcr_json is None for job in jobs):
+            cache.file_digest(str(REFERENCE_FASTA))
+
+        def run_job(job):
+            job_logger = logging.getLogger(f"{__name__}.{job.name}")
+            return run_pipeline(
+                job, expected.result, cache,
+                os.path.join(BATCH_WORK_DIR, job.name),
+                os.path.join(PRIMER_OUT_DIR, f"{job.name}.csv"),
+                job_logger
+            )
+
+        try:
+            with profiler.stage("primer_pairs") as stage:
+                stage.records = len(jobs)
+                run_batch(jobs, run_job, workers, logger)
+        except BaseException:
+            profiler.write_report(report, "failed", params)
+            raise
+    profiler.write_report(report, "ok", params)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Evaluate primer pairs by in silico PCR and VSEARCH classification.")
+    parser.add_argument("--batch", metavar="JOBS_TSV",
+                        help="TSV of region, forward, reverse[, ipcr_json] rows to evaluate in one run")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="primer pairs processed concurrently in batch mode")
+    parser.add_argument("--drilldown", metavar="SEQ_ID", nargs="+",
+                        help="print the amplicon and top-hit reference sequence of these sequence IDs as FASTA")
+    parser.add_argument("--work-dir", default=".", help="work directory of the run to drill into (e.g. batch_runs/<name>)")
+    args = parser.parse_args()
+    if args.drilldown:
+        drilldown(args.drilldown, args.work_dir)
+    elif args.batch:
+        batch_main(args.batch, args.workers)
+    else:
+        main()
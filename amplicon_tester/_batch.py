@@ -0,0 +1,112 @@
+# amplicon_tester/_batch.py
+import csv
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from amplicon_tester._ipcr import PrimerPair
+
+@dataclass(frozen=True)
+class PrimerJob:
+    """
+    One primer pair to evaluate in a batch run.
+
+    Attributes:
+        region (str): Marker region label used in the output name (e.g. 'ITS', 'V3V4').
+        pair (PrimerPair): Forward/reverse primers.
+        ipcr_json (Optional[str]): Pre-computed ipcr results for the pair; when None the
+            built-in in silico PCR engine is used.
+    """
+    region: str
+    pair: PrimerPair
+    ipcr_json: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        """Returns the '<REGION>_<FWD>_<REV>' name the Streamlit app expects for primer files."""
+        return f"{self.region}_{self.pair.forward}_{self.pair.reverse}"
+
+def load_primer_jobs(path: str) -> List[PrimerJob]:
+    """
+    Reads batch jobs from a TSV with columns region, forward, reverse and optional ipcr_json.
+
+    Blank lines and lines starting with '#' are ignored.
+
+    Args:
+        path: Path to the job list.
+
+    Returns:
+        List of PrimerJob objects, in file order.
+    """
+    jobs: List[PrimerJob] = []
+    with open(path, newline='') as fh:
+        for row in csv.reader(fh, delimiter="\t"):
+            if not row or not row[0].strip() or row[0].startswith("#"):
+                continue
+            if len(row) < 3:
+                raise ValueError(f"{path}: expected region, forward, reverse[, ipcr_json], got {row}")
+            region, forward, reverse = (c.strip() for c in row[:3])
+            ipcr_json = row[3].strip() if len(row) > 3 and row[3].strip() else None
+            jobs.append(PrimerJob(region, PrimerPair(forward.upper(), reverse.upper()), ipcr_json))
+    return jobs
+
+def share_per_job(total: int, workers: int, n_jobs: int) -> int:
+    """
+    Splits a process or thread budget between the jobs of a batch that run at once.
+
+    Args:
+        total: Processes (or threads) one job would use on its own.
+        workers: Number of jobs run at once.
+        n_jobs: Number of jobs in the batch (with fewer jobs than workers, only n_jobs run at once).
+
+    Returns:
+        Budget per job, at least 1.
+    """
+    return max(1, total // max(1, min(workers, n_jobs)))
+
+def run_batch(
+    jobs: List[PrimerJob],
+    run_job: Callable[[PrimerJob], str],
+    workers: int,
+    logger: logging.Logger
+) -> Dict[str, str]:
+    """
+    Runs primer jobs concurrently in a thread pool.
+
+    Threads share the caller's already-parsed inputs (expected taxonomy, reference digests)
+    without copying them. The work itself runs in each job's own VSEARCH subprocesses and
+    in silico PCR process pool, which the job's thread waits on; every job starts its own,
+    so the caller should give each job a share of the cores (see `share_per_job`) rather
+    than all of them.
+
+    Args:
+        jobs: Jobs to run.
+        run_job: Callable running one job and returning its output path.
+        workers: Number of jobs run at once.
+        logger: Logger for messages.
+
+    Returns:
+        Dict mapping job name to output path for every job that succeeded.
+
+    Raises:
+        RuntimeError: If any job failed (after all others have finished).
+    """
+    logger.info(f"Running {len(jobs)} primer jobs with {workers} workers")
+    outputs: Dict[str, str] = {}
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                outputs[job.name] = future.result()
+                logger.info(f"[{job.name}] done -> {outputs[job.name]}")
+            except Exception:
+                logger.exception(f"[{job.name}] failed")
+                failed.append(job.name)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(jobs)} primer jobs failed: {', '.join(failed)}")
+    logger.info("Batch finished successfully.")
+    return outputs
+# ---
\ No newline at end of file
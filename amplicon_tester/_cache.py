@@ -0,0 +1,187 @@
+# amplicon_tester/_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+class StageCache:
+    """
+    Content-addressed store for pipeline stage artifacts with size-bounded LRU eviction.
+
+    Each entry lives in `<root>/<key>/`, where the key hashes the stage name, the content
+    of its input files and its parameters. Changing any of them yields a new key, so stale
+    artifacts are never reused. Entries are evicted least-recently-used first once the
+    store grows beyond `max_bytes`.
+
+    Attributes:
+        root (str): Cache directory.
+        max_bytes (int): Size budget for all entries combined.
+        logger (logging.Logger): Logger for messages.
+    """
+    DIGEST_INDEX = "digests.json"
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, root: str, max_bytes: int, logger: logging.Logger):
+        """
+        Args:
+            root: Cache directory (created if missing).
+            max_bytes: Size budget for all entries combined.
+            logger: Logger for messages.
+        """
+        self.root: str = root
+        self.max_bytes: int = max_bytes
+        self.logger: logging.Logger = logger
+        os.makedirs(root, exist_ok=True)
+        # Guards the digest index; each path also has its own lock, held while it is hashed.
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    def file_digest(self, path: str) -> str:
+        """
+        Returns the SHA-256 of a file's content.
+
+        Digests are memoized by (path, size, mtime), so large unchanged inputs such as
+        the reference database are only hashed once. Threads asking for the same file
+        (the jobs of a batch) wait for one hash instead of each hashing it, and entries
+        of files that no longer exist are dropped when the index is rewritten.
+
+        Args:
+            path: File to hash.
+
+        Returns:
+            Hex digest.
+        """
+        real = os.path.realpath(path)
+        with self._lock:
+            path_lock = self._path_locks.setdefault(real, threading.Lock())
+        with path_lock:
+            st = os.stat(real)
+            stamp = f"{st.st_size}:{st.st_mtime_ns}"
+            with self._lock:
+                memo = self._load_digests().get(real)
+            if memo and memo[0] == stamp:
+                return memo[1]
+
+            self.logger.info(f"Hashing {path} for the stage cache")
+            sha = hashlib.sha256()
+            with open(real, "rb") as fh:
+                for chunk in iter(lambda: fh.read(self.CHUNK_SIZE), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            with self._lock:
+                index = self._load_digests()
+                index[real] = [stamp, digest]
+                index = {p: entry for p, entry in index.items() if os.path.exists(p)}
+                self._atomic_write_json(os.path.join(self.root, self.DIGEST_INDEX), index)
+            return digest
+
+    def _load_digests(self) -> Dict[str, List[str]]:
+        """Reads the digest index (path -> [stamp, digest]); a missing or corrupt index is empty."""
+        try:
+            with open(os.path.join(self.root, self.DIGEST_INDEX)) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def key(self, stage: str, inputs: Iterable[str], params: Dict[str, Any]) -> str:
+        """
+        Computes the cache key for a stage run.
+
+        Args:
+            stage: Stage name.
+            inputs: Input file paths whose content determines the result.
+            params: Parameters that determine the result (must be JSON-serializable via str()).
+
+        Returns:
+            Hex key.
+        """
+        payload = {
+            "stage": stage,
+            "inputs": [self.file_digest(str(p)) for p in inputs],
+            "params": params,
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def fetch(self, key: str, artifacts: Dict[str, str]) -> bool:
+        """
+        Restores a stage's artifacts from the cache, if an entry for the key exists.
+
+        Args:
+            key: Cache key from `key()`.
+            artifacts: Mapping of artifact name to destination path.
+
+        Returns:
+            True if every artifact was restored, False on a cache miss.
+        """
+        entry = os.path.join(self.root, key)
+        if not all(os.path.isfile(os.path.join(entry, name)) for name in artifacts):
+            return False
+        for name, dest in artifacts.items():
+            shutil.copy2(os.path.join(entry, name), dest)
+        os.utime(entry)
+        self.logger.info(f"Stage cache hit {key[:12]}: restored {', '.join(map(str, artifacts.values()))}")
+        return True
+
+    def store(self, key: str, artifacts: Dict[str, str]) -> None:
+        """
+        Copies a stage's artifacts into the cache under the key, then enforces the size budget.
+
+        Args:
+            key: Cache key from `key()`.
+            artifacts: Mapping of artifact name to source path.
+        """
+        entry = os.path.join(self.root, key)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            for name, src in artifacts.items():
+                shutil.copy2(src, os.path.join(staging, name))
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.replace(staging, entry)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.logger.info(f"Stage cache stored {key[:12]}")
+        self.evict(keep=key)
+
+    def evict(self, keep: str = "") -> None:
+        """
+        Removes least-recently-used entries until the cache fits in `max_bytes`.
+
+        Args:
+            keep: Key that must not be evicted (typically the entry just stored).
+        """
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or name.startswith("."):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, f))
+                for f in os.listdir(path)
+                if os.path.isfile(os.path.join(path, f))
+            )
+            entries.append((os.path.getmtime(path), size, name))
+            total += size
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            total -= size
+            self.logger.info(f"Stage cache evicted {name[:12]} ({size} bytes)")
+
+    @staticmethod
+    def _atomic_write_json(path: str, data: Any) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+# ---
\ No newline at end of file
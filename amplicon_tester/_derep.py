@@ -0,0 +1,212 @@
+# amplicon_tester/_derep.py
+import copy
+import csv
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+from amplicon_tester._io_utils import iter_fasta, open_text
+
+def size_label(seq_id: str, size: int) -> str:
+    """
+    Returns a FASTA label with a USEARCH/VSEARCH-style abundance annotation.
+
+    Args:
+        seq_id: Sequence ID of the representative.
+        size: Number of sequences sharing the amplicon.
+
+    Returns:
+        Label such as 'seq123;size=42'.
+    """
+    return f"{seq_id};size={size}"
+
+def strip_size_label(label: str) -> str:
+    """
+    Removes a ';size=N' abundance annotation from a FASTA/BLAST6 label.
+
+    Args:
+        label: Sequence label, with or without annotation.
+
+    Returns:
+        The bare sequence ID.
+    """
+    return label.split(";size=", 1)[0]
+
+def iter_unique_amplicons(
+    amplicons: Union[Dict[str, dict], Iterable[Tuple[str, dict]]],
+    members: Dict[str, List[str]]
+) -> Iterator[Tuple[str, str]]:
+    """
+    Streams the distinct amplicons, recording membership as it goes.
+
+    Sequences are compared through a SHA-1 digest of the upper-cased amplicon, so only
+    the digests (not the sequences) are held in memory.
+
+    Args:
+        amplicons: Dict mapping sequence IDs to amplicon dictionaries (must contain 'seq'),
+            or an iterable of (sequence ID, amplicon) pairs. Repeated IDs keep their first amplicon.
+        members: Dict filled in place with representative ID -> member IDs (representative first).
+            It is complete once the iterator is exhausted.
+
+    Yields:
+        Tuples of (representative ID, sequence), the first time each distinct amplicon is seen.
+    """
+    records = amplicons.items() if isinstance(amplicons, dict) else amplicons
+    digest_to_rep: Dict[bytes, str] = {}
+    seen: Set[str] = set()
+    for seq_id, amplicon in records:
+        if seq_id in seen:
+            continue
+        seen.add(seq_id)
+        seq = amplicon["seq"].upper()
+        digest = hashlib.sha1(seq.encode()).digest()
+        rep = digest_to_rep.get(digest)
+        if rep is None:
+            digest_to_rep[digest] = seq_id
+            members[seq_id] = [seq_id]
+            yield seq_id, seq
+        else:
+            members[rep].append(seq_id)
+
+def dereplicate_to_fasta(
+    amplicons: Union[Dict[str, dict], Iterable[Tuple[str, dict]]],
+    output: str,
+    logger: logging.Logger
+) -> Dict[str, List[str]]:
+    """
+    Collapses byte-identical amplicons and writes one size-annotated representative per unique sequence.
+
+    Only the unique sequences are held in memory. Representatives are written from most
+    to least abundant.
+
+    Args:
+        amplicons: Dict mapping sequence IDs to amplicon dictionaries (must contain 'seq'),
+            or an iterable of (sequence ID, amplicon) pairs. Repeated IDs keep their first amplicon.
+        output: Output FASTA file path.
+        logger: Logger for messages.
+
+    Returns:
+        Dict mapping representative sequence ID to its member IDs (representative first).
+    """
+    logger.info(f"Dereplicating amplicons into {output}")
+    members: Dict[str, List[str]] = {}
+    rep_seqs: Dict[str, str] = dict(iter_unique_amplicons(amplicons, members))
+
+    with open_text(output, "w") as fasta:
+        for rep in sorted(members, key=lambda r: -len(members[r])):
+            seq = rep_seqs[rep]
+            fasta.write(f">{size_label(rep, len(members[rep]))}\n")
+            for i in range(0, len(seq), 80):
+                fasta.write(seq[i:i+80] + "\n")
+    total = sum(len(ids) for ids in members.values())
+    logger.info(f"Dereplicated {total} amplicons into {len(members)} unique sequences.")
+    return members
+
+def save_members(
+    members: Dict[str, List[str]],
+    path: str,
+    logger: logging.Logger
+) -> None:
+    """
+    Saves a dereplication membership map as a two-column TSV (representative, comma-separated members).
+
+    Args:
+        members: Dict mapping representative ID to member IDs.
+        path: Output TSV path.
+        logger: Logger for messages.
+    """
+    with open_text(path, "w") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        for rep, ids in members.items():
+            writer.writerow([rep, ",".join(ids)])
+    logger.info(f"Dereplication members saved to {path}")
+
+def load_members(
+    path: str,
+    logger: logging.Logger
+) -> Dict[str, List[str]]:
+    """
+    Loads a membership map written by `save_members`.
+
+    Args:
+        path: Members TSV path.
+        logger: Logger for messages.
+
+    Returns:
+        Dict mapping representative ID to member IDs.
+    """
+    members: Dict[str, List[str]] = {}
+    with open_text(path) as fh:
+        for rep, ids in csv.reader(fh, delimiter="\t"):
+            members[rep] = ids.split(",")
+    logger.info(f"Loaded {len(members)} dereplicated amplicons from {path}")
+    return members
+
+def expand_hits(
+    hits: Dict[str, Any],
+    members: Dict[str, List[str]]
+) -> Dict[str, Any]:
+    """
+    Fans representative hits back out to every member sequence.
+
+    Args:
+        hits: Dict mapping representative IDs to hit objects with a `qseqid` attribute.
+        members: Dict mapping representative ID to member IDs.
+
+    Returns:
+        Dict mapping each member ID to a copy of its representative's hit, re-labelled
+        with the member's own query ID.
+    """
+    expanded: Dict[str, Any] = {}
+    for rep, hit in hits.items():
+        for seq_id in members.get(rep, [rep]):
+            if seq_id == hit.qseqid:
+                expanded[seq_id] = hit
+                continue
+            member_hit = copy.copy(hit)
+            member_hit.qseqid = seq_id
+            expanded[seq_id] = member_hit
+    return expanded
+
+def member_ids(members: Dict[str, List[str]]) -> Set[str]:
+    """
+    Returns every sequence ID covered by a membership map.
+
+    Args:
+        members: Dict mapping representative ID to member IDs.
+
+    Returns:
+        Set of all member IDs.
+    """
+    return {seq_id for ids in members.values() for seq_id in ids}
+
+def write_singletons(
+    fasta: str,
+    members: Dict[str, List[str]],
+    output: str,
+    logger: logging.Logger
+) -> int:
+    """
+    Copies the representatives of single-member groups from a dereplicated FASTA.
+
+    Args:
+        fasta: Dereplicated FASTA written by `dereplicate_to_fasta`.
+        members: Dict mapping representative ID to member IDs.
+        output: Output FASTA path (labels are kept, size annotations included).
+        logger: Logger for messages.
+
+    Returns:
+        Number of sequences written.
+    """
+    n = 0
+    with open_text(output, "w") as out:
+        for label, seq in iter_fasta(fasta):
+            if len(members.get(strip_size_label(label), ())) != 1:
+                continue
+            out.write(f">{label}\n")
+            for i in range(0, len(seq), 80):
+                out.write(seq[i:i+80] + "\n")
+            n += 1
+    logger.info(f"Wrote {n} singleton amplicons to {output}")
+    return n
+# ---
\ No newline at end of file
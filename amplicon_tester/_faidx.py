@@ -0,0 +1,307 @@
+# amplicon_tester/_faidx.py
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+from amplicon_tester._derep import strip_size_label
+from amplicon_tester._io_utils import compression_of, iter_fasta
+
+_build_lock = threading.Lock()
+
+class FastaIndex:
+    """
+    Random access into a FASTA file through a samtools-compatible `.fai` offset index.
+
+    The `.fai` has one row per record: name, sequence length, byte offset of the first
+    base, bases per line and bytes per line (bases plus line terminator). The FASTA is
+    memory-mapped, so fetching a record reads only its own pages; nothing is parsed
+    until a sequence is requested. Names with a ';size=N' annotation can also be looked
+    up by the bare sequence ID.
+
+    Attributes:
+        fasta (str): FASTA path.
+        fai (str): Index path.
+        names (List[str]): Record names, in file order.
+        lengths (np.ndarray): Sequence lengths.
+        offsets (np.ndarray): Byte offset of each record's first base.
+        line_bases (np.ndarray): Bases per full line.
+        line_width (np.ndarray): Bytes per full line, terminator included.
+    """
+
+    def __init__(self, fasta: str, fai: Optional[str] = None):
+        """
+        Args:
+            fasta: FASTA path.
+            fai: Index path (default: `<fasta>.fai`).
+        """
+        self.fasta: str = fasta
+        self.fai: str = fai or f"{fasta}.fai"
+        names: List[str] = []
+        columns: List[Tuple[int, int, int, int]] = []
+        with open(self.fai) as fh:
+            for line in fh:
+                name, length, offset, bases, width = line.rstrip("\n").split("\t")[:5]
+                names.append(name)
+                columns.append((int(length), int(offset), int(bases), int(width)))
+        table = np.array(columns, dtype=np.int64).reshape(-1, 4)
+        self.names: List[str] = names
+        self.lengths: np.ndarray = table[:, 0]
+        self.offsets: np.ndarray = table[:, 1]
+        self.line_bases: np.ndarray = table[:, 2]
+        self.line_width: np.ndarray = table[:, 3]
+        self._lookup: Optional[Dict[str, int]] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.lookup
+
+    @property
+    def lookup(self) -> Dict[str, int]:
+        """Record number by name (and by bare ID for size-annotated names), built on first use."""
+        if self._lookup is None:
+            lookup = {name: i for i, name in enumerate(self.names)}
+            for i, name in enumerate(self.names):
+                if ";size=" in name:
+                    lookup.setdefault(strip_size_label(name), i)
+            self._lookup = lookup
+        return self._lookup
+
+    def _data(self) -> mmap.mmap:
+        if self._map is None:
+            with open(self.fasta, "rb") as fh:
+                self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _span(self, i: int) -> Tuple[int, int]:
+        length, bases = int(self.lengths[i]), int(self.line_bases[i])
+        full_lines = (length - 1) // bases if length and bases else 0
+        start = int(self.offsets[i])
+        return start, start + length + full_lines * (int(self.line_width[i]) - bases)
+
+    def fetch(self, name: str) -> str:
+        """
+        Returns one sequence.
+
+        Args:
+            name: Record name (or bare ID of a size-annotated record).
+
+        Returns:
+            The sequence, without line breaks.
+
+        Raises:
+            KeyError: If no record has that name.
+            ValueError: If the index no longer matches the file.
+        """
+        i = self.lookup[name]
+        start, end = self._span(i)
+        seq = self._data()[start:end].translate(None, b"\r\n")
+        if len(seq) != self.lengths[i] or b">" in seq:
+            raise ValueError(f"{self.fai} does not match {self.fasta} at {self.names[i]}; delete the index to rebuild it")
+        return seq.decode("ascii")
+
+    def fetch_many(self, names: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Extracts many sequences, reading them in file order.
+
+        Args:
+            names: Record names (or bare IDs).
+
+        Yields:
+            (name, sequence) pairs in the requested order, with None for unknown names.
+        """
+        names = list(names)
+        rows = [self.lookup.get(name) for name in names]
+        found = sorted((self.offsets[row], row) for row in rows if row is not None)
+        # Touch the records in offset order so the page cache reads the file sequentially.
+        seqs = {row: self.fetch(self.names[row]) for _, row in found}
+        for name, row in zip(names, rows):
+            yield name, seqs.get(row) if row is not None else None
+
+    def close(self) -> None:
+        """Releases the memory map."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @staticmethod
+    def build(fasta: str, logger: logging.Logger, fai: Optional[str] = None) -> "FastaIndex":
+        """
+        Scans a FASTA once and writes its `.fai`.
+
+        Each record must have lines of equal length (except its last line), as samtools
+        requires; the pipeline's own FASTA writers wrap at 80 columns.
+
+        Args:
+            fasta: FASTA path.
+            logger: Logger for messages.
+            fai: Index path (default: `<fasta>.fai`).
+
+        Returns:
+            The new index.
+
+        Raises:
+            ValueError: On a compressed FASTA, or a record with uneven line lengths or a duplicate name.
+            OSError: If the index cannot be written.
+        """
+        if compression_of(fasta):
+            raise ValueError(f"{fasta} is compressed; indexed access needs an uncompressed FASTA")
+        fai = fai or f"{fasta}.fai"
+        tmp = f"{fai}.part"
+        # Fail before the scan if the index location is not writable.
+        open(tmp, "w").close()
+        os.remove(tmp)
+        logger.info(f"Indexing {fasta}")
+        rows: List[str] = []
+        seen = set()
+        name: Optional[str] = None
+        length = offset = bases = width = 0
+        short_line = False  # a line shorter than `bases` (or a blank line) must end the record
+
+        def finish() -> None:
+            if name is not None:
+                rows.append(f"{name}\t{length}\t{offset}\t{bases}\t{width}\n")
+
+        pos = 0
+        with open(fasta, "rb") as fh:
+            for line in fh:
+                line_start, pos = pos, pos + len(line)
+                if line.startswith(b">"):
+                    finish()
+                    header = line[1:].split(maxsplit=1)
+                    name = header[0].decode() if header else ""
+                    if name in seen:
+                        raise ValueError(f"{fasta}: duplicate sequence name {name}")
+                    seen.add(name)
+                    length = bases = width = 0
+                    offset = pos
+                    short_line = False
+                    continue
+                n_bases = len(line.rstrip(b"\r\n"))
+                if name is None:
+                    if n_bases:
+                        raise ValueError(f"{fasta}: sequence data before the first header")
+                    continue
+                if n_bases == 0:
+                    short_line = True
+                    continue
+                if short_line:
+                    raise ValueError(f"{fasta}: {name} has lines of different lengths; rewrap it (e.g. seqkit seq -w 80)")
+                if length == 0:
+                    offset, bases, width = line_start, n_bases, len(line)
+                elif n_bases > bases or len(line) - n_bases != width - bases:
+                    raise ValueError(f"{fasta}: {name} has lines of different lengths; rewrap it (e.g. seqkit seq -w 80)")
+                short_line = n_bases < bases
+                length += n_bases
+            finish()
+
+        with open(tmp, "w") as out:
+            out.writelines(rows)
+        os.replace(tmp, fai)
+        logger.info(f"Indexed {len(rows)} sequences of {fasta} in {fai}")
+        return FastaIndex(fasta, fai)
+
+class FastaScan:
+    """
+    Sequential stand-in for FastaIndex, used when a FASTA cannot be indexed: each
+    `fetch_many` call reads the whole file once.
+
+    Attributes:
+        fasta (str): FASTA path.
+    """
+
+    def __init__(self, fasta: str):
+        """
+        Args:
+            fasta: FASTA path (may be compressed).
+        """
+        self.fasta: str = fasta
+
+    def fetch_many(self, names: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Extracts many sequences in one pass over the file.
+
+        Args:
+            names: Record names (or bare IDs of size-annotated records).
+
+        Yields:
+            (name, sequence) pairs in the requested order, with None for unknown names.
+        """
+        names = list(names)
+        wanted = set(names)
+        seqs: Dict[str, str] = {}
+        for name, seq in iter_fasta(self.fasta):
+            for key in (name, strip_size_label(name)):
+                if key in wanted and key not in seqs:
+                    seqs[key] = seq
+            if len(seqs) == len(wanted):
+                break
+        for name in names:
+            yield name, seqs.get(name)
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+def _current_index(fasta: str, fai: str, st: os.stat_result) -> Optional[FastaIndex]:
+    try:
+        if os.stat(fai).st_mtime_ns < st.st_mtime_ns:
+            return None
+    except OSError:  # missing, or its directory is not usable
+        return None
+    index = FastaIndex(fasta, fai)
+    # Cheap consistency check: the last record must end at the end of the file.
+    if not len(index) or index._span(len(index) - 1)[1] <= st.st_size <= index._span(len(index) - 1)[1] + 2:
+        return index
+    return None
+
+def ensure_fasta_index(
+    fasta: str,
+    logger: logging.Logger,
+    fai: Optional[str] = None,
+    fallback_dir: Optional[str] = None
+) -> Union[FastaIndex, FastaScan]:
+    """
+    Opens the `.fai` of a FASTA, (re)building it if it is missing or older than the FASTA.
+
+    If the index cannot be written (e.g. a reference database on read-only or shared
+    storage), it is kept in `fallback_dir` instead, under a name derived from the FASTA's
+    real path. If it cannot be written there either, or the FASTA cannot be indexed
+    (compressed, or unevenly wrapped), a FastaScan reads the file sequentially instead.
+
+    Args:
+        fasta: FASTA path.
+        logger: Logger for messages.
+        fai: Index path (default: `<fasta>.fai`).
+        fallback_dir: Directory for the index when `fai` is not writable.
+
+    Returns:
+        The index, or a FastaScan with the same `fetch_many`/`close` interface.
+    """
+    candidates = [fai or f"{fasta}.fai"]
+    if fallback_dir:
+        digest = hashlib.blake2b(os.path.realpath(fasta).encode(), digest_size=8).hexdigest()
+        candidates.append(os.path.join(fallback_dir, f"{os.path.basename(fasta)}.{digest}.fai"))
+    with _build_lock:
+        st = os.stat(fasta)
+        for path in candidates:
+            index = _current_index(fasta, path, st)
+            if index is not None:
+                return index
+        for path in candidates:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                return FastaIndex.build(fasta, logger, path)
+            except OSError as e:
+                logger.warning(f"Cannot write FASTA index {path}: {e}")
+            except ValueError as e:
+                logger.warning(f"{e}; reading {fasta} sequentially instead")
+                return FastaScan(fasta)
+    logger.warning(f"No writable location for an index of {fasta}; reading it sequentially instead")
+    return FastaScan(fasta)
+# ---
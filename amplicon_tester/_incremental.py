@@ -0,0 +1,357 @@
+# amplicon_tester/_incremental.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+
+from amplicon_tester._derep import strip_size_label
+from amplicon_tester._io_utils import iter_fasta, open_text, partial_path
+from amplicon_tester._stats import STATS_INPUT_COLUMNS
+from amplicon_tester._vsearch import BLAST6_COLUMNS, load_best_hits_frame
+
+FINGERPRINT_COLUMNS: List[str] = [
+    "sequence_id",
+    "reference_hash",
+    "lineage",
+    "amplicon_hash",
+    "amplifies",
+    "differentiable",
+    "deepest_rank",
+    "ambiguous"
+]
+# Bumped when the fingerprint layout changes; older fingerprints are ignored (full run).
+FINGERPRINT_VERSION = 2
+
+# Reference hashes by (path, size, mtime), shared by the jobs of a batch.
+_reference_memo: Dict[str, Tuple[Tuple[int, int], pd.Series]] = {}
+_reference_lock = threading.Lock()
+
+def sequence_hash(seq: str) -> str:
+    """
+    Returns a short content hash of a nucleotide sequence (case-insensitive).
+
+    Args:
+        seq: Sequence.
+
+    Returns:
+        20-character hex digest.
+    """
+    return hashlib.blake2b(seq.upper().encode(), digest_size=10).hexdigest()
+
+def reference_hashes(fasta: str, logger: logging.Logger) -> pd.Series:
+    """
+    Hashes every sequence of a reference FASTA.
+
+    Results are memoized in-process by path, size and modification time, so the jobs of
+    a batch hash the database once.
+
+    Args:
+        fasta: Reference FASTA path.
+        logger: Logger for messages.
+
+    Returns:
+        Series of sequence hashes indexed by sequence ID, in file order.
+    """
+    real = os.path.realpath(fasta)
+    with _reference_lock:
+        st = os.stat(real)
+        stamp = (st.st_size, st.st_mtime_ns)
+        memo = _reference_memo.get(real)
+        if memo and memo[0] == stamp:
+            return memo[1]
+        logger.info(f"Fingerprinting reference sequences in {fasta}")
+        ids: List[str] = []
+        hashes: List[str] = []
+        for seq_id, seq in iter_fasta(real):
+            ids.append(seq_id)
+            hashes.append(sequence_hash(seq))
+        series = pd.Series(hashes, index=pd.Index(ids, dtype=object), dtype=object, name="reference_hash")
+        series = series[~series.index.duplicated()]
+        _reference_memo[real] = (stamp, series)
+        return series
+
+def amplicon_hashes(fasta: str, members: Optional[Dict[str, List[str]]]) -> pd.Series:
+    """
+    Hashes the amplicon of every amplified sequence.
+
+    Args:
+        fasta: Amplicon FASTA (dereplicated or not).
+        members: Dereplication map, or None; a representative's hash is given to all its members.
+
+    Returns:
+        Series of amplicon hashes indexed by sequence ID.
+    """
+    ids: List[str] = []
+    hashes: List[str] = []
+    for label, seq in iter_fasta(fasta):
+        rep = strip_size_label(label)
+        digest = sequence_hash(seq)
+        for seq_id in (members.get(rep, [rep]) if members is not None else [rep]):
+            ids.append(seq_id)
+            hashes.append(digest)
+    return pd.Series(hashes, index=pd.Index(ids, dtype=object), dtype=object, name="amplicon_hash")
+
+def changed_summary_rows(previous: pd.DataFrame, summary: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Finds the summary rows whose contribution to the taxonomy stats changed since a fingerprinted run.
+
+    Args:
+        previous: Fingerprint of the previous run (see `RunFingerprint.load_fingerprint`).
+        summary: New summary frame.
+
+    Returns:
+        Tuple of (previous rows, new rows) of the changed sequences, with STATS_INPUT_COLUMNS.
+    """
+    old = previous[previous["lineage"].notna()].rename(columns={"lineage": "expected_taxonomy"})
+    old = old.set_index("sequence_id")[STATS_INPUT_COLUMNS]
+    old = old.astype({"amplifies": bool, "differentiable": bool, "ambiguous": bool})
+    new = summary.set_index("sequence_id")[STATS_INPUT_COLUMNS]
+    both = old.index.intersection(new.index)
+    a = old.loc[both].fillna({"deepest_rank": ""})
+    b = new.loc[both].fillna({"deepest_rank": ""})
+    differs = (a != b).any(axis=1)
+    changed = both[differs.to_numpy()]
+    removed = old.loc[old.index.difference(new.index, sort=False).append(changed)]
+    added = new.loc[new.index.difference(old.index, sort=False).append(changed)]
+    return removed.reset_index(drop=True), added.reset_index(drop=True)
+
+def _hit_rows(hits: pd.DataFrame) -> pd.DataFrame:
+    """One BLAST6 row per tied top hit (see `load_best_hits_frame` with top_k > 1)."""
+    if "tied_sseqids" not in hits.columns:
+        return hits[BLAST6_COLUMNS]
+    rows = hits.explode("tied_sseqids")
+    rows["sseqid"] = rows["tied_sseqids"].where(rows["tied_sseqids"].notna(), rows["sseqid"])
+    return rows[BLAST6_COLUMNS].reset_index(drop=True)
+
+def _write_subset(fasta: str, keep: Set[str], output: str) -> int:
+    n = 0
+    with open(output, "w") as out:
+        for label, seq in iter_fasta(fasta):
+            if strip_size_label(label) in keep:
+                out.write(f">{label}\n{seq}\n")
+                n += 1
+    return n
+
+class RunFingerprint:
+    """
+    Per-sequence record of a finished run, kept in the work directory so the next run
+    after a reference database update only redoes what the update touched.
+
+    `fingerprint.tsv` holds one row per reference or expected sequence: the hash of its
+    reference sequence, its lineage, the hash of its amplicon (if amplified) and the
+    summary fields the taxonomy stats count. `hits.tsv` holds the best hit of every
+    aligned amplicon in BLAST6 layout, with the amplicon hash as query ID, so hits are
+    reused even when dereplication picks other representatives (with --maxaccepts > 1,
+    one row per tied top hit). `state.json` records the classification parameters and the
+    taxonomy stats file the fingerprint belongs to.
+
+    Attributes:
+        path (str): Fingerprint directory.
+    """
+    FINGERPRINT = "fingerprint.tsv"
+    HITS = "hits.tsv"
+    STATE = "state.json"
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        """Returns the recorded state, or None if no complete fingerprint exists."""
+        try:
+            with open(os.path.join(self.path, self.STATE)) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def matches(self, params: Dict[str, Any]) -> bool:
+        """
+        Tells whether a fingerprint exists for the same classification parameters.
+
+        Args:
+            params: Classification parameters of the current run.
+        """
+        state = self.state()
+        return (
+            state is not None and state.get("version") == FINGERPRINT_VERSION
+            and state.get("params") == json.loads(json.dumps(params, default=str))
+        )
+
+    def stats_current(self, stats_csv: str) -> bool:
+        """
+        Tells whether `stats_csv` is still the taxonomy stats file written with this fingerprint.
+
+        Args:
+            stats_csv: Taxonomy stats CSV path.
+        """
+        state = self.state()
+        try:
+            st = os.stat(stats_csv)
+        except FileNotFoundError:
+            return False
+        return state is not None and state.get("version") == FINGERPRINT_VERSION and state.get("stats") == [os.path.realpath(stats_csv), st.st_size, st.st_mtime_ns]
+
+    def load_fingerprint(self) -> pd.DataFrame:
+        """Returns the fingerprint rows (FINGERPRINT_COLUMNS)."""
+        return pd.read_csv(
+            os.path.join(self.path, self.FINGERPRINT), sep="\t", dtype={
+                "sequence_id": object, "reference_hash": object, "lineage": object,
+                "amplicon_hash": object, "deepest_rank": object,
+            }
+        )
+
+    def load_hits(self, logger: logging.Logger, top_k: int = 1) -> pd.DataFrame:
+        """Returns the recorded best hits, one row per amplicon hash (in 'qseqid'); see `load_best_hits_frame`."""
+        return load_best_hits_frame(os.path.join(self.path, self.HITS), logger, top_k=top_k)
+
+    def save(
+        self,
+        references: pd.Series,
+        amplicons: pd.Series,
+        summary: pd.DataFrame,
+        hits: pd.DataFrame,
+        params: Dict[str, Any],
+        stats_csv: str,
+        logger: logging.Logger
+    ) -> None:
+        """
+        Writes the fingerprint of a finished run, replacing the previous one.
+
+        Args:
+            references: Reference sequence hashes (see `reference_hashes`).
+            amplicons: Amplicon hashes (see `amplicon_hashes`).
+            summary: Summary frame of the run.
+            hits: Best hit per representative, with tied subjects if listed (see `load_best_hits_frame`).
+            params: Classification parameters of the run.
+            stats_csv: Taxonomy stats CSV written by the run.
+            logger: Logger for messages.
+        """
+        frame = summary[["sequence_id"] + STATS_INPUT_COLUMNS].rename(columns={"expected_taxonomy": "lineage"})
+        frame = frame.merge(references.rename_axis("sequence_id").reset_index(), on="sequence_id", how="outer", sort=False)
+        frame["amplicon_hash"] = frame["sequence_id"].map(amplicons)
+        rows = _hit_rows(hits)
+        by_hash = rows.assign(qseqid=rows["qseqid"].map(amplicons))
+        by_hash = by_hash[by_hash["qseqid"].notna()].drop_duplicates(["qseqid", "sseqid"])
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            frame[FINGERPRINT_COLUMNS].to_csv(os.path.join(staging, self.FINGERPRINT), sep="\t", index=False)
+            by_hash.to_csv(os.path.join(staging, self.HITS), sep="\t", index=False, header=False)
+            st = os.stat(stats_csv)
+            with open(os.path.join(staging, self.STATE), "w") as fh:
+                json.dump({"version": FINGERPRINT_VERSION, "params": params, "stats": [os.path.realpath(stats_csv), st.st_size, st.st_mtime_ns]}, fh, default=str)
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.replace(staging, self.path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info(f"Run fingerprint of {len(frame)} sequences saved to {self.path}")
+
+    def update_hits(
+        self,
+        fasta: str,
+        db_path: str,
+        tsv_out: str,
+        align: Callable[[str, str, str], None],
+        logger: logging.Logger,
+        max_changed: float = 0.5,
+        top_k: int = 1
+    ) -> bool:
+        """
+        Classifies an amplicon FASTA against an updated database by reusing the recorded hits.
+
+        Amplicons with an amplicon hash that was never aligned, and amplicons whose recorded
+        best hit is a reference that was removed or whose sequence changed, are aligned
+        against the whole database. Every other amplicon keeps its recorded hit (or lack of
+        one) and is only aligned against the new and changed references, which can replace
+        it with a better hit. Among equally good hits the earlier reference in the database
+        wins. Up to `top_k` hits per query (best first, so ties with the best hit are kept)
+        are written to `tsv_out`, labelled like the FASTA.
+
+        Args:
+            fasta: Query FASTA (dereplicated or not).
+            db_path: Updated reference database (FASTA).
+            tsv_out: Output BLAST6 TSV.
+            align: Called as align(query_fasta, db_fasta, tsv_out) to run VSEARCH.
+            logger: Logger for messages.
+            max_changed: Largest fraction of changed references or queries worth updating;
+                beyond it False is returned and nothing is written.
+            top_k: Hits kept per query (VSEARCH --maxaccepts).
+
+        Returns:
+            True if `tsv_out` was written, False if a full run is needed instead.
+        """
+        references = reference_hashes(db_path, logger)
+        previous = self.load_fingerprint()
+        old_refs = previous.dropna(subset=["reference_hash"]).set_index("sequence_id")["reference_hash"]
+        changed_refs = set(references.index[references.ne(old_refs.reindex(references.index)).to_numpy()])
+        stale_refs = changed_refs | set(old_refs.index.difference(references.index))
+        aligned = set(previous["amplicon_hash"].dropna())
+        old_hits = _hit_rows(self.load_hits(logger, top_k))
+
+        labels: Dict[str, str] = {}
+        query_hash: Dict[str, str] = {}
+        for label, seq in iter_fasta(fasta):
+            rep = strip_size_label(label)
+            labels[rep] = label
+            query_hash[rep] = sequence_hash(seq)
+        hashes = pd.Series(query_hash, dtype=object)
+        stale_hashes = set(old_hits.loc[old_hits["sseqid"].isin(stale_refs), "qseqid"])
+        realign = ~hashes.isin(aligned) | hashes.isin(stale_hashes)
+        full = set(hashes.index[realign.to_numpy()])
+        recheck = set(hashes.index[~realign.to_numpy()])
+        logger.info(
+            f"Reference update: {len(changed_refs)} new or changed, {len(stale_refs) - len(changed_refs)} removed "
+            f"of {len(references)} references; aligning {len(full)} of {len(hashes)} amplicons against the full "
+            f"database and {len(recheck) if changed_refs else 0} against the changed references"
+        )
+        if len(changed_refs) > max_changed * max(len(references), 1) or len(full) > max_changed * max(len(hashes), 1):
+            logger.info("Too much changed for an incremental update; running a full classification")
+            return False
+
+        work = f"{tsv_out}.incremental"
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(work)
+        try:
+            candidates: List[pd.DataFrame] = []
+            reuse = pd.DataFrame({"qseqid": list(recheck), "hash": hashes[list(recheck)].to_numpy()})
+            reuse = reuse.merge(old_hits.rename(columns={"qseqid": "hash"}), on="hash", how="inner")
+            candidates.append(reuse[BLAST6_COLUMNS])
+            if full:
+                queries = os.path.join(work, "realign.fasta")
+                _write_subset(fasta, full, queries)
+                align(queries, db_path, os.path.join(work, "realign.tsv"))
+                candidates.append(_hit_rows(load_best_hits_frame(os.path.join(work, "realign.tsv"), logger, top_k=top_k)))
+            if recheck and changed_refs:
+                queries = os.path.join(work, "recheck.fasta")
+                delta_db = os.path.join(work, "changed_refs.fasta")
+                _write_subset(fasta, recheck, queries)
+                _write_subset(db_path, changed_refs, delta_db)
+                align(queries, delta_db, os.path.join(work, "recheck.tsv"))
+                candidates.append(_hit_rows(load_best_hits_frame(os.path.join(work, "recheck.tsv"), logger, top_k=top_k)))
+
+            hits = pd.concat(candidates, ignore_index=True)
+            hits["db_order"] = hits["sseqid"].map(pd.Series(np.arange(len(references)), index=references.index))
+            hits = hits.sort_values(
+                ["evalue", "pident", "length", "db_order"], ascending=[True, False, False, True], kind="mergesort"
+            ).drop_duplicates(["qseqid", "sseqid"])
+            hits = hits[hits.groupby("qseqid", sort=False).cumcount().to_numpy() < top_k]
+            order = pd.Series(np.arange(len(labels)), index=pd.Index(list(labels), dtype=object))
+            hits = hits.iloc[np.argsort(hits["qseqid"].map(order).to_numpy(), kind="stable")]
+            hits["qseqid"] = hits["qseqid"].map(labels)
+            tmp_out = partial_path(tsv_out)
+            with open_text(tmp_out, "w") as fh:
+                hits[BLAST6_COLUMNS].to_csv(fh, sep="\t", index=False, header=False)
+            os.replace(tmp_out, tsv_out)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        logger.info(f"Incremental classification wrote {len(hits)} hits to {tsv_out}")
+        return True
+# ---
@@ -1,10 +1,156 @@
 # amplicon_tester/_io_utils.py
 import json
 import csv
+import gzip
+import io
 import logging
-from typing import Any, Dict, Callable
+import os
+import shutil
+import subprocess
+from typing import IO, Any, Dict, Callable, Iterable, Iterator, List, Optional, Set, Tuple, Union
 import pandas as pd
 
+try:
+    import zstandard
+except ImportError:  # optional; the zstd command-line tool is used when installed
+    zstandard = None
+
+# Amplicon fields the pipeline reads downstream; everything else ipcr emits is dropped while streaming.
+AMPLICON_FIELDS: Tuple[str, ...] = ("seq",)
+
+COMPRESSION_SUFFIXES: Dict[str, str] = {".gz": "gzip", ".bgz": "gzip", ".zst": "zstd"}
+_MAGIC: Dict[bytes, str] = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+# Multithreaded command-line codecs, preferred over the Python modules when installed.
+_CODEC_TOOLS: Dict[str, str] = {"gzip": "pigz", "zstd": "zstd"}
+
+def compression_of(path: str) -> Optional[str]:
+    """
+    Returns the compression of a file: 'gzip', 'zstd' or None.
+
+    The suffix decides (.gz/.bgz, .zst); an existing file without one is also recognized
+    by its magic bytes.
+
+    Args:
+        path: File path.
+    """
+    codec = COMPRESSION_SUFFIXES.get(os.path.splitext(str(path))[1].lower())
+    if codec is not None or not os.path.isfile(path):
+        return codec
+    with open(path, "rb") as fh:
+        head = fh.read(4)
+    return next((c for magic, c in _MAGIC.items() if head.startswith(magic)), None)
+
+def strip_compression_suffix(path: str) -> str:
+    """Returns a path without its compression suffix (e.g. 'summary.csv.gz' -> 'summary.csv')."""
+    root, ext = os.path.splitext(str(path))
+    return root if ext.lower() in COMPRESSION_SUFFIXES else str(path)
+
+def partial_path(path: str) -> str:
+    """
+    Returns the temporary path an output is written to before being renamed into place.
+
+    A compression suffix is kept at the end, so the partial file is compressed like the output.
+    """
+    root, ext = os.path.splitext(str(path))
+    return f"{root}.part{ext}" if ext.lower() in COMPRESSION_SUFFIXES else f"{path}.part"
+
+class _ProcessStream(io.RawIOBase):
+    """
+    Binary stream over a codec subprocess: reads its stdout, or writes to its stdin.
+
+    Closing waits for the process and raises OSError if it failed. A reader closed before
+    the end of the data stops the process without an error.
+    """
+
+    def __init__(self, proc: subprocess.Popen, cmd: List[str], sink: Optional[IO[bytes]] = None):
+        super().__init__()
+        self._proc = proc
+        self._cmd = cmd
+        self._sink = sink
+        self._eof = False
+
+    def readable(self) -> bool:
+        return self._sink is None
+
+    def writable(self) -> bool:
+        return self._sink is not None
+
+    def readinto(self, buffer) -> int:
+        n = self._proc.stdout.readinto(buffer)
+        self._eof = self._eof or n == 0
+        return n
+
+    def write(self, data) -> int:
+        self._proc.stdin.write(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        if self._sink is None:
+            self._proc.stdout.close()
+            if not self._eof:
+                self._proc.kill()
+                self._proc.wait()
+                return
+        else:
+            self._proc.stdin.close()
+        returncode = self._proc.wait()
+        if self._sink is not None:
+            self._sink.close()
+        if returncode != 0:
+            raise OSError(f"{' '.join(self._cmd)} failed with exit status {returncode}")
+
+def open_text(path: str, mode: str = "r", threads: Optional[int] = None) -> IO[str]:
+    """
+    Opens a text file for streaming, transparently (de)compressing gzip and zstd files.
+
+    Compressed files go through `pigz` or `zstd` subprocesses when they are installed,
+    so (de)compression runs on other cores (multithreaded compression with `threads`),
+    and through the gzip/zstandard modules otherwise. Plain files are opened with `open()`.
+    Nothing is decompressed to disk.
+
+    Args:
+        path: File path; compression is inferred by `compression_of` (by suffix when writing).
+        mode: 'r' (read), 'w' (write) or 'a' (append; plain and gzip only).
+        threads: Compression threads for the command-line tools (default: all cores).
+
+    Returns:
+        A text-mode file object; use it as a context manager.
+
+    Raises:
+        ValueError: For a zstd file with neither the zstd tool nor the zstandard module.
+    """
+    path = str(path)
+    mode = mode.replace("t", "")
+    codec = COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower()) if mode != "r" else compression_of(path)
+    if codec is None:
+        return open(path, mode, newline="" if mode != "r" else None)
+
+    tool = shutil.which(_CODEC_TOOLS[codec])
+    if tool and mode in ("r", "w"):
+        if mode == "r":
+            cmd = [tool, "-dc"] + (["-q"] if codec == "zstd" else []) + [path]
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+            raw = _ProcessStream(proc, cmd)
+            return io.TextIOWrapper(io.BufferedReader(raw, 1 << 20), encoding="utf-8")
+        if codec == "zstd":
+            cmd = [tool, "-q", "-c", f"-T{threads or 0}"]
+        else:
+            cmd = [tool, "-c"] + (["-p", str(threads)] if threads else [])
+        sink = open(path, "wb")
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=sink)
+        raw = _ProcessStream(proc, cmd, sink)
+        return io.TextIOWrapper(io.BufferedWriter(raw, 1 << 20), encoding="utf-8", newline="")
+    if codec == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="" if mode != "r" else None)
+    if zstandard is None:
+        raise ValueError(f"{path}: reading or writing zstd files needs the zstd tool or the zstandard module")
+    if mode == "a":
+        raise ValueError(f"{path}: appending to zstd files is not supported")
+    return zstandard.open(path, mode + "t", encoding="utf-8", newline="" if mode != "r" else None)
+
 def load_expected_taxonomy(
     filepath: str,
     Taxonomy: Callable[[str], Any],
@@ -23,7 +169,7 @@ def load_expected_taxonomy(
     """
     logger.info(f"Loading expected taxonomy from {filepath}")
     expected: Dict[str, Any] = {}
-    with open(filepath, 'r') as taxonomy_file:
+    with open_text(filepath) as taxonomy_file:
         for line in taxonomy_file:
             seq_id, taxonomy = line.strip().split(maxsplit=1)
             seq_id = seq_id.replace('>', '')
@@ -48,36 +194,166 @@ def load_amplicon_json(
         Dict mapping sequence IDs to amplicon dictionaries.
     """
     logger.info(f"Loading amplicon JSON from {filepath}")
-    with open(filepath) as f:
+    with open_text(filepath) as f:
         ipcr_results = json.load(f)
     result: Dict[str, dict] = {amp['sequence_id'].split(':')[0]: amp for amp in ipcr_results}
     logger.info(f"Loaded {len(result)} amplicon entries.")
     return result
 
+def iter_amplicon_json(
+    filepath: str,
+    logger: logging.Logger,
+    fields: Optional[Tuple[str, ...]] = AMPLICON_FIELDS,
+    chunk_size: int = 1 << 20
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Streams amplicon records from an ipcr JSON array one object at a time.
+
+    Only a bounded read buffer, the current record and the IDs seen so far are held
+    in memory, so peak memory does not grow with the size of the products.
+
+    When a sequence has several products, the last one is kept, as `load_amplicon_json`
+    does: ipcr writes all products of a sequence together, so a run of records with the
+    same ID is collapsed to its last record. A later, non-adjacent record for an ID that
+    was already yielded cannot replace it and is skipped with a warning.
+
+    Args:
+        filepath: Path to JSON file (list of dicts).
+        logger: Logger for messages.
+        fields: Amplicon keys to keep (None keeps the full record).
+        chunk_size: Number of characters read from the file at a time.
+
+    Yields:
+        Tuples of (sequence ID, amplicon dictionary), one per sequence ID.
+    """
+    logger.info(f"Streaming amplicon JSON from {filepath}")
+    decoder = json.JSONDecoder()
+    count = 0
+    yielded: Set[str] = set()
+    pending: Optional[Tuple[str, dict]] = None
+    n_skipped = 0
+    with open_text(filepath) as fh:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def _skip(pos: int, chars: str) -> int:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] in chars):
+                pos += 1
+            return pos
+
+        while True:
+            pos = _skip(pos, "," if started else "")
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"{filepath}: unexpected end of JSON array")
+                chunk = fh.read(chunk_size)
+                eof = not chunk
+                buf, pos = chunk, 0
+                continue
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{filepath}: expected a JSON array of amplicon records")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                break
+            try:
+                amp, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = fh.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            pos = end
+            count += 1
+            seq_id = amp['sequence_id'].split(':')[0]
+            if fields is not None:
+                amp = {k: amp[k] for k in fields if k in amp}
+            if pending is not None and pending[0] != seq_id:
+                yielded.add(pending[0])
+                yield pending
+            if seq_id in yielded:
+                n_skipped += 1
+                pending = None
+                continue
+            pending = (seq_id, amp)
+    if pending is not None:
+        yielded.add(pending[0])
+        yield pending
+    if n_skipped:
+        logger.warning(
+            f"Skipped {n_skipped} products listed apart from earlier products of the same sequence; "
+            "kept the earlier ones."
+        )
+    logger.info(f"Streamed {count} amplicon records for {len(yielded)} sequences.")
+
+def iter_fasta(filepath: str) -> Iterator[Tuple[str, str]]:
+    """
+    Iterates over the records of a multi-FASTA file without loading it into memory.
+
+    Args:
+        filepath: Path to FASTA file.
+
+    Yields:
+        Tuples of (sequence ID, sequence), where the ID is the first
+        whitespace-delimited token of the header line.
+    """
+    seq_id: Optional[str] = None
+    chunks: List[str] = []
+    with open_text(filepath) as fasta:
+        for line in fasta:
+            line = line.rstrip()
+            if line.startswith(">"):
+                if seq_id is not None:
+                    yield seq_id, "".join(chunks)
+                header = line[1:].split(maxsplit=1)
+                seq_id = header[0] if header else ""
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if seq_id is not None:
+        yield seq_id, "".join(chunks)
+
 def write_fasta(
-    amplicons: Dict[str, dict],
+    amplicons: Union[Dict[str, dict], Iterable[Tuple[str, dict]]],
     output: str,
     logger: logging.Logger
-) -> None:
+) -> Set[str]:
     """
-    Writes a dictionary of amplicons to a multi-FASTA file.
+    Writes amplicons to a multi-FASTA file, consuming them incrementally.
 
     Args:
-        amplicons: Dict mapping sequence IDs to amplicon dictionaries (must contain 'seq').
+        amplicons: Dict mapping sequence IDs to amplicon dictionaries (must contain 'seq'),
+            or an iterable of (sequence ID, amplicon) pairs such as `iter_amplicon_json`.
+            When a sequence ID repeats, only its first amplicon is written.
         output: Output FASTA file path.
         logger: Logger for messages.
+
+    Returns:
+        Set of sequence IDs written (the amplified sequences).
     """
     logger.info(f"Writing multi-FASTA to {output}")
-    with open(output, "w") as fasta:
-        for seq_id, amplicon in amplicons.items():
+    records = amplicons.items() if isinstance(amplicons, dict) else amplicons
+    written: Set[str] = set()
+    with open_text(output, "w") as fasta:
+        for seq_id, amplicon in records:
+            if seq_id in written:
+                continue
+            written.add(seq_id)
             seq = amplicon["seq"]
             fasta.write(f">{seq_id}\n")
             for i in range(0, len(seq), 80):
                 fasta.write(seq[i:i+80] + "\n")
-    logger.info("Multi-FASTA writing complete.")
+    logger.info(f"Multi-FASTA writing complete ({len(written)} sequences).")
+    return written
 
 def save_summary(
-    summary: list,
+    summary: Union[list, pd.DataFrame],
     jsonl_path: str,
     csv_path: str,
     logger: logging.Logger
@@ -86,17 +362,13 @@ def save_summary(
     Saves a summary as JSONL and CSV files.
 
     Args:
-        summary: List of dictionaries (one per amplicon/taxon).
+        summary: List of dictionaries (one per amplicon/taxon), or a DataFrame
+            with the same columns (see `summarize_frame`).
         jsonl_path: Output path for JSONL file.
         csv_path: Output path for CSV file.
         logger: Logger for messages.
     """
     logger.info(f"Saving summary to {jsonl_path} and {csv_path}")
-    # Save JSONL
-    with open(jsonl_path, "w") as fh:
-        for rec in summary:
-            fh.write(json.dumps(rec) + "\n")
-    # Save CSV
     csv_fields = [
         "sequence_id",
         "expected_taxonomy",
@@ -105,9 +377,24 @@ def save_summary(
         "deepest_rank",
         "top_vsearch_taxonomy",
         "top_vsearch_pident",
-        "top_vsearch_sseqid"
+        "top_vsearch_sseqid",
+        "shared_by_taxa",
+        "ambiguous",
+        "tied_taxa"
     ]
-    with open(csv_path, "w", newline='') as fh:
+    if isinstance(summary, pd.DataFrame):
+        with open_text(jsonl_path, "w") as fh:
+            summary.to_json(fh, orient="records", lines=True)
+        with open_text(csv_path, "w") as fh:
+            summary.to_csv(fh, columns=csv_fields, index=False, lineterminator="\r\n")
+        logger.info("Summary files saved.")
+        return
+    # Save JSONL
+    with open_text(jsonl_path, "w") as fh:
+        for rec in summary:
+            fh.write(json.dumps(rec) + "\n")
+    # Save CSV
+    with open_text(csv_path, "w") as fh:
         writer = csv.DictWriter(fh, fieldnames=csv_fields)
         writer.writeheader()
         for rec in summary:
@@ -127,7 +414,35 @@ def save_dataframe(
         out_csv: Output CSV file path.
         logger: Logger for messages.
     """
-    df.to_csv(out_csv, index=False)
+    with open_text(out_csv, "w") as fh:
+        df.to_csv(fh, index=False)
     logger.info(f"Dataframe saved to {out_csv}")
     logger.debug(df)
-# ---
\ No newline at end of file
+
+def save_parquet(
+    df: pd.DataFrame,
+    out_parquet: str,
+    logger: logging.Logger
+) -> bool:
+    """
+    Saves a pandas DataFrame as Parquet, keeping its column types.
+
+    Parquet support is optional (pyarrow or fastparquet); without an engine the file is
+    skipped with a warning and the CSV outputs remain the only copy.
+
+    Args:
+        df: Pandas DataFrame to save.
+        out_parquet: Output Parquet file path.
+        logger: Logger for messages.
+
+    Returns:
+        True if the file was written.
+    """
+    try:
+        df.to_parquet(out_parquet, index=False)
+    except ImportError:
+        logger.warning(f"Skipping {out_parquet}: no Parquet engine available (install pyarrow)")
+        return False
+    logger.info(f"Dataframe saved to {out_parquet}")
+    return True
+# ---
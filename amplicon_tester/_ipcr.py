@@ -0,0 +1,282 @@
+# amplicon_tester/_ipcr.py
+import bisect
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from amplicon_tester._io_utils import iter_fasta
+
+IUPAC: Dict[str, str] = {
+    "A": "A", "C": "C", "G": "G", "T": "T", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT",
+}
+
+_COMPLEMENT = str.maketrans(
+    "ACGTURYSWKMBDHVNacgturyswkmbdhvn",
+    "TGCAAYRSWMKVHDBNtgcaayrswmkvhdbn",
+)
+
+# One translation table per nucleotide, turning a sequence into a string of
+# '1'/'0' flags that int(..., 2) converts to a bitmask in a single C call.
+_BIT_TABLES: Dict[str, dict] = {}
+for _base in "ACGT":
+    _table = {c: ord("0") for c in range(128)}
+    for _c in (_base, _base.lower()) + (("U", "u") if _base == "T" else ()):
+        _table[ord(_c)] = ord("1")
+    _BIT_TABLES[_base] = _table
+
+@dataclass(frozen=True)
+class PrimerPair:
+    """
+    A forward/reverse primer pair, both written 5'->3' and possibly IUPAC-degenerate.
+
+    Attributes:
+        forward (str): Forward primer sequence.
+        reverse (str): Reverse primer sequence.
+    """
+    forward: str
+    reverse: str
+
+def reverse_complement(seq: str) -> str:
+    """
+    Returns the reverse complement of an IUPAC nucleotide sequence.
+
+    Args:
+        seq: Nucleotide sequence.
+
+    Returns:
+        Reverse-complemented sequence.
+    """
+    return seq.translate(_COMPLEMENT)[::-1]
+
+def _base_masks(seq: str) -> Dict[str, int]:
+    """
+    Encodes a sequence as one bitmask per nucleotide (bit i set when seq[i] is that base).
+    Ambiguous bases in the sequence are never set, so they always count as mismatches.
+    """
+    rev = seq[::-1]
+    return {base: int(rev.translate(table) or "0", 2) for base, table in _BIT_TABLES.items()}
+
+def _find_sites(masks: Dict[str, int], seq_len: int, primer: str, max_mismatches: int) -> Dict[int, int]:
+    """
+    Finds every start position where a degenerate primer matches with at most
+    `max_mismatches` substitutions, using bit-parallel mismatch counting.
+
+    Args:
+        masks: Per-base bitmasks of the target sequence.
+        seq_len: Length of the target sequence.
+        primer: Primer sequence (IUPAC codes allowed).
+        max_mismatches: Mismatch budget.
+
+    Returns:
+        Dict mapping start position to mismatch count.
+    """
+    plen = len(primer)
+    if plen == 0 or seq_len < plen:
+        return {}
+    valid = (1 << (seq_len - plen + 1)) - 1
+    # Bit-sliced saturating counter: counters[b] holds bit b of each position's mismatch count.
+    n_bits = max(1, (max_mismatches + 1).bit_length())
+    counters = [0] * n_bits
+    overflow = 0
+    exact = valid
+    for offset, code in enumerate(primer.upper()):
+        allowed = 0
+        for base in IUPAC.get(code, ""):
+            allowed |= masks[base]
+        hit = (allowed >> offset) & valid
+        if max_mismatches == 0:
+            exact &= hit
+            if not exact:
+                return {}
+            continue
+        carry = valid & ~hit
+        for b in range(n_bits):
+            counters[b], carry = counters[b] ^ carry, counters[b] & carry
+            if not carry:
+                break
+        overflow |= carry
+
+    if max_mismatches == 0:
+        ok = exact
+        counts = None
+    else:
+        ok = 0
+        for value in range(max_mismatches + 1):
+            eq = valid
+            for b in range(n_bits):
+                eq &= counters[b] if (value >> b) & 1 else ~counters[b]
+            ok |= eq
+        ok &= valid & ~overflow
+        counts = counters
+
+    sites: Dict[int, int] = {}
+    while ok:
+        low = ok & -ok
+        pos = low.bit_length() - 1
+        ok ^= low
+        mm = 0
+        if counts is not None:
+            for b in range(n_bits):
+                mm |= ((counts[b] >> pos) & 1) << b
+        sites[pos] = mm
+    return sites
+
+def _products_on_strand(
+    seq: str,
+    pair: PrimerPair,
+    max_mismatches: int,
+    min_length: int,
+    max_length: int
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Pairs forward sites with downstream reverse-primer sites on one strand.
+
+    Returns:
+        List of (start, end, fwd_mismatches, rev_mismatches), end exclusive.
+    """
+    masks = _base_masks(seq)
+    fwd_sites = _find_sites(masks, len(seq), pair.forward, max_mismatches)
+    if not fwd_sites:
+        return []
+    rev_sites = _find_sites(masks, len(seq), reverse_complement(pair.reverse), max_mismatches)
+    if not rev_sites:
+        return []
+    flen, rlen = len(pair.forward), len(pair.reverse)
+    rev_starts = sorted(rev_sites)
+    products = []
+    for start, fwd_mm in sorted(fwd_sites.items()):
+        lo = max(start + flen, start + min_length - rlen)
+        hi = start + max_length - rlen
+        for i in range(bisect.bisect_left(rev_starts, lo), bisect.bisect_right(rev_starts, hi)):
+            r = rev_starts[i]
+            products.append((start, r + rlen, fwd_mm, rev_sites[r]))
+    return products
+
+def find_amplicons(
+    seq_id: str,
+    seq: str,
+    pair: PrimerPair,
+    max_mismatches: int = 0,
+    min_length: int = 50,
+    max_length: int = 2000
+) -> List[dict]:
+    """
+    Finds all in silico PCR products of a primer pair on both strands of a sequence.
+
+    Args:
+        seq_id: Sequence ID, copied into each product.
+        seq: Template sequence.
+        pair: Primer pair.
+        max_mismatches: Maximum substitutions allowed per primer site.
+        min_length: Minimum product length (primers included).
+        max_length: Maximum product length (primers included).
+
+    Returns:
+        List of amplicon dictionaries with the same fields as ipcr's JSON output
+        ('sequence_id', 'start', 'end', 'length', 'type', 'fwd_mm', 'rev_mm', 'seq').
+    """
+    seq = seq.upper()
+    seq_len = len(seq)
+    amplicons: List[dict] = []
+    for strand, template in (("forward", seq), ("revcomp", reverse_complement(seq))):
+        for start, end, fwd_mm, rev_mm in _products_on_strand(template, pair, max_mismatches, min_length, max_length):
+            if strand == "forward":
+                ref_start, ref_end = start, end
+            else:
+                ref_start, ref_end = seq_len - end, seq_len - start
+            amplicons.append({
+                "sequence_id": seq_id,
+                "start": ref_start,
+                "end": ref_end,
+                "length": end - start,
+                "type": strand,
+                "fwd_mm": fwd_mm,
+                "rev_mm": rev_mm,
+                "seq": template[start:end],
+            })
+    return amplicons
+
+def _scan_chunk(
+    records: List[Tuple[str, str]],
+    pair: PrimerPair,
+    max_mismatches: int,
+    min_length: int,
+    max_length: int
+) -> List[Tuple[str, dict]]:
+    """
+    Worker entry point: keeps the best product (fewest mismatches, then shortest) per record.
+    """
+    found = []
+    for seq_id, seq in records:
+        products = find_amplicons(seq_id, seq, pair, max_mismatches, min_length, max_length)
+        if products:
+            best = min(products, key=lambda a: (a["fwd_mm"] + a["rev_mm"], a["length"]))
+            found.append((seq_id, best))
+    return found
+
+def _chunked(records: Iterable[Tuple[str, str]], chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    it = iter(records)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_pcr_amplicons(
+    fasta_path: str,
+    pair: PrimerPair,
+    logger: logging.Logger,
+    max_mismatches: int = 0,
+    min_length: int = 50,
+    max_length: int = 2000,
+    processes: Optional[int] = None,
+    chunk_size: int = 500
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Runs in silico PCR over a reference FASTA with a process pool, yielding amplicons in file order.
+
+    FASTA records are read lazily and dispatched in chunks; at most two chunks per
+    worker are in flight, so memory stays bounded regardless of database size.
+
+    Args:
+        fasta_path: Reference FASTA to scan.
+        pair: Primer pair.
+        logger: Logger for messages.
+        max_mismatches: Maximum substitutions allowed per primer site.
+        min_length: Minimum product length (primers included).
+        max_length: Maximum product length (primers included).
+        processes: Worker processes (defaults to the CPU count).
+        chunk_size: Number of FASTA records per task.
+
+    Yields:
+        Tuples of (sequence ID, amplicon dictionary), one per amplified sequence.
+    """
+    processes = processes or os.cpu_count() or 1
+    logger.info(
+        f"Running in silico PCR ({pair.forward} / {pair.reverse}, <= {max_mismatches} mismatches, "
+        f"{min_length}-{max_length} bp) on {fasta_path} with {processes} processes"
+    )
+    scanned = amplified = 0
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending: deque = deque()
+        chunks = _chunked(iter_fasta(fasta_path), chunk_size)
+        for chunk in chunks:
+            scanned += len(chunk)
+            pending.append(executor.submit(_scan_chunk, chunk, pair, max_mismatches, min_length, max_length))
+            if len(pending) < 2 * processes:
+                continue
+            for item in pending.popleft().result():
+                amplified += 1
+                yield item
+        while pending:
+            for item in pending.popleft().result():
+                amplified += 1
+                yield item
+    logger.info(f"In silico PCR amplified {amplified} of {scanned} reference sequences.")
+# ---
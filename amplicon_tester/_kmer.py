@@ -0,0 +1,408 @@
+# amplicon_tester/_kmer.py
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from amplicon_tester._io_utils import iter_fasta, open_text, partial_path
+
+KMER_INDEX_VERSION = 1
+# Canonical k-mers are packed 2 bits per base into int64 codes. The offsets table is dense,
+# 4**k + 1 int64 entries, and a build holds it twice: 2 x 537 MB at k = 13, 4x that per step up.
+MAX_K = 13
+# Base -> 2-bit code; anything else (N, IUPAC, gaps) is 4 and breaks the k-mers spanning it.
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _bases in enumerate(("Aa", "Cc", "Gg", "TtUu")):
+    for _b in _bases:
+        _BASE_CODES[ord(_b)] = _i
+
+def kmer_codes(seq: str, k: int) -> np.ndarray:
+    """
+    Returns the distinct canonical k-mers of a sequence.
+
+    A k-mer and its reverse complement share one code (the smaller of the two), so queries
+    match references on either strand. K-mers containing non-ACGTU characters are skipped.
+
+    Args:
+        seq: Nucleotide sequence.
+        k: K-mer size (1..MAX_K).
+
+    Returns:
+        Sorted int64 array of distinct codes.
+    """
+    v = _BASE_CODES[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+    n = len(v) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    bad = np.concatenate(([0], np.cumsum(v > 3)))
+    valid = bad[k:] == bad[:-k]
+    v = v.astype(np.int64)
+    v[v > 3] = 0
+    forward = np.zeros(n, dtype=np.int64)
+    reverse = np.zeros(n, dtype=np.int64)
+    for j in range(k):
+        forward = (forward << 2) | v[j:j + n]
+        reverse |= (3 - v[j:j + n]) << (2 * j)
+    return np.unique(np.minimum(forward, reverse)[valid])
+
+def _chunked(records: Iterable[Tuple[str, str]], chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    chunk: List[Tuple[str, str]] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _chunk_kmers(records: List[Tuple[str, str]], k: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Worker entry point: returns (IDs, concatenated codes, codes per record) for a chunk.
+    """
+    codes = [kmer_codes(seq, k) for _, seq in records]
+    return (
+        [seq_id for seq_id, _ in records],
+        np.concatenate(codes) if codes else np.empty(0, dtype=np.int64),
+        np.array([len(c) for c in codes], dtype=np.int64),
+    )
+
+def _map_ordered(executor: ProcessPoolExecutor, fn, chunks: Iterable, processes: int, *args) -> Iterator:
+    """Runs fn over chunks in the pool, yielding results in input order with bounded look-ahead."""
+    pending: deque = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(fn, chunk, *args))
+        if len(pending) >= 2 * processes:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class KmerIndex:
+    """
+    Memory-mapped inverted index from canonical k-mers to the reference sequences containing them.
+
+    The index is a directory holding CSR arrays as .npy files: `offsets.npy` (int64, 4**k + 1
+    entries) delimits, for each k-mer code, a run of `postings.npy` (uint32 reference numbers,
+    ascending). Both are opened with mmap, so worker processes share one copy through the
+    page cache and only the runs a query touches are read.
+
+    Attributes:
+        path (str): Index directory.
+        k (int): K-mer size.
+        meta (dict): Contents of meta.json (version, k, reference stamp, counts).
+        offsets (np.ndarray): Run boundaries per k-mer code (memory-mapped).
+        postings (np.ndarray): Reference numbers (memory-mapped).
+        ids (List[str]): Reference sequence IDs, by reference number.
+    """
+    META = "meta.json"
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Index directory written by `build`.
+        """
+        self.path: str = path
+        with open(os.path.join(path, self.META)) as fh:
+            self.meta: dict = json.load(fh)
+        self.k: int = self.meta["k"]
+        self.offsets: np.ndarray = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.postings: np.ndarray = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        with open(os.path.join(path, "ids.txt")) as fh:
+            self.ids: List[str] = fh.read().split("\n")[:-1]
+
+    @staticmethod
+    def reference_stamp(fasta_path: str) -> List:
+        """Returns the (real path, size, mtime) that ties an index to its reference FASTA."""
+        real = os.path.realpath(fasta_path)
+        st = os.stat(real)
+        return [real, st.st_size, st.st_mtime_ns]
+
+    @classmethod
+    def is_current(cls, path: str, fasta_path: str, k: int) -> bool:
+        """Returns True if `path` holds a complete index of `fasta_path` with this k and layout version."""
+        try:
+            with open(os.path.join(path, cls.META)) as fh:
+                meta = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return False
+        return (
+            meta.get("version") == KMER_INDEX_VERSION and meta.get("k") == k
+            and meta.get("reference") == cls.reference_stamp(fasta_path)
+        )
+
+    @classmethod
+    def build(
+        cls,
+        fasta_path: str,
+        path: str,
+        k: int,
+        logger: logging.Logger,
+        processes: Optional[int] = None,
+        chunk_size: int = 2000
+    ) -> "KmerIndex":
+        """
+        Builds the index of a reference FASTA in two streaming passes.
+
+        The first pass counts the references per k-mer to lay out the offsets; the second
+        writes each chunk's postings straight into the memory-mapped postings file. K-mers
+        are extracted by a process pool; memory stays bounded by the offsets table plus a
+        few chunks, whatever the size of the reference. The index is written to a temporary
+        directory and renamed into place when complete.
+
+        Args:
+            fasta_path: Reference FASTA.
+            path: Index directory to create (replaced if it exists).
+            k: K-mer size (1..MAX_K; odd sizes avoid palindromic k-mers).
+            logger: Logger for messages.
+            processes: Worker processes (defaults to the CPU count).
+            chunk_size: FASTA records per task.
+
+        Returns:
+            The opened index.
+        """
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k must be between 1 and {MAX_K}, got {k}")
+        processes = processes or os.cpu_count() or 1
+        logger.info(f"Building {k}-mer index of {fasta_path} in {path} with {processes} processes")
+        n_codes = 4 ** k
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        # Counts per k-mer accumulate in offsets[1:], which a cumulative sum then turns into offsets.
+        offsets = np.zeros(n_codes + 1, dtype=np.int64)
+        n_seqs = 0
+        with ProcessPoolExecutor(max_workers=processes) as executor, \
+                open(os.path.join(tmp, "ids.txt"), "w") as ids_out:
+            chunks = _chunked(iter_fasta(fasta_path), chunk_size)
+            for ids, codes, _ in _map_ordered(executor, _chunk_kmers, chunks, processes, k):
+                # Only the k-mers present in the chunk are counted (no dense 4**k temporary).
+                uniq, n = np.unique(codes, return_counts=True)
+                offsets[uniq + 1] += n
+                ids_out.writelines(f"{seq_id}\n" for seq_id in ids)
+                n_seqs += len(ids)
+            if n_seqs >= 2 ** 32:
+                raise ValueError(f"{fasta_path}: too many sequences for a uint32 index ({n_seqs})")
+
+            np.cumsum(offsets, out=offsets)
+            n_postings = int(offsets[-1])
+            np.save(os.path.join(tmp, "offsets.npy"), offsets)
+            postings = np.lib.format.open_memmap(
+                os.path.join(tmp, "postings.npy"), mode="w+", dtype=np.uint32, shape=(n_postings,)
+            )
+            cursor = offsets[:-1].copy()
+            first = 0
+            chunks = _chunked(iter_fasta(fasta_path), chunk_size)
+            for ids, codes, per_seq in _map_ordered(executor, _chunk_kmers, chunks, processes, k):
+                seqs = np.repeat(np.arange(first, first + len(ids), dtype=np.uint32), per_seq)
+                first += len(ids)
+                # Stable sort keeps reference numbers ascending within each k-mer's run.
+                order = np.argsort(codes, kind="stable")
+                codes, seqs = codes[order], seqs[order]
+                uniq, starts, run_lengths = np.unique(codes, return_index=True, return_counts=True)
+                rank = np.arange(len(codes)) - np.repeat(starts, run_lengths)
+                postings[cursor[codes] + rank] = seqs
+                cursor[uniq] += run_lengths
+            postings.flush()
+            del postings
+
+        meta = {
+            "version": KMER_INDEX_VERSION,
+            "k": k,
+            "reference": cls.reference_stamp(fasta_path),
+            "n_sequences": n_seqs,
+            "n_postings": n_postings,
+        }
+        with open(os.path.join(tmp, cls.META), "w") as fh:
+            json.dump(meta, fh, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        logger.info(f"Indexed {n_postings} k-mer postings over {n_seqs} reference sequences.")
+        return cls(path)
+
+    def top_hits(
+        self,
+        seq: str,
+        max_hits: int = 1,
+        max_postings: Optional[int] = None
+    ) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Finds the references sharing the most distinct k-mers with a query.
+
+        K-mers found in more than `max_postings` references (conserved k-mers, which cost
+        the most to count and discriminate least) are not looked up and are left out of the
+        score altogether, so identity is estimated over the looked-up k-mers only. If all of
+        a query's k-mers are that common, all are looked up.
+
+        Args:
+            seq: Query sequence.
+            max_hits: Maximum references to return.
+            max_postings: Run-length limit for looked-up k-mers; None looks up all.
+
+        Returns:
+            (number of query k-mers scored, [(reference number, shared k-mers), ...]) with
+            the references ordered by shared k-mers, then reference order.
+        """
+        codes = kmer_codes(seq, self.k)
+        starts = self.offsets[codes]
+        ends = self.offsets[codes + 1]
+        if max_postings is not None:
+            keep = (ends - starts) <= max_postings
+            if keep.any():
+                starts, ends = starts[keep], ends[keep]
+        n_scored = len(starts)
+        if not n_scored:
+            return 0, []
+        postings = self.postings
+        counts = np.bincount(np.concatenate([postings[s:e] for s, e in zip(starts, ends)]))
+        if not len(counts):
+            return n_scored, []
+        if max_hits == 1:
+            best = int(counts.argmax())
+            return n_scored, [(best, int(counts[best]))]
+        top = np.flatnonzero(counts)
+        if len(top) > max_hits:
+            threshold = np.partition(counts[top], len(top) - max_hits)[len(top) - max_hits]
+            top = top[counts[top] >= threshold]
+        top = top[np.lexsort((top, -counts[top]))][:max_hits]
+        return n_scored, [(int(i), int(counts[i])) for i in top]
+
+_index_lock = threading.Lock()
+
+def ensure_kmer_index(
+    fasta_path: str,
+    path: str,
+    k: int,
+    logger: logging.Logger,
+    processes: Optional[int] = None
+) -> KmerIndex:
+    """
+    Opens the k-mer index of a reference FASTA, building it first if it is missing, was
+    built with another k, or predates a change to the FASTA (size or modification time).
+
+    Builds are serialized within the process, so concurrent batch jobs build it once.
+
+    Args:
+        fasta_path: Reference FASTA.
+        path: Index directory.
+        k: K-mer size.
+        logger: Logger for messages.
+        processes: Worker processes for a build.
+
+    Returns:
+        The opened index.
+    """
+    with _index_lock:
+        if KmerIndex.is_current(path, fasta_path, k):
+            logger.info(f"Using {k}-mer index {path}")
+            return KmerIndex(path)
+        return KmerIndex.build(fasta_path, path, k, logger, processes)
+
+def kmer_identity(shared: int, n_kmers: int, k: int) -> float:
+    """
+    Estimates percent identity from k-mer containment, as Mash Screen does.
+
+    With per-base identity p, a query k-mer survives unchanged with probability p**k, so
+    p ~= (shared / n_kmers) ** (1 / k).
+
+    Args:
+        shared: Query k-mers found in the reference.
+        n_kmers: Query k-mers scored.
+        k: K-mer size.
+
+    Returns:
+        Percent identity (0-100), rounded to one decimal like VSEARCH.
+    """
+    if not n_kmers:
+        return 0.0
+    return round(100.0 * (shared / n_kmers) ** (1.0 / k), 1)
+
+_worker_index: Dict[str, KmerIndex] = {}
+
+def _classify_chunk(
+    records: List[Tuple[str, str]],
+    index_path: str,
+    identity: float,
+    max_hits: int,
+    max_postings: Optional[int]
+) -> List[str]:
+    """
+    Worker entry point: returns BLAST6 lines for a chunk of queries.
+    """
+    index = _worker_index.get(index_path)
+    if index is None:
+        index = _worker_index[index_path] = KmerIndex(index_path)
+    lines: List[str] = []
+    for seq_id, seq in records:
+        n_kmers, hits = index.top_hits(seq, max_hits, max_postings)
+        length = len(seq)
+        for ref, shared in hits:
+            pident = kmer_identity(shared, n_kmers, index.k)
+            if pident < identity * 100.0:
+                break
+            mismatch = int(round(length * (100.0 - pident) / 100.0))
+            lines.append(
+                f"{seq_id}\t{index.ids[ref]}\t{pident:.1f}\t{length}\t{mismatch}\t0"
+                f"\t1\t{length}\t0\t0\t-1\t0\n"
+            )
+    return lines
+
+def classify_kmer(
+    query_fasta: str,
+    index: KmerIndex,
+    tsv_out: str,
+    logger: logging.Logger,
+    identity: float = 0.97,
+    processes: Optional[int] = None,
+    max_hits: int = 1,
+    max_postings: Optional[int] = None,
+    chunk_size: int = 500
+) -> None:
+    """
+    Classifies query sequences against a k-mer index, writing VSEARCH-style BLAST6 rows.
+
+    Each query's nearest references are those sharing the most distinct k-mers; identity
+    is estimated from k-mer containment (`kmer_identity`) and hits below `identity` are
+    dropped, as with `vsearch --id`. No alignment is made: `length` is the query length,
+    `mismatch` is derived from the identity estimate, `gapopen`, `sstart` and `send` are 0,
+    and e-value and bit score are -1 and 0 as in VSEARCH's own BLAST6 output. The rows load
+    with `load_best_hits_frame` like VSEARCH's.
+
+    Args:
+        query_fasta: Query FASTA (e.g. the dereplicated amplicons).
+        index: Reference k-mer index.
+        tsv_out: Output BLAST6 TSV.
+        logger: Logger for messages.
+        identity: Minimum identity (0-1) for a hit to be reported.
+        processes: Worker processes (defaults to the CPU count).
+        max_hits: Hits reported per query, best first.
+        max_postings: See `KmerIndex.top_hits`.
+        chunk_size: Queries per task.
+    """
+    processes = processes or os.cpu_count() or 1
+    logger.info(f"Classifying {query_fasta} against {index.k}-mer index {index.path} with {processes} processes")
+    n_queries = n_rows = 0
+
+    def counted(chunks: Iterable[List[Tuple[str, str]]]) -> Iterator[List[Tuple[str, str]]]:
+        nonlocal n_queries
+        for chunk in chunks:
+            n_queries += len(chunk)
+            yield chunk
+
+    tmp = partial_path(tsv_out)
+    # Workers are forked after the output is opened; they must exit before it is closed, or a
+    # compressor subprocess would never see the end of its input.
+    with open_text(tmp, "w") as out, ProcessPoolExecutor(max_workers=processes) as executor:
+        chunks = counted(_chunked(iter_fasta(query_fasta), chunk_size))
+        for lines in _map_ordered(
+            executor, _classify_chunk, chunks, processes, index.path, identity, max_hits, max_postings
+        ):
+            out.writelines(lines)
+            n_rows += len(lines)
+    os.replace(tmp, tsv_out)
+    logger.info(f"K-mer classification wrote {n_rows} hits for {n_queries} queries to {tsv_out}.")
+# ---
@@ -0,0 +1,177 @@
+# amplicon_tester/_pipeline.py
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a pipeline graph.
+
+    `run`, `fingerprint` and `resume` are called with a dict mapping each dependency's
+    name to its result.
+
+    Attributes:
+        name (str): Stage name (unique within the graph).
+        run (Callable[[Dict[str, Any]], Any]): Computes the stage result.
+        deps (Tuple[str, ...]): Stages whose results this stage needs.
+        outputs (Tuple[str, ...]): Files the stage writes; checked by its completion marker.
+        fingerprint (Optional[Callable[[Dict[str, Any]], Optional[str]]]): Identifies the stage's
+            inputs and parameters. Stages with a fingerprint (that is not None) write a completion
+            marker and are resumed instead of rerun while the marker still matches.
+        resume (Optional[Callable[[Dict[str, Any]], Any]]): Returns the result of a completed
+            stage from its outputs; required with `fingerprint`.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    fingerprint: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None
+    resume: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+class StageGraph:
+    """
+    Runs a dependency graph of stages, starting every stage as soon as its dependencies
+    have finished, so independent stages overlap in a thread pool.
+
+    Threads suit this pipeline: the long stages (VSEARCH, in silico PCR) run in subprocesses
+    or process pools, and the Python stages overlapping them mostly parse files.
+
+    A stage with a fingerprint records `<marker_dir>/<name>.done.json` (fingerprint plus the
+    size and mtime of its outputs) when it finishes. On the next run the stage is resumed if
+    the fingerprint is unchanged and its outputs are untouched.
+
+    Attributes:
+        stages (Dict[str, Stage]): Stages by name, in topological order.
+        logger (logging.Logger): Logger for messages.
+        marker_dir (Optional[str]): Directory for completion markers; None disables resume.
+    """
+
+    def __init__(self, stages: List[Stage], logger: logging.Logger, marker_dir: Optional[str] = None):
+        """
+        Args:
+            stages: Stages of the graph, in any order.
+            logger: Logger for messages.
+            marker_dir: Directory for completion markers (created when first needed).
+
+        Raises:
+            ValueError: On duplicate names, unknown dependencies, cycles, or a fingerprint without resume.
+        """
+        by_name: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in by_name:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            if stage.fingerprint is not None and stage.resume is None:
+                raise ValueError(f"Stage {stage.name} has a fingerprint but no resume function")
+            by_name[stage.name] = stage
+        for stage in stages:
+            unknown = [d for d in stage.deps if d not in by_name]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(unknown)}")
+        self.stages: Dict[str, Stage] = {name: by_name[name] for name in self._topological_order(by_name)}
+        self.logger: logging.Logger = logger
+        self.marker_dir: Optional[str] = marker_dir
+
+    @staticmethod
+    def _topological_order(stages: Dict[str, Stage]) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str, path: List[str]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Stage dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = 1
+            for dep in stages[name].deps:
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in stages:
+            visit(name, [])
+        return order
+
+    def run(self, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Runs every stage once its dependencies are done.
+
+        If a stage fails, no further stages are started; stages already running finish,
+        then the first error is raised.
+
+        Args:
+            workers: Maximum stages running at once (default: all that are ready).
+
+        Returns:
+            Dict mapping stage name to result.
+        """
+        results: Dict[str, Any] = {}
+        pending = dict(self.stages)
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=workers or len(self.stages) or 1, thread_name_prefix="stage") as pool:
+            while pending or running:
+                if error is None:
+                    for name, stage in list(pending.items()):
+                        if all(d in results for d in stage.deps):
+                            inputs = {d: results[d] for d in stage.deps}
+                            running[pool.submit(self._execute, stage, inputs)] = name
+                            del pending[name]
+                elif not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as e:
+                        self.logger.error(f"Stage {name} failed: {e}")
+                        error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _execute(self, stage: Stage, inputs: Dict[str, Any]) -> Any:
+        fingerprint = stage.fingerprint(inputs) if stage.fingerprint and self.marker_dir else None
+        if fingerprint is None:
+            return stage.run(inputs)
+        marker = os.path.join(self.marker_dir, f"{stage.name}.done.json")
+        if self._marker_matches(marker, fingerprint, stage.outputs):
+            self.logger.info(f"Stage {stage.name}: resuming from completion marker")
+            return stage.resume(inputs)
+        if os.path.exists(marker):
+            os.remove(marker)
+        result = stage.run(inputs)
+        self._write_marker(marker, fingerprint, stage.outputs)
+        return result
+
+    @staticmethod
+    def _output_stamps(outputs: Tuple[str, ...]) -> Optional[Dict[str, List[int]]]:
+        stamps: Dict[str, List[int]] = {}
+        for path in outputs:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return None
+            stamps[path] = [st.st_size, st.st_mtime_ns]
+        return stamps
+
+    def _marker_matches(self, marker: str, fingerprint: str, outputs: Tuple[str, ...]) -> bool:
+        try:
+            with open(marker) as fh:
+                recorded = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return False
+        return recorded.get("fingerprint") == fingerprint and recorded.get("outputs") == self._output_stamps(outputs)
+
+    def _write_marker(self, marker: str, fingerprint: str, outputs: Tuple[str, ...]) -> None:
+        os.makedirs(self.marker_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.marker_dir, prefix=".tmp-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"fingerprint": fingerprint, "outputs": self._output_stamps(outputs)}, fh)
+        os.replace(tmp, marker)
+# ---
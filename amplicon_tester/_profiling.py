@@ -0,0 +1,260 @@
+# amplicon_tester/_profiling.py
+import cProfile
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+# tracemalloc is process-wide and only one cProfile profiler can be active at a time, so
+# concurrent batch jobs take turns: a stage that finds the lock held is measured but not profiled.
+_PROFILE_LOCK = threading.Lock()
+# Seconds between RSS samples while a stage runs.
+RSS_SAMPLE_INTERVAL = 0.05
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _peak_rss_mb(who: int) -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def _current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, ValueError, IndexError):
+        return None  # no /proc (macOS, Windows)
+
+class _RssSampler:
+    """
+    Tracks the largest current RSS of this process while a stage runs, sampling /proc in a
+    background thread. `peak` stays None where /proc is unavailable.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.peak: Optional[float] = _current_rss_mb()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        rss = _current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self) -> Optional[float]:
+        """Stops sampling and returns the peak RSS seen, in MiB."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        return self.peak
+
+@dataclass
+class StageStats:
+    """
+    Measurements of one pipeline stage.
+
+    Attributes:
+        name (str): Stage name.
+        wall_s (float): Wall-clock time.
+        cpu_s (float): CPU time of this process (all threads).
+        child_cpu_s (float): CPU time of subprocesses that finished during the stage (VSEARCH, PCR workers).
+        peak_rss_mb (Optional[float]): Peak resident set size of this process during the stage,
+            in MiB, sampled from /proc every RSS_SAMPLE_INTERVAL seconds. Without /proc, the
+            process high-water mark if the stage raised it, else None.
+        rss_high_water_mb (Optional[float]): Peak RSS of this process so far (ru_maxrss), in MiB;
+            it never decreases, so later stages repeat the heaviest earlier stage's value.
+        child_peak_rss_mb (Optional[float]): Largest peak RSS of any finished subprocess so far, in MiB.
+        records (Optional[int]): Records the stage produced, when the caller reports it.
+        records_per_sec (Optional[float]): records / wall_s.
+        cached (Optional[bool]): Whether the stage's artifacts came from the stage cache, when it has any.
+        profile (Optional[str]): cProfile/tracemalloc output written for this stage.
+    """
+    name: str
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    child_cpu_s: float = 0.0
+    peak_rss_mb: Optional[float] = None
+    rss_high_water_mb: Optional[float] = None
+    child_peak_rss_mb: Optional[float] = None
+    records: Optional[int] = None
+    records_per_sec: Optional[float] = None
+    cached: Optional[bool] = None
+    profile: Optional[str] = None
+
+class RunProfiler:
+    """
+    Collects per-stage timing, CPU, memory and throughput for one pipeline run and writes
+    them as a JSON run report.
+
+    CPU time and peak RSS are process-wide, so stages running concurrently (independent
+    stages of one run, or primer pairs in batch mode) overlap in these numbers; wall time
+    and records are per stage.
+
+    Attributes:
+        name (str): Run name (e.g. the primer job name).
+        logger (logging.Logger): Logger for messages.
+        out_dir (str): Directory for profiler output files.
+        profile_stage (Optional[str]): Stage to capture with `profile_mode`, if any.
+        profile_mode (str): 'cprofile' (writes <stage>.prof) or 'tracemalloc' (writes the top allocation sites).
+        stages (List[StageStats]): Finished stages, in order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        logger: logging.Logger,
+        out_dir: str = ".",
+        profile_stage: Optional[str] = None,
+        profile_mode: str = "cprofile"
+    ):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"profile_mode must be one of {PROFILE_MODES}, got {profile_mode!r}")
+        self.name: str = name
+        self.logger: logging.Logger = logger
+        self.out_dir: str = out_dir
+        self.profile_stage: Optional[str] = profile_stage
+        self.profile_mode: str = profile_mode
+        self.stages: List[StageStats] = []
+        self.started: str = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._t0: float = time.perf_counter()
+        self._times0 = os.times()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """
+        Measures the enclosed block as one stage.
+
+        Set `records` on the yielded StageStats to report throughput. The stage is recorded
+        (and logged) even if the block raises.
+
+        Args:
+            name: Stage name.
+
+        Yields:
+            The StageStats being filled in.
+        """
+        stats = StageStats(name)
+        profiler = None
+        profiling = name == self.profile_stage and _PROFILE_LOCK.acquire(blocking=False)
+        if name == self.profile_stage and not profiling:
+            self.logger.warning(f"Stage {name}: another stage is being profiled; skipping {self.profile_mode}")
+        if profiling:
+            if self.profile_mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                tracemalloc.start(25)
+        high_water0 = _peak_rss_mb(resource.RUSAGE_SELF) if resource is not None else None
+        sampler = _RssSampler()
+        t0 = time.perf_counter()
+        c0 = os.times()
+        try:
+            yield stats
+        finally:
+            c1 = os.times()
+            stats.peak_rss_mb = sampler.stop()
+            stats.wall_s = time.perf_counter() - t0
+            stats.cpu_s = (c1.user - c0.user) + (c1.system - c0.system)
+            stats.child_cpu_s = (c1.children_user - c0.children_user) + (c1.children_system - c0.children_system)
+            if profiling:
+                try:
+                    stats.profile = self._finish_profile(name, profiler)
+                finally:
+                    _PROFILE_LOCK.release()
+            if resource is not None:
+                stats.rss_high_water_mb = _peak_rss_mb(resource.RUSAGE_SELF)
+                stats.child_peak_rss_mb = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+                if stats.peak_rss_mb is None and stats.rss_high_water_mb > high_water0:
+                    stats.peak_rss_mb = stats.rss_high_water_mb
+            if stats.records is not None and stats.wall_s > 0:
+                stats.records_per_sec = stats.records / stats.wall_s
+            self.stages.append(stats)
+            rate = f", {stats.records_per_sec:,.0f} records/s" if stats.records_per_sec else ""
+            rate += " (cached)" if stats.cached else ""
+            self.logger.info(
+                f"Stage {name}: {stats.wall_s:.2f}s wall, {stats.cpu_s:.2f}s CPU "
+                f"(+{stats.child_cpu_s:.2f}s subprocesses){rate}"
+            )
+
+    def _finish_profile(self, name: str, profiler: Optional[cProfile.Profile]) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        if profiler is not None:
+            profiler.disable()
+            path = os.path.join(self.out_dir, f"profile.{name}.prof")
+            profiler.dump_stats(path)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            path = os.path.join(self.out_dir, f"tracemalloc.{name}.txt")
+            with open(path, "w") as fh:
+                fh.write(f"peak traced: {peak / 2**20:.1f} MiB\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    fh.write(f"{stat}\n")
+        self.logger.info(f"Stage {name}: {self.profile_mode} output written to {path}")
+        return path
+
+    def report(self, status: str = "ok", params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Returns the run report as a JSON-serializable dict.
+
+        Args:
+            status: Outcome of the run ('ok' or 'failed').
+            params: Run parameters to record (primer pair, VSEARCH settings, ...).
+        """
+        times = os.times()
+        return {
+            "run": self.name,
+            "status": status,
+            "started": self.started,
+            "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "params": params or {},
+            "total": {
+                "wall_s": time.perf_counter() - self._t0,
+                "cpu_s": (times.user - self._times0.user) + (times.system - self._times0.system),
+                "child_cpu_s": (times.children_user - self._times0.children_user)
+                               + (times.children_system - self._times0.children_system),
+                "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource is not None else None,
+            },
+            "stages": [asdict(s) for s in self.stages],
+        }
+
+    def write_report(self, path: str, status: str = "ok", params: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Writes the run report (see `report`) as JSON.
+
+        Args:
+            path: Output JSON path.
+            status: Outcome of the run ('ok' or 'failed').
+            params: Run parameters to record.
+        """
+        with open(path, "w") as fh:
+            json.dump(self.report(status, params), fh, indent=2, default=str)
+        self.logger.info(f"Run report saved to {path}")
+# ---
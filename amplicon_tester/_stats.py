@@ -1,73 +1,217 @@
 # amplicon_tester/_stats.py
-from dataclasses import dataclass, field
-from collections import defaultdict
+import numpy as np
 import pandas as pd
 import logging
-from typing import Dict, List
+from typing import Dict, List, Tuple, Union
 
-@dataclass
-class TaxNodeStats:
+from amplicon_tester._taxonomy import RANK_LABELS
+from amplicon_tester._io_utils import open_text
+
+# One integer column per deepest-rank label, in RANK_LABELS order.
+RANK_COUNT_COLUMNS: List[str] = [f"Rank {label}" for label in RANK_LABELS]
+# Summary columns the stats are computed from.
+STATS_INPUT_COLUMNS: List[str] = ["expected_taxonomy", "amplifies", "differentiable", "deepest_rank", "ambiguous"]
+# Per-node counters, in output order.
+COUNT_COLUMNS: List[str] = ["Entries", "Amplifies", "Differentiable", "Ambiguous"] + RANK_COUNT_COLUMNS
+
+class TaxonomyTrie:
     """
-    Stores aggregation statistics for a node in the taxonomy tree.
+    Prefix trie over taxonomy lineages with integer node IDs.
+
+    Every distinct prefix ('Fungi', 'Fungi;Ascomycota', ...) is one node. Node IDs are
+    assigned in order of first appearance, so they can index flat counter arrays.
 
     Attributes:
-        entries (int): Number of entries passing through this node.
-        amplifies (int): Count of entries where amplicon amplifies.
-        differentiable (int): Count of entries considered differentiable.
-        ranks (Dict[str, int]): Frequency of each deepest matched rank at this node.
+        paths (List[str]): Semicolon-joined prefix for each node ID.
+        levels (List[int]): Depth of each node (1 = top rank).
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.levels: List[int] = []
+        self._children: Dict[Tuple[int, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def insert(self, lineage: str) -> List[int]:
+        """
+        Adds a lineage and returns the node IDs along its path, root-most first.
+
+        Args:
+            lineage: Semicolon-delimited lineage string.
+
+        Returns:
+            List of node IDs, one per level of the lineage.
+        """
+        node_ids: List[int] = []
+        parent = -1
+        for name in (t.strip() for t in lineage.split(";")):
+            node = self._children.get((parent, name))
+            if node is None:
+                node = len(self.paths)
+                self._children[(parent, name)] = node
+                self.paths.append(name if parent < 0 else f"{self.paths[parent]};{name}")
+                self.levels.append(len(node_ids) + 1)
+            node_ids.append(node)
+            parent = node
+        return node_ids
+
+def rank_summary(counts: np.ndarray) -> List[str]:
+    """
+    Formats one node's rank counts as the 'rank (n)' list shown by the Streamlit app.
+
+    Args:
+        counts: Counts indexed like RANK_LABELS.
+
+    Returns:
+        List such as ['genus (3)', 'species (12)'], omitting zero counts.
+    """
+    return [f"{label} ({n})" for label, n in zip(RANK_LABELS, counts) if n]
+
+def node_counts(summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    Counts summary rows at every taxonomy node on their lineage paths.
+
+    Distinct lineages are inserted once into a TaxonomyTrie; every summary row then adds
+    to the counters of the nodes on its lineage path through `np.bincount`, so no prefix
+    strings are built per row.
+
+    Args:
+        summary: Frame with 'expected_taxonomy', 'amplifies', 'differentiable',
+            'deepest_rank' and (optionally, for older summaries) 'ambiguous' columns.
+
+    Returns:
+        DataFrame with one row per node, in order of first appearance: 'Taxonomy', 'Level',
+        'Entries', 'Amplifies', 'Differentiable', 'Ambiguous' and one integer 'Rank <label>'
+        column per rank label.
     """
-    entries: int = 0
-    amplifies: int = 0
-    differentiable: int = 0
-    ranks: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    lineage_codes, lineages = pd.factorize(summary["expected_taxonomy"], sort=False)
+    trie = TaxonomyTrie()
+    paths = [trie.insert(lineage) for lineage in lineages]
+    path_lengths = np.array([len(p) for p in paths], dtype=np.int64)
+    path_nodes = np.fromiter((n for p in paths for n in p), dtype=np.int64, count=int(path_lengths.sum()))
+    path_starts = np.concatenate(([0], np.cumsum(path_lengths)[:-1])) if len(paths) else path_lengths
+
+    # Expand each row to the nodes on its lineage path.
+    row_lengths = path_lengths[lineage_codes]
+    rows = np.repeat(np.arange(len(summary)), row_lengths)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+    nodes = path_nodes[path_starts[lineage_codes][rows] + offsets]
+
+    n_nodes = len(trie)
+    amplifies = summary["amplifies"].to_numpy(dtype=bool)
+    differentiable = summary["differentiable"].to_numpy(dtype=bool)
+    if "ambiguous" in summary.columns:
+        ambiguous = summary["ambiguous"].fillna(False).to_numpy(dtype=bool)
+    else:
+        ambiguous = np.zeros(len(summary), dtype=bool)
+    rank_codes = pd.Categorical(summary["deepest_rank"].fillna("none"), categories=RANK_LABELS).codes
+    rank_codes = np.where(rank_codes < 0, len(RANK_LABELS) - 1, rank_codes)
+
+    entries = np.bincount(nodes, minlength=n_nodes)
+    amplified = np.bincount(nodes, weights=amplifies[rows], minlength=n_nodes).astype(np.int64)
+    differentiated = np.bincount(nodes, weights=differentiable[rows], minlength=n_nodes).astype(np.int64)
+    ambiguities = np.bincount(nodes, weights=ambiguous[rows], minlength=n_nodes).astype(np.int64)
+    rank_counts = np.bincount(
+        nodes * len(RANK_LABELS) + rank_codes[rows], minlength=n_nodes * len(RANK_LABELS)
+    ).reshape(n_nodes, len(RANK_LABELS))
+
+    df = pd.DataFrame({
+        "Taxonomy": trie.paths,
+        "Level": np.array(trie.levels, dtype=np.int64),
+        "Entries": entries.astype(np.int64),
+        "Amplifies": amplified,
+        "Differentiable": differentiated,
+        "Ambiguous": ambiguities,
+    })
+    for i, column in enumerate(RANK_COUNT_COLUMNS):
+        df[column] = rank_counts[:, i].astype(np.int64)
+    return df
 
 def taxonomy_stats(
-    summary_csv: str,
+    summary: Union[pd.DataFrame, str],
     out_csv: str,
     logger: logging.Logger
-) -> None:
+) -> pd.DataFrame:
     """
-    Computes summary statistics for all nodes in a taxonomy tree from a summary CSV file,
-    and writes the results to a CSV file.
+    Computes summary statistics for all nodes in a taxonomy tree and writes them to a CSV file.
 
     Args:
-        summary_csv: Path to the summary input CSV file.
+        summary: Summary frame from `summarize_frame`, or the path of a summary CSV file.
         out_csv: Path to the output CSV file for taxonomy stats.
         logger: Logger for logging messages.
+
+    Returns:
+        DataFrame with one row per taxonomy node: 'Taxonomy', 'Level', 'Entries',
+        'Amplifies', 'Differentiable', 'Ambiguous' (entries whose tied top hits span several
+        lineages), one integer 'Rank <label>' column per rank label, and the formatted 'Rank Summary'.
+    """
+    if isinstance(summary, str):
+        logger.info(f"Calculating taxonomy stats from {summary}")
+        with open_text(summary) as fh:
+            summary = pd.read_csv(fh, usecols=lambda c: c in STATS_INPUT_COLUMNS)
+    else:
+        logger.info("Calculating taxonomy stats from the in-memory summary")
+
+    df = node_counts(summary)
+    df["Rank Summary"] = [rank_summary(counts) for counts in df[RANK_COUNT_COLUMNS].to_numpy()]
+
+    with open_text(out_csv, "w") as fh:
+        df.to_csv(fh, index=False)
+    logger.info(f"Taxonomy stats saved to {out_csv}")
+    logger.debug(df)
+    return df
+
+def patch_taxonomy_stats(
+    stats_csv: str,
+    removed: pd.DataFrame,
+    added: pd.DataFrame,
+    out_csv: str,
+    logger: logging.Logger
+) -> pd.DataFrame:
+    """
+    Updates taxonomy stats written by `taxonomy_stats` for a changed set of summary rows.
+
+    The node counts of the removed rows (their previous state) are subtracted and those
+    of the added rows (their new state) added, so the cost scales with the number of
+    changed sequences rather than the whole summary. Nodes left without entries are
+    dropped; new nodes are appended after the existing ones.
+
+    Args:
+        stats_csv: Taxonomy stats CSV of the previous run.
+        removed: Previous summary rows of the changed sequences (columns as for `node_counts`).
+        added: New summary rows of the changed sequences.
+        out_csv: Path to the output CSV file (may be `stats_csv`).
+        logger: Logger for messages.
+
+    Returns:
+        The patched stats, with the same columns as `taxonomy_stats`.
     """
-    import csv
-    logger.info(f"Calculating taxonomy stats from {summary_csv}")
-    tax_stats: Dict[str, TaxNodeStats] = defaultdict(TaxNodeStats)
-
-    with open(summary_csv) as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            tax_path: List[str] = [t.strip() for t in row["expected_taxonomy"].split(";")]
-            amplifies: bool = row["amplifies"] == "True"
-            differentiable: bool = row["differentiable"] == "True"
-            rank: str = row["deepest_rank"] or "none"
-            for i in range(len(tax_path)):
-                node = ";".join(tax_path[:i+1])
-                stats = tax_stats[node]
-                stats.entries += 1
-                stats.amplifies += int(amplifies)
-                stats.differentiable += int(differentiable)
-                stats.ranks[rank] += 1
-
-    rows: List[dict] = []
-    for node, stats in tax_stats.items():
-        levels = node.split(";")
-        rows.append({
-            "Taxonomy": node,
-            "Level": len(levels),
-            "Entries": stats.entries,
-            "Amplifies": stats.amplifies,
-            "Differentiable": stats.differentiable,
-            "Rank Summary": [f"{k} ({v})" for k, v in stats.ranks.items()]
-        })
-
-    df = pd.DataFrame(rows)
-    df.to_csv(out_csv, index=False)
+    logger.info(f"Patching taxonomy stats in {stats_csv}: -{len(removed)} +{len(added)} summary rows")
+    count_columns = COUNT_COLUMNS
+    with open_text(stats_csv) as fh:
+        stats = pd.read_csv(fh).drop(columns=["Rank Summary"]).set_index("Taxonomy")
+    if list(stats.columns) != ["Level"] + count_columns:
+        raise ValueError(f"{stats_csv} has different columns than taxonomy_stats writes")
+    minus = node_counts(removed).set_index("Taxonomy")
+    plus = node_counts(added).set_index("Taxonomy")
+    if len(minus.index.difference(stats.index)):
+        raise ValueError(f"{stats_csv} does not match the removed summary rows")
+    new_nodes = plus.index.difference(stats.index, sort=False)
+    stats = pd.concat([stats, plus.loc[new_nodes, stats.columns]])
+    stats.loc[new_nodes, count_columns] = 0
+    stats.loc[plus.index, count_columns] += plus[count_columns]
+    stats.loc[minus.index, count_columns] -= minus[count_columns]
+    if (stats[count_columns].to_numpy() < 0).any():
+        raise ValueError(f"{stats_csv} does not match the removed summary rows")
+
+    df = stats[stats["Entries"] > 0].reset_index()
+    df = df.astype({c: np.int64 for c in ["Level"] + count_columns})
+    df["Rank Summary"] = [rank_summary(counts) for counts in df[RANK_COUNT_COLUMNS].to_numpy()]
+    with open_text(out_csv, "w") as fh:
+        df.to_csv(fh, index=False)
     logger.info(f"Taxonomy stats saved to {out_csv}")
     logger.debug(df)
+    return df
 # ---
\ No newline at end of file
@@ -0,0 +1,282 @@
+# amplicon_tester/_summary.py
+import logging
+from itertools import chain
+from typing import Any, Collection, Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+from amplicon_tester._taxonomy import LineageTable, RANK_LABELS, RANKS
+from amplicon_tester._vsearch import tied_top_hits
+
+SUMMARY_COLUMNS: List[str] = [
+    "sequence_id",
+    "expected_taxonomy",
+    "amplifies",
+    "differentiable",
+    "deepest_rank",
+    "top_vsearch_taxonomy",
+    "top_vsearch_pident",
+    "top_vsearch_sseqid",
+    "shared_by_taxa",
+    "ambiguous",
+    "tied_taxa"
+]
+
+def expected_lineage_ids(expected: Dict[str, Any]) -> Tuple[LineageTable, pd.Series]:
+    """
+    Encodes an expected-taxonomy mapping as lineage IDs in a single LineageTable.
+
+    Args:
+        expected: Mapping of sequence IDs to Taxonomy views.
+
+    Returns:
+        Tuple of (table, Series of lineage IDs indexed by sequence ID).
+    """
+    tables = {id(t.table): t.table for t in expected.values()}
+    if len(tables) <= 1:
+        table = next(iter(tables.values()), LineageTable())
+        lids = np.fromiter((t.lineage_id for t in expected.values()), dtype=np.int64, count=len(expected))
+    else:
+        table = LineageTable()
+        lids = np.fromiter((table.intern(str(t)) for t in expected.values()), dtype=np.int64, count=len(expected))
+    return table, pd.Series(lids, index=pd.Index(list(expected.keys()), dtype=object), name="lineage_id")
+
+def members_frame(members: Dict[str, List[str]]) -> pd.DataFrame:
+    """
+    Flattens a dereplication map into (representative, sequence_id) rows.
+
+    Args:
+        members: Dict mapping representative ID to member IDs.
+
+    Returns:
+        DataFrame with 'representative' and 'sequence_id' columns.
+    """
+    sizes = [len(ids) for ids in members.values()]
+    return pd.DataFrame({
+        "representative": np.repeat(np.array(list(members.keys()), dtype=object), sizes),
+        "sequence_id": np.fromiter(chain.from_iterable(members.values()), dtype=object, count=sum(sizes)),
+    })
+
+def hits_to_frame(vsearch_hits: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Converts a dict of VsearchHit objects to the columns `summarize_frame` needs.
+
+    Args:
+        vsearch_hits: Mapping of query IDs to VsearchHit objects, or to lists of hits
+            best first (see `collect_top_k_hits`).
+
+    Returns:
+        DataFrame with 'qseqid', 'sseqid' and 'pident' columns, plus 'tied_sseqids'
+        (subjects ranking equal to the best hit) for lists of hits.
+    """
+    ranked = any(isinstance(h, list) for h in vsearch_hits.values())
+    if ranked:
+        ties = {q: tied_top_hits(hits) for q, hits in vsearch_hits.items() if hits}
+        vsearch_hits = {q: hits[0] for q, hits in ties.items()}
+    frame = pd.DataFrame({
+        "qseqid": pd.Series(list(vsearch_hits.keys()), dtype=object),
+        "sseqid": pd.Series([h.sseqid for h in vsearch_hits.values()], dtype=object),
+        "pident": pd.Series([h.pident for h in vsearch_hits.values()], dtype="float64"),
+    })
+    if ranked:
+        frame["tied_sseqids"] = pd.Series([[h.sseqid for h in hits] for hits in ties.values()], dtype=object)
+    return frame
+
+def region_hits(
+    hits: pd.DataFrame,
+    members: Optional[Dict[str, List[str]]],
+    expected: Dict[str, Any]
+) -> pd.DataFrame:
+    """
+    Turns the hits of an amplicon-vs-amplicon search into one leave-one-out hit per amplified sequence.
+
+    The search database is the dereplicated amplicons themselves, with self-hits excluded,
+    so it only covers representatives of single-member groups (see `write_singletons`).
+    Members of a group of identical amplicons hit another member of the group at 100%.
+    A representative's hit stands for every member of the subject group. In both cases the
+    subject is the first candidate member whose expected lineage differs from the query's,
+    if there is one: an amplicon shared with another taxon does not separate the two.
+
+    Args:
+        hits: Best hit per query, with 'qseqid', 'sseqid' and 'pident' columns
+            (size annotations are stripped).
+        members: Dereplication map, or None if amplicons were not dereplicated (every
+            amplicon was then a query and the hits are used as they are).
+        expected: Mapping of sequence IDs to Taxonomy views.
+
+    Returns:
+        DataFrame with 'qseqid' (member sequence IDs), 'sseqid' and 'pident' columns.
+    """
+    hits = hits[["qseqid", "sseqid", "pident"]].copy()
+    for column in ("qseqid", "sseqid"):
+        if hits[column].str.contains(";size=", regex=False).any():
+            hits[column] = hits[column].str.split(";size=", n=1).str[0]
+    if members is None:
+        return hits
+
+    _, lids = expected_lineage_ids(expected)
+    groups = members_frame(members)
+    groups["lineage_id"] = groups["sequence_id"].map(lids).fillna(-1).astype(np.int64)
+    group_size = groups.groupby("representative", sort=False)["sequence_id"].size()
+    rep_lineage = groups.drop_duplicates("representative").set_index("representative")["lineage_id"]
+    other_lineage = groups[groups["lineage_id"].to_numpy() != groups["representative"].map(rep_lineage).to_numpy()]
+    first_other = other_lineage.drop_duplicates("representative").set_index("representative")["sequence_id"]
+    non_rep = groups[groups["sequence_id"] != groups["representative"]]
+    second = non_rep.drop_duplicates("representative").set_index("representative")["sequence_id"]
+
+    shared = groups[groups["representative"].map(group_size).to_numpy() > 1]
+    in_group = pd.DataFrame({
+        "qseqid": shared["sequence_id"].to_numpy(),
+        "group": shared["representative"].to_numpy(),
+        "lineage_id": shared["lineage_id"].to_numpy(),
+        "pident": 100.0,
+    })
+    singles = hits[hits["qseqid"].map(group_size).to_numpy() == 1]
+    nearest = pd.DataFrame({
+        "qseqid": singles["qseqid"].to_numpy(),
+        "group": singles["sseqid"].to_numpy(),
+        "lineage_id": singles["qseqid"].map(lids).fillna(-1).astype(np.int64).to_numpy(),
+        "pident": singles["pident"].to_numpy(),
+    })
+    resolved = pd.concat([in_group, nearest], ignore_index=True)
+
+    group = resolved["group"]
+    other = group.map(first_other)
+    pick = np.where(
+        resolved["lineage_id"].to_numpy() != group.map(rep_lineage).fillna(-1).to_numpy(),
+        group.to_numpy(),
+        np.where(other.notna().to_numpy(), other.to_numpy(), group.to_numpy()),
+    )
+    # Within a single-lineage group the representative itself falls back to the next member.
+    pick = np.where(pick == resolved["qseqid"].to_numpy(), group.map(second).to_numpy(), pick)
+    return pd.DataFrame({
+        "qseqid": resolved["qseqid"].to_numpy(),
+        "sseqid": pick,
+        "pident": resolved["pident"].to_numpy(dtype="float64"),
+    })
+
+def summarize_frame(
+    expected: Dict[str, Any],
+    amplicons: Collection[str],
+    hits: Union[pd.DataFrame, Dict[str, Any]],
+    logger: logging.Logger,
+    members: Optional[Dict[str, List[str]]] = None,
+    hits_by_member: bool = False
+) -> pd.DataFrame:
+    """
+    Builds the per-sequence summary as column operations over joined tables.
+
+    The expected table (sequence ID -> lineage ID), the amplified IDs and the top-hit
+    table are joined on sequence ID. Deepest matching rank, the genus-to-species upgrade
+    (matching 'Genus species' core names) and differentiability are then computed with
+    NumPy over lineage-ID arrays, without a per-row Python loop.
+
+    When the hits list their tied subjects ('tied_sseqids'), a sequence whose tied top
+    hits span several lineages is 'ambiguous': its deepest rank is the shallowest over the
+    tied hits, so it is only differentiable if every one of them matches at species level.
+
+    Args:
+        expected: Mapping of sequence IDs to Taxonomy views.
+        amplicons: IDs of the amplified sequences.
+        hits: Top hit per query, either a frame with 'qseqid', 'sseqid' and 'pident'
+            columns and optionally 'tied_sseqids' (see `load_best_hits_frame`), or a dict
+            of VsearchHit objects (or of ranked hit lists).
+        logger: Logger for messages.
+        members: Optional dereplication map; hits keyed by representative are fanned out
+            to every member, and 'shared_by_taxa' counts the distinct expected lineages
+            per identical amplicon.
+        hits_by_member: The hits are already keyed by member sequence ID (see `region_hits`),
+            so `members` is only used for 'shared_by_taxa'.
+
+    Returns:
+        DataFrame with SUMMARY_COLUMNS, one row per expected sequence, with bool
+        'amplifies'/'differentiable'/'ambiguous' columns and 'tied_taxa' counting the
+        distinct lineages among the tied top hits.
+    """
+    logger.info("Building summary for each expected taxonomy entry (columnar).")
+    table, lids = expected_lineage_ids(expected)
+    frame = pd.DataFrame({
+        "sequence_id": lids.index.to_numpy(),
+        "lineage_id": lids.to_numpy(),
+    })
+    frame["amplifies"] = frame["sequence_id"].isin(amplicons).to_numpy(dtype=bool)
+
+    if isinstance(hits, dict):
+        hits = hits_to_frame(hits)
+    hits = hits[[c for c in ("qseqid", "sseqid", "pident", "tied_sseqids") if c in hits.columns]]
+    if members is not None:
+        groups = members_frame(members)
+        if hits_by_member:
+            hits = hits.rename(columns={"qseqid": "sequence_id"})
+        else:
+            hits = groups.merge(hits, left_on="representative", right_on="qseqid", how="inner")
+            hits = hits.drop(columns=["representative", "qseqid"])
+        groups["lineage_id"] = groups["sequence_id"].map(lids)
+        shared = groups.groupby("representative")["lineage_id"].nunique()
+        frame["shared_by_taxa"] = frame["sequence_id"].map(
+            groups["representative"].map(shared).set_axis(groups["sequence_id"])
+        ).astype("Int64")
+    else:
+        hits = hits.rename(columns={"qseqid": "sequence_id"})
+        frame["shared_by_taxa"] = pd.array([pd.NA] * len(frame), dtype="Int64")
+    hits = hits.drop_duplicates("sequence_id")
+    hits["hit_lineage_id"] = hits["sseqid"].map(lids)
+    frame = frame.merge(hits, on="sequence_id", how="left")
+
+    has_top = frame["amplifies"].to_numpy() & frame["hit_lineage_id"].notna().to_numpy()
+    q = frame["lineage_id"].to_numpy()[has_top]
+    h = frame["hit_lineage_id"].to_numpy()[has_top].astype(np.int64)
+    core = table.core_species_ids
+    genus, species = RANKS.index("genus"), RANKS.index("species")
+
+    def match_depth(q: np.ndarray, h: np.ndarray) -> Tuple[np.ndarray, int]:
+        depth = table.deepest_matching_ranks(q, h)
+        upgrade = (depth == genus) & (core[q] != 0) & (core[q] == core[h])
+        depth[upgrade] = species
+        return depth, int(upgrade.sum())
+
+    depth, upgraded = match_depth(q, h)
+    logger.info(f"Upgraded {upgraded} genus matches to species (core name match).")
+
+    n_taxa = np.ones(len(q), dtype=np.int64)
+    if "tied_sseqids" in frame.columns:
+        ties = pd.DataFrame({
+            "row": np.arange(len(q)),
+            "sseqid": frame["tied_sseqids"].to_numpy()[has_top],
+        }).explode("sseqid")
+        ties["lineage_id"] = ties["sseqid"].map(lids)
+        ties = ties.dropna(subset=["lineage_id"])
+        rows = ties["row"].to_numpy(dtype=np.int64)
+        tied_depth, _ = match_depth(q[rows], ties["lineage_id"].to_numpy(dtype=np.int64))
+        np.minimum.at(depth, rows, tied_depth)
+        n_taxa = np.maximum(ties.groupby("row")["lineage_id"].nunique().reindex(np.arange(len(q)), fill_value=1).to_numpy(), 1)
+        logger.info(f"{int((n_taxa > 1).sum())} sequences have tied top hits from several lineages (ambiguous).")
+
+    lineages = np.array(table.lineages, dtype=object)
+    deepest = np.full(len(frame), None, dtype=object)
+    deepest[has_top] = RANK_LABELS[depth]
+    top_taxonomy = np.full(len(frame), None, dtype=object)
+    top_taxonomy[has_top] = lineages[h]
+    differentiable = np.zeros(len(frame), dtype=bool)
+    differentiable[has_top] = depth == species
+    ambiguous = np.zeros(len(frame), dtype=bool)
+    ambiguous[has_top] = n_taxa > 1
+    tied_taxa = pd.array([pd.NA] * len(frame), dtype="Int64")
+    tied_taxa[has_top] = n_taxa
+
+    summary = pd.DataFrame({
+        "sequence_id": frame["sequence_id"],
+        "expected_taxonomy": lineages[frame["lineage_id"].to_numpy()],
+        "amplifies": frame["amplifies"],
+        "differentiable": differentiable,
+        "deepest_rank": deepest,
+        "top_vsearch_taxonomy": top_taxonomy,
+        "top_vsearch_pident": frame["pident"].where(has_top),
+        "top_vsearch_sseqid": frame["sseqid"].where(has_top, None),
+        "shared_by_taxa": frame["shared_by_taxa"].where(frame["amplifies"], pd.NA),
+        "ambiguous": ambiguous,
+        "tied_taxa": tied_taxa,
+    }, columns=SUMMARY_COLUMNS)
+    logger.info("Summary building complete.")
+    return summary
+# ---
\ No newline at end of file
@@ -1,30 +1,192 @@
 # amplicon_tester/_taxonomy.py
-from typing import List, Optional
+from array import array
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+RANKS: List[str] = [
+    "domain", "phylum", "class", "order", "family", "genus", "species"
+]
+RANK_ATTR_MAP: Dict[str, str] = {r: (r if r != "class" else "class_") for r in RANKS}
+# Indexed by the result of `deepest_matching_ranks`; -1 ("no match") maps to the last entry.
+RANK_LABELS = np.array(RANKS + ["none"], dtype=object)
+
+class LineageTable:
+    """
+    Dictionary-encoded store of taxonomy lineages.
+
+    Each distinct lineage string is stored once and encoded as a fixed-width row of
+    integer name IDs, one per rank in RANKS (0 = missing). Sequences that share a
+    lineage share its row and its Taxonomy view, so memory scales with the number of
+    distinct lineages rather than the number of sequences.
+
+    Attributes:
+        lineages (List[str]): Lineage string for each lineage ID.
+        names (List[Optional[str]]): Rank value for each name ID (index 0 is None).
+    """
+
+    def __init__(self):
+        self.lineages: List[str] = []
+        self.names: List[Optional[str]] = [None]
+        self._lineage_ids: Dict[str, int] = {}
+        self._name_ids: Dict[str, int] = {}
+        self._codes: array = array("i")
+        self._views: List["Taxonomy"] = []
+        self._codes_cache: Optional[np.ndarray] = None
+        self._core_cache: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.lineages)
+
+    def intern(self, lineage: str) -> int:
+        """
+        Returns the lineage ID for a lineage string, adding it to the table if new.
+
+        Args:
+            lineage: Semicolon-delimited lineage string.
+
+        Returns:
+            Integer lineage ID.
+        """
+        lineage = lineage.strip()
+        lid = self._lineage_ids.get(lineage)
+        if lid is not None:
+            return lid
+        lid = len(self.lineages)
+        self._lineage_ids[lineage] = lid
+        self.lineages.append(lineage)
+        levels = [level.strip() for level in lineage.split(";")][:len(RANKS)]
+        levels += [""] * (len(RANKS) - len(levels))
+        for level in levels:
+            self._codes.append(self._name_id(level))
+        self._views.append(_make_view(self, lid))
+        return lid
+
+    def _name_id(self, name: str) -> int:
+        if not name:
+            return 0
+        nid = self._name_ids.get(name)
+        if nid is None:
+            nid = len(self.names)
+            self._name_ids[name] = nid
+            self.names.append(name)
+        return nid
+
+    def taxonomy(self, lineage: str) -> "Taxonomy":
+        """
+        Returns the shared Taxonomy view for a lineage string.
+
+        Args:
+            lineage: Semicolon-delimited lineage string.
+
+        Returns:
+            Taxonomy view backed by this table.
+        """
+        return self._views[self.intern(lineage)]
+
+    def view(self, lineage_id: int) -> "Taxonomy":
+        """
+        Returns the Taxonomy view for a lineage ID.
+        """
+        return self._views[lineage_id]
+
+    def code_row(self, lineage_id: int) -> Sequence[int]:
+        """
+        Returns the name IDs of one lineage, one per rank.
+        """
+        start = lineage_id * len(RANKS)
+        return self._codes[start:start + len(RANKS)]
+
+    @property
+    def codes(self) -> np.ndarray:
+        """
+        Returns all lineages as an (n_lineages, n_ranks) int32 array of name IDs.
+        """
+        if self._codes_cache is None or len(self._codes_cache) != len(self.lineages):
+            self._codes_cache = np.array(self._codes, dtype=np.int32).reshape(-1, len(RANKS))
+        return self._codes_cache
+
+    @property
+    def core_species_ids(self) -> np.ndarray:
+        """
+        Returns, per lineage ID, an integer ID of its `core_species_name` (0 = none).
+
+        Equal IDs mean equal 'Genus species' core names, so the genus-to-species
+        upgrade can be evaluated as an integer comparison.
+        """
+        if self._core_cache is None or len(self._core_cache) != len(self.lineages):
+            ids: Dict[str, int] = {"": 0}
+            self._core_cache = np.fromiter(
+                (ids.setdefault(core_species_name(lineage), len(ids)) for lineage in self.lineages),
+                dtype=np.int64, count=len(self.lineages)
+            )
+        return self._core_cache
+
+    def deepest_matching_ranks(self, query_ids: np.ndarray, hit_ids: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `deepest_matching_rank` over paired arrays of lineage IDs.
+
+        Args:
+            query_ids: Lineage IDs of the expected taxonomies.
+            hit_ids: Lineage IDs of the hit taxonomies (same length).
+
+        Returns:
+            int8 array with the index into RANKS of the deepest rank at which each pair
+            agrees (all shallower ranks agreeing too), or -1 if even the domain differs.
+            `RANK_LABELS[result]` gives the rank names.
+        """
+        codes = self.codes
+        q = codes[np.asarray(query_ids, dtype=np.int64)]
+        h = codes[np.asarray(hit_ids, dtype=np.int64)]
+        agree = (q == h) & (q != 0)
+        depth = np.cumprod(agree, axis=1, dtype=np.int8).sum(axis=1, dtype=np.int8)
+        return depth - 1
 
 class Taxonomy:
     """
     Represents a full taxonomy lineage, with attributes for each rank.
 
+    A Taxonomy is a lightweight view (table + lineage ID) over a LineageTable, so identical
+    lineages are stored once. `Taxonomy(lineage)` interns into a process-wide default table
+    and returns the shared view for that lineage.
+
     Attributes:
         lineage_str (str): Original lineage string.
         levels (List[Optional[str]]): List of ranks from domain to species.
         ranks (dict): Dictionary mapping rank names to their values.
     """
-    RANKS = [
-        "domain", "phylum", "class", "order", "family", "genus", "species"
-    ]
+    __slots__ = ("table", "lineage_id")
 
-    def __init__(self, lineage: str):
+    RANKS = RANKS
+
+    def __new__(cls, lineage: str, table: Optional[LineageTable] = None) -> "Taxonomy":
         """
-        Initializes a Taxonomy object from a semicolon-delimited lineage string.
+        Returns the Taxonomy view for a semicolon-delimited lineage string.
 
         Args:
             lineage: Taxonomy lineage string (e.g. 'Bacteria;Proteobacteria;Gammaproteobacteria;...').
+            table: LineageTable to intern into (defaults to the process-wide table).
         """
-        self.lineage_str: str = lineage.strip()
-        self.levels: List[Optional[str]] = [level.strip() for level in self.lineage_str.split(';')]
-        self.levels += [None] * (len(self.RANKS) - len(self.levels))
-        self.ranks: dict = dict(zip(self.RANKS, self.levels))
+        return (table if table is not None else DEFAULT_TABLE).taxonomy(lineage)
+
+    def __reduce__(self):
+        return (Taxonomy, (self.lineage_str,))
+
+    @property
+    def lineage_str(self) -> str:
+        """Returns the original (stripped) lineage string."""
+        return self.table.lineages[self.lineage_id]
+
+    @property
+    def levels(self) -> List[Optional[str]]:
+        """Returns the lineage split into levels, padded with None to the number of ranks."""
+        levels: List[Optional[str]] = [level.strip() for level in self.lineage_str.split(';')]
+        return levels + [None] * (len(RANKS) - len(levels))
+
+    @property
+    def ranks(self) -> dict:
+        """Returns a dictionary mapping rank names to their values."""
+        names = self.table.names
+        return {rank: names[code] for rank, code in zip(RANKS, self.table.code_row(self.lineage_id))}
 
     def __getitem__(self, rank: str) -> Optional[str]:
         """
@@ -36,7 +198,9 @@ class Taxonomy:
         Returns:
             The value of the given rank, or None if missing.
         """
-        return self.ranks.get(rank, None)
+        if rank not in RANK_ATTR_MAP:
+            return None
+        return self._rank(RANKS.index(rank))
 
     def __str__(self) -> str:
         """
@@ -47,40 +211,51 @@ class Taxonomy:
         """
         return self.lineage_str
 
+    def _rank(self, index: int) -> Optional[str]:
+        return self.table.names[self.table._codes[self.lineage_id * len(RANKS) + index]]
+
     @property
     def domain(self) -> Optional[str]:
         """Returns the domain rank."""
-        return self.ranks['domain']
+        return self._rank(0)
 
     @property
     def phylum(self) -> Optional[str]:
         """Returns the phylum rank."""
-        return self.ranks['phylum']
+        return self._rank(1)
 
     @property
     def class_(self) -> Optional[str]:
         """Returns the class rank."""
-        return self.ranks['class']
+        return self._rank(2)
 
     @property
     def order(self) -> Optional[str]:
         """Returns the order rank."""
-        return self.ranks['order']
+        return self._rank(3)
 
     @property
     def family(self) -> Optional[str]:
         """Returns the family rank."""
-        return self.ranks['family']
+        return self._rank(4)
 
     @property
     def genus(self) -> Optional[str]:
         """Returns the genus rank."""
-        return self.ranks['genus']
+        return self._rank(5)
 
     @property
     def species(self) -> Optional[str]:
         """Returns the species rank."""
-        return self.ranks['species']
+        return self._rank(6)
+
+def _make_view(table: LineageTable, lineage_id: int) -> Taxonomy:
+    view = object.__new__(Taxonomy)
+    view.table = table
+    view.lineage_id = lineage_id
+    return view
+
+DEFAULT_TABLE = LineageTable()
 
 def deepest_matching_rank(t1: Taxonomy, t2: Taxonomy) -> str:
     """
@@ -94,8 +269,14 @@ def deepest_matching_rank(t1: Taxonomy, t2: Taxonomy) -> str:
         The name of the deepest matching rank (e.g., 'genus'), or "none" if no match.
     """
     last_match = "none"
-    RANK_ATTR_MAP = {r: (r if r != "class" else "class_") for r in Taxonomy.RANKS}
-    for rank in Taxonomy.RANKS:
+    if t1.table is t2.table:
+        for rank, c1, c2 in zip(RANKS, t1.table.code_row(t1.lineage_id), t2.table.code_row(t2.lineage_id)):
+            if c1 and c1 == c2:
+                last_match = rank
+            else:
+                break
+        return last_match
+    for rank in RANKS:
         attr = RANK_ATTR_MAP[rank]
         v1 = getattr(t1, attr)
         v2 = getattr(t2, attr)
@@ -121,6 +302,9 @@ def core_species_name(taxonomy_str: str) -> str:
     if len(fields) < 2:
         return ""
     genus: str = fields[-2] if len(fields) >= 2 else ""
-    species_field: str = fields[-1].split()[0]
-    return f"{genus} {species_field}".strip()
+    species_words: List[str] = fields[-1].split()
+    if not species_words:
+        # A trailing ';' (empty species field) has no core name.
+        return ""
+    return f"{genus} {species_words[0]}".strip()
 # ---
\ No newline at end of file
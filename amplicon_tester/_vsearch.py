@@ -1,8 +1,27 @@
 # amplicon_tester/_vsearch.py
+import heapq
+import json
+import os
+import shutil
 import subprocess
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 from amplicon_tester._taxonomy import Taxonomy
+from amplicon_tester._derep import strip_size_label, expand_hits
+from amplicon_tester._io_utils import compression_of, iter_fasta, open_text, partial_path
 import logging
+import pandas as pd
+
+BLAST6_COLUMNS: List[str] = [
+    "qseqid", "sseqid", "pident", "length", "mismatch", "gapopen",
+    "qstart", "qend", "sstart", "send", "evalue", "bitscore"
+]
+BLAST6_DTYPES: Dict[str, str] = {
+    "qseqid": "object", "sseqid": "object", "pident": "float64", "length": "Int64",
+    "mismatch": "Int64", "gapopen": "Int64", "qstart": "Int64", "qend": "Int64",
+    "sstart": "Int64", "send": "Int64", "evalue": "float64", "bitscore": "float64"
+}
 
 class VsearchHit:
     """
@@ -28,7 +47,7 @@ class VsearchHit:
     def __init__(self, fields: List[str], sseqid_to_tax: Dict[str, Taxonomy]):
         """
         Args:
-            fields: List of BLAST6 fields from VSEARCH output.
+            fields: List of BLAST6 fields from VSEARCH output (strings, or already-typed values).
             sseqid_to_tax: Mapping from sequence ID to Taxonomy object.
         """
         self.qseqid: str = fields[0]
@@ -46,11 +65,18 @@ class VsearchHit:
         self.taxonomy: Optional[Taxonomy] = sseqid_to_tax.get(self.sseqid)
         self.stitle: str = str(self.taxonomy) if self.taxonomy else "Unknown"
 
+    @staticmethod
+    def rank_key(evalue: float, pident: float, length: int) -> tuple:
+        """
+        Returns the sort key used to order hits: e-value, then -pident, then -length.
+        """
+        return (evalue, -pident, -length)
+
     def __lt__(self, other: "VsearchHit") -> bool:
         """
         Defines sorting behavior: sorts by e-value, then -pident, then -length.
         """
-        return (self.evalue, -self.pident, -self.length) < (other.evalue, -other.pident, -other.length)
+        return self.rank_key(self.evalue, self.pident, self.length) < other.rank_key(other.evalue, other.pident, other.length)
 
     def __str__(self) -> str:
         """
@@ -58,11 +84,261 @@ class VsearchHit:
         """
         return f"{self.qseqid}\t{self.sseqid}\t{self.pident:.2f}\t{self.length}\t{self.evalue:.2e}\t{self.stitle}"
 
-def run_vsearch_if_needed(
+def run_vsearch(
     fasta: str,
     db_path: str,
     tsv_out: str,
+    logger: logging.Logger,
+    identity: float = 0.97,
+    threads: int = 24,
+    exclude_self: bool = False,
+    maxaccepts: int = 1
+) -> None:
+    """
+    Runs VSEARCH global alignment, overwriting any existing output TSV.
+
+    Compressed files are streamed: a gzip/zstd query FASTA is decompressed into VSEARCH's
+    stdin and a `.gz`/`.zst` output is compressed from its stdout (see `open_text`). A
+    gzip database is read by VSEARCH itself.
+
+    Args:
+        fasta: Path to the query FASTA file.
+        db_path: Path to the VSEARCH database (FASTA).
+        tsv_out: Path to write the VSEARCH BLAST6 TSV output.
+        logger: Logger for progress messages.
+        identity: Minimum identity for an accepted hit (--id).
+        threads: VSEARCH worker threads (--threads).
+        exclude_self: Reject hits to a target with the query's own label (--self),
+            for searching a set of sequences against itself.
+        maxaccepts: Hits reported per query (--maxaccepts), best first.
+
+    Raises:
+        ValueError: If the database is zstd-compressed, which VSEARCH cannot read.
+    """
+    if compression_of(str(db_path)) == "zstd":
+        raise ValueError(f"VSEARCH cannot read the zstd-compressed database {db_path}; use gzip or decompress it")
+    pipe_in = compression_of(fasta) is not None
+    pipe_out = compression_of(tsv_out) is not None
+    cmd = [
+        "vsearch", "--usearch_global", "-" if pipe_in else fasta,
+        "--db", str(db_path),
+        "--id", str(identity),
+        "--strand", "both",
+        "--blast6out", "-" if pipe_out else tsv_out,
+        "--threads", str(threads)
+    ] + (["--self"] if exclude_self else []) + (["--maxaccepts", str(maxaccepts)] if maxaccepts != 1 else [])
+    logger.info(f"Running VSEARCH with {fasta} against DB {db_path}")
+    try:
+        if not (pipe_in or pipe_out):
+            subprocess.run(cmd, check=True)
+        else:
+            _run_vsearch_piped(cmd, fasta if pipe_in else None, tsv_out if pipe_out else None)
+        logger.info("VSEARCH finished successfully.")
+    except subprocess.CalledProcessError as e:
+        logger.error(f"VSEARCH failed: {e}")
+        raise
+
+def _run_vsearch_piped(cmd: List[str], fasta_in: Optional[str], tsv_out: Optional[str]) -> None:
+    """
+    Runs a VSEARCH command whose query is read from stdin and/or whose output goes to stdout.
+
+    Args:
+        cmd: VSEARCH command line ('-' in place of the piped paths).
+        fasta_in: Compressed query FASTA to stream into stdin, or None.
+        tsv_out: Compressed output path to stream stdout into, or None.
+
+    Raises:
+        subprocess.CalledProcessError: If VSEARCH exits with an error.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if fasta_in else None,
+        stdout=subprocess.PIPE if tsv_out else None,
+        text=True, bufsize=1 << 16
+    )
+    feed_errors: List[BaseException] = []
+
+    def feed() -> None:
+        try:
+            with open_text(fasta_in) as fh:
+                shutil.copyfileobj(fh, proc.stdin, 1 << 20)
+        except BrokenPipeError:
+            pass  # VSEARCH exited early; its return code tells us why.
+        except BaseException as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="vsearch-feed", daemon=True) if fasta_in else None
+    if feeder:
+        feeder.start()
+    try:
+        if tsv_out:
+            with open_text(tsv_out, "w") as out:
+                shutil.copyfileobj(proc.stdout, out, 1 << 20)
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        if feeder:
+            feeder.join()
+        returncode = proc.wait()
+    if feed_errors:
+        raise feed_errors[0]
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def split_fasta_by_residues(
+    fasta: str,
+    shard_paths: List[str],
     logger: logging.Logger
+) -> List[int]:
+    """
+    Splits a FASTA into contiguous shards holding roughly equal numbers of residues.
+
+    Balancing on residues rather than record count keeps shard runtimes even when
+    amplicon lengths vary. Shards are contiguous, so concatenating their outputs in
+    shard order preserves the query order of the input.
+
+    Args:
+        fasta: Path to the query FASTA file.
+        shard_paths: Output paths, one per shard.
+        logger: Logger for progress messages.
+
+    Returns:
+        Number of residues written to each shard.
+    """
+    total = sum(len(seq) for _, seq in iter_fasta(fasta))
+    n = len(shard_paths)
+    residues = [0] * n
+    shard = 0
+    written = 0
+    handles = [open(path, "w") for path in shard_paths]
+    try:
+        for seq_id, seq in iter_fasta(fasta):
+            # Move on once this shard has reached its share of the cumulative total.
+            while shard < n - 1 and written >= total * (shard + 1) / n:
+                shard += 1
+            handles[shard].write(f">{seq_id}\n{seq}\n")
+            residues[shard] += len(seq)
+            written += len(seq)
+    finally:
+        for fh in handles:
+            fh.close()
+    logger.info(f"Split {fasta} into {n} shards of {min(residues)}-{max(residues)} residues")
+    return residues
+
+def run_vsearch_sharded(
+    fasta: str,
+    db_path: str,
+    tsv_out: str,
+    logger: logging.Logger,
+    identity: float = 0.97,
+    shards: int = 1,
+    threads_per_shard: int = 24,
+    retries: int = 2,
+    exclude_self: bool = False,
+    maxaccepts: int = 1
+) -> None:
+    """
+    Runs VSEARCH as several concurrent processes over residue-balanced shards of the query FASTA.
+
+    Shard inputs, outputs and completion markers live in `<tsv_out>.shards/`. If a run
+    is interrupted, the next call with the same query FASTA and settings reruns only the
+    shards without a completion marker. A failing shard is retried on its own up to
+    `retries` times. Shard outputs are merged into `tsv_out` in shard (= query) order.
+
+    Args:
+        fasta: Path to the query FASTA file.
+        db_path: Path to the VSEARCH database (FASTA).
+        tsv_out: Path to write the merged BLAST6 TSV output.
+        logger: Logger for progress messages.
+        identity: Minimum identity for an accepted hit (--id).
+        shards: Number of concurrent VSEARCH processes.
+        threads_per_shard: VSEARCH threads per process.
+        retries: Extra attempts per failed shard.
+        exclude_self: Reject self-hits (see `run_vsearch`).
+        maxaccepts: Hits reported per query (see `run_vsearch`).
+
+    Raises:
+        RuntimeError: If any shard still fails after its retries.
+    """
+    if shards <= 1:
+        run_vsearch(fasta, db_path, tsv_out, logger, identity, threads_per_shard, exclude_self, maxaccepts)
+        return
+
+    shard_dir = f"{tsv_out}.shards"
+    st = os.stat(fasta)
+    manifest = {
+        "fasta": os.path.realpath(fasta),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "db": os.path.realpath(str(db_path)),
+        "identity": identity,
+        "shards": shards,
+        "exclude_self": exclude_self,
+        "maxaccepts": maxaccepts,
+    }
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            previous = json.load(fh)
+    shard_fastas = [os.path.join(shard_dir, f"shard{i:03d}.fasta") for i in range(shards)]
+    shard_tsvs = [os.path.join(shard_dir, f"shard{i:03d}.tsv") for i in range(shards)]
+    if previous != manifest:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        os.makedirs(shard_dir)
+        split_fasta_by_residues(fasta, shard_fastas, logger)
+        with open(manifest_path, "w") as fh:
+            json.dump(manifest, fh)
+    else:
+        logger.info(f"Resuming sharded VSEARCH run in {shard_dir}")
+
+    def run_shard(i: int) -> bool:
+        done = shard_tsvs[i] + ".done"
+        if os.path.exists(done):
+            logger.info(f"Shard {i} already complete, skipping.")
+            return True
+        for attempt in range(retries + 1):
+            try:
+                run_vsearch(
+                    shard_fastas[i], db_path, shard_tsvs[i] + ".part", logger, identity, threads_per_shard,
+                    exclude_self, maxaccepts
+                )
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.warning(f"Shard {i} attempt {attempt + 1}/{retries + 1} failed: {e}")
+                continue
+            os.replace(shard_tsvs[i] + ".part", shard_tsvs[i])
+            open(done, "w").close()
+            return True
+        return False
+
+    logger.info(f"Running VSEARCH in {shards} shards x {threads_per_shard} threads")
+    with ThreadPoolExecutor(max_workers=shards) as executor:
+        ok = list(executor.map(run_shard, range(shards)))
+    failed = [i for i, success in enumerate(ok) if not success]
+    if failed:
+        raise RuntimeError(f"VSEARCH shards {failed} failed after {retries + 1} attempts; rerun to resume.")
+
+    tmp_out = partial_path(tsv_out)
+    with open_text(tmp_out, "w") as out:
+        for path in shard_tsvs:
+            with open(path) as fh:
+                shutil.copyfileobj(fh, out, 1 << 20)
+    os.replace(tmp_out, tsv_out)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    logger.info(f"Merged {shards} VSEARCH shards into {tsv_out}")
+
+def run_vsearch_if_needed(
+    fasta: str,
+    db_path: str,
+    tsv_out: str,
+    logger: logging.Logger,
+    identity: float = 0.97
 ) -> None:
     """
     Runs VSEARCH global alignment if the output TSV does not exist.
@@ -72,30 +348,268 @@ def run_vsearch_if_needed(
         db_path: Path to the VSEARCH database (FASTA).
         tsv_out: Path to write the VSEARCH BLAST6 TSV output.
         logger: Logger for progress messages.
+        identity: Minimum identity for an accepted hit (--id).
     """
     import os
     if not os.path.exists(tsv_out):
-        logger.info(f"Running VSEARCH with {fasta} against DB {db_path}")
-        try:
-            subprocess.run([
-                "vsearch", "--usearch_global", fasta,
-                "--db", str(db_path),
-                "--id", "0.97",
-                "--strand", "both",
-                "--blast6out", tsv_out,
-                "--threads", "24"
-            ], check=True)
-            logger.info("VSEARCH finished successfully.")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"VSEARCH failed: {e}")
-            raise
+        run_vsearch(fasta, db_path, tsv_out, logger, identity)
     else:
         logger.info(f"VSEARCH output {tsv_out} found, skipping VSEARCH run.")
 
+def iter_vsearch_pipe(
+    records: Iterable[Tuple[str, str]],
+    db_path: str,
+    logger: logging.Logger,
+    identity: float = 0.97,
+    threads: int = 24,
+    fasta_export: Optional[str] = None,
+    tsv_export: Optional[str] = None,
+    maxaccepts: int = 1
+) -> Iterator[List[str]]:
+    """
+    Runs VSEARCH as a filter: queries are fed through stdin and BLAST6 rows are yielded from stdout as they arrive.
+
+    The records iterable is consumed on a background thread, so whatever produces the
+    amplicons (JSON streaming, in silico PCR) overlaps with the alignment, and parsing
+    overlaps with both. No intermediate files are written unless exports are requested.
+
+    Args:
+        records: Iterable of (query ID, sequence) pairs.
+        db_path: Path to the VSEARCH database (FASTA).
+        logger: Logger for progress messages.
+        identity: Minimum identity for an accepted hit (--id).
+        threads: VSEARCH worker threads (--threads).
+        fasta_export: Optional path to also write the queries to, as FASTA.
+        tsv_export: Optional path to also write the raw BLAST6 rows to.
+        maxaccepts: Hits reported per query (see `run_vsearch`).
+
+    Yields:
+        BLAST6 rows split into fields.
+
+    Raises:
+        subprocess.CalledProcessError: If VSEARCH exits with an error.
+    """
+    cmd = [
+        "vsearch", "--usearch_global", "-",
+        "--db", str(db_path),
+        "--id", str(identity),
+        "--strand", "both",
+        "--blast6out", "-",
+        "--threads", str(threads)
+    ] + (["--maxaccepts", str(maxaccepts)] if maxaccepts != 1 else [])
+    logger.info(f"Streaming queries through VSEARCH against DB {db_path}")
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1 << 16)
+    feed_errors: List[BaseException] = []
+
+    def feed() -> None:
+        export = open_text(fasta_export, "w") if fasta_export else None
+        try:
+            for seq_id, seq in records:
+                record = f">{seq_id}\n{seq}\n"
+                proc.stdin.write(record)
+                if export:
+                    export.write(record)
+        except BrokenPipeError:
+            pass  # VSEARCH exited early; its return code tells us why.
+        except BaseException as e:
+            feed_errors.append(e)
+        finally:
+            if export:
+                export.close()
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="vsearch-feed", daemon=True)
+    feeder.start()
+    tsv = open_text(tsv_export, "w") if tsv_export else None
+    try:
+        for line in proc.stdout:
+            if tsv:
+                tsv.write(line)
+            yield line.rstrip("\n").split("\t")
+    finally:
+        if tsv:
+            tsv.close()
+        if proc.poll() is None and feeder.is_alive():
+            proc.kill()
+        feeder.join()
+        returncode = proc.wait()
+    if feed_errors:
+        raise feed_errors[0]
+    if returncode != 0:
+        logger.error(f"VSEARCH failed with exit status {returncode}")
+        raise subprocess.CalledProcessError(returncode, cmd)
+    logger.info("VSEARCH finished successfully.")
+
+def collect_top_hits(
+    rows: Iterable[List[str]],
+    expected: Dict[str, Taxonomy],
+    logger: logging.Logger,
+    members: Optional[Dict[str, List[str]]] = None
+) -> Dict[str, VsearchHit]:
+    """
+    Reduces BLAST6 rows to the top hit for each query.
+
+    The best hit is chosen by the VsearchHit ordering (e-value, then percent identity,
+    then alignment length), with file order breaking ties. Only rows that beat the
+    current best are turned into VsearchHit objects.
+
+    Args:
+        rows: BLAST6 rows split into fields.
+        expected: Mapping of subject sequence IDs to Taxonomy objects.
+        logger: Logger for progress and warnings.
+        members: Optional dereplication map (representative ID to member IDs);
+            when given, each representative's hit is fanned out to all its members.
+
+    Returns:
+        Dictionary mapping query sequence IDs to their top VsearchHit.
+    """
+    vsearch_hits: Dict[str, VsearchHit] = {}
+    best_keys: Dict[str, tuple] = {}
+    for fields in rows:
+        if len(fields) < 12:
+            line = "\t".join(fields)
+            logger.warning(f"Skipping incomplete VSEARCH line: {line.strip()}")
+            continue
+        seq_id = fields[0] = strip_size_label(fields[0])
+        key = VsearchHit.rank_key(float(fields[10]), float(fields[2]), int(fields[3]))
+        if seq_id not in best_keys or key < best_keys[seq_id]:
+            best_keys[seq_id] = key
+            vsearch_hits[seq_id] = VsearchHit(fields, expected)
+    logger.info(f"Parsed {len(vsearch_hits)} top VSEARCH hits.")
+    if members is not None:
+        vsearch_hits = expand_hits(vsearch_hits, members)
+        logger.info(f"Expanded to {len(vsearch_hits)} hits over dereplicated members.")
+    return vsearch_hits
+
+def collect_top_k_hits(
+    rows: Iterable[List[str]],
+    k: int,
+    logger: logging.Logger,
+    expected: Optional[Dict[str, Taxonomy]] = None
+) -> Dict[str, List[VsearchHit]]:
+    """
+    Reduces BLAST6 rows to the k best hits of each query, in a bounded heap per query.
+
+    Hits are ordered as by `collect_top_hits` (VsearchHit ordering, then file order), so
+    memory stays O(queries x k) however many hits VSEARCH reports (--maxaccepts). A row is
+    only turned into a VsearchHit when it enters its query's heap.
+
+    Args:
+        rows: BLAST6 rows split into fields.
+        k: Hits kept per query.
+        logger: Logger for progress and warnings.
+        expected: Optional mapping of subject sequence IDs to Taxonomy objects.
+
+    Returns:
+        Dictionary mapping query sequence IDs to their best hits, best first.
+    """
+    # Each heap holds (worse-first key, hit); its root is the worst hit kept.
+    heaps: Dict[str, List[Tuple[tuple, VsearchHit]]] = {}
+    for n, fields in enumerate(rows):
+        if len(fields) < 12:
+            line = "\t".join(fields)
+            logger.warning(f"Skipping incomplete VSEARCH line: {line.strip()}")
+            continue
+        seq_id = fields[0] = strip_size_label(fields[0])
+        evalue, pident, length = float(fields[10]), float(fields[2]), int(fields[3])
+        key = (-evalue, pident, length, -n)
+        heap = heaps.setdefault(seq_id, [])
+        if len(heap) < k:
+            heapq.heappush(heap, (key, VsearchHit(fields, expected or {})))
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, (key, VsearchHit(fields, expected or {})))
+    logger.info(f"Kept the top {k} VSEARCH hits of {len(heaps)} queries.")
+    return {seq_id: [hit for _, hit in sorted(heap, reverse=True)] for seq_id, heap in heaps.items()}
+
+def tied_top_hits(hits: List[VsearchHit]) -> List[VsearchHit]:
+    """
+    Returns the hits that rank equal to the best one (same e-value, identity and length).
+
+    Args:
+        hits: Hits of one query, best first (see `collect_top_k_hits`).
+    """
+    if not hits:
+        return []
+    best = VsearchHit.rank_key(hits[0].evalue, hits[0].pident, hits[0].length)
+    return [h for h in hits if VsearchHit.rank_key(h.evalue, h.pident, h.length) == best]
+
+def load_best_hits_frame(
+    tsv_path: str,
+    logger: logging.Logger,
+    chunksize: int = 2_000_000,
+    top_k: int = 1
+) -> pd.DataFrame:
+    """
+    Loads a BLAST6 TSV into typed columns and keeps the best hit per query.
+
+    The file is read in chunks; each chunk is sorted by e-value (ascending), percent
+    identity and alignment length (descending) and reduced to its first row per query,
+    then the per-chunk winners are reduced the same way. Sorting is stable, so file order
+    breaks exact ties, matching `collect_top_hits`. Size annotations (';size=N') are
+    stripped from query IDs.
+
+    With `top_k` > 1 the k best rows per query are kept through the reduction (memory
+    O(queries x k), as `collect_top_k_hits`), and the subjects ranking equal to the best
+    hit are listed in a 'tied_sseqids' column.
+
+    Args:
+        tsv_path: Path to VSEARCH output TSV (BLAST6 format).
+        logger: Logger for progress and warnings.
+        chunksize: Rows parsed per chunk, bounding peak memory.
+        top_k: Hits per query considered for ties (VSEARCH --maxaccepts).
+
+    Returns:
+        DataFrame with BLAST6_COLUMNS (plus 'tied_sseqids' when top_k > 1), one row per query.
+    """
+    logger.info(f"Loading VSEARCH results from {tsv_path} (columnar)")
+    sort_cols = ["evalue", "pident", "length"]
+    sort_asc = [True, False, False]
+    n_rows = 0
+    n_bad = 0
+    partials: List[pd.DataFrame] = []
+    with open_text(tsv_path) as fh:
+        # E-values are converted by Python's float(), which is exact; the C parser can be
+        # an ulp off on exponents (1e-30), and hits parsed from different files (see
+        # `RunFingerprint.update_hits`) must rank alike.
+        reader = pd.read_csv(
+            fh, sep="\t", header=None, names=BLAST6_COLUMNS, usecols=range(12),
+            dtype={**BLAST6_DTYPES, "evalue": "object"}, chunksize=chunksize, engine="c"
+        )
+        for chunk in reader:
+            chunk["evalue"] = chunk["evalue"].astype("float64")
+            n_rows += len(chunk)
+            complete = chunk.dropna()
+            n_bad += len(chunk) - len(complete)
+            best = complete.sort_values(sort_cols, ascending=sort_asc, kind="mergesort")
+            partials.append(best[best.groupby("qseqid", sort=False).cumcount().to_numpy() < top_k])
+    if n_bad:
+        logger.warning(f"Skipped {n_bad} incomplete VSEARCH lines.")
+    if not partials:
+        empty = pd.DataFrame({c: pd.Series(dtype=t) for c, t in BLAST6_DTYPES.items()})
+        return empty.assign(tied_sseqids=pd.Series(dtype=object)) if top_k > 1 else empty
+
+    hits = pd.concat(partials, ignore_index=True)
+    if hits["qseqid"].str.contains(";size=", regex=False).any():
+        hits["qseqid"] = hits["qseqid"].str.split(";size=", n=1).str[0]
+    hits = hits.sort_values(sort_cols, ascending=sort_asc, kind="mergesort")
+    if top_k > 1:
+        hits = hits[hits.groupby("qseqid", sort=False).cumcount().to_numpy() < top_k]
+        best = hits.drop_duplicates("qseqid", keep="first")
+        tied = hits.merge(best[["qseqid"] + sort_cols], on=["qseqid"] + sort_cols, how="inner")
+        tied = tied.drop_duplicates(["qseqid", "sseqid"]).groupby("qseqid", sort=False)["sseqid"].agg(list)
+        hits = best.assign(tied_sseqids=best["qseqid"].map(tied))
+    hits = hits.drop_duplicates("qseqid", keep="first").reset_index(drop=True)
+    logger.info(f"Selected {len(hits)} top hits from {n_rows} VSEARCH rows.")
+    return hits
+
 def parse_vsearch(
     tsv_path: str,
     expected: Dict[str, Taxonomy],
-    logger: logging.Logger
+    logger: logging.Logger,
+    members: Optional[Dict[str, List[str]]] = None
 ) -> Dict[str, VsearchHit]:
     """
     Parses VSEARCH BLAST6 output TSV and returns top hits for each query.
@@ -104,21 +618,13 @@ def parse_vsearch(
         tsv_path: Path to VSEARCH output TSV (BLAST6 format).
         expected: Mapping of subject sequence IDs to Taxonomy objects.
         logger: Logger for progress and warnings.
+        members: Optional dereplication map (representative ID to member IDs);
+            when given, each representative's hit is fanned out to all its members.
 
     Returns:
         Dictionary mapping query sequence IDs to their top VsearchHit.
     """
     logger.info(f"Parsing VSEARCH results from {tsv_path}")
-    vsearch_hits: Dict[str, VsearchHit] = {}
-    with open(tsv_path) as fh:
-        for line in fh:
-            fields = line.rstrip("\n").split("\t")
-            if len(fields) < 12:
-                logger.warning(f"Skipping incomplete VSEARCH line: {line.strip()}")
-                continue
-            seq_id = fields[0]
-            if seq_id not in vsearch_hits:
-                vsearch_hits[seq_id] = VsearchHit(fields, expected)
-    logger.info(f"Parsed {len(vsearch_hits)} top VSEARCH hits.")
-    return vsearch_hits
+    with open_text(tsv_path) as fh:
+        return collect_top_hits((line.rstrip("\n").split("\t") for line in fh), expected, logger, members)
 # ---
\ No newline at end of file
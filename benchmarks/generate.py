@@ -0,0 +1,189 @@
+# benchmarks/generate.py
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from amplicon_tester._stats import taxonomy_stats
+
+# Name prefix per rank below the domain (P12, C3, ..., G40).
+RANK_PREFIXES: Tuple[str, ...] = ("", "P", "C", "O", "F", "G")
+DOMAINS: Tuple[str, ...] = ("Bacteria", "Archaea", "Eukaryota")
+# Share of the reference that is Eukaryota (skipped by load_expected_taxonomy, as in SILVA).
+EUKARYOTE_FRACTION: float = 0.05
+AMPLIFY_FRACTION: float = 0.85
+AMPLICON_LENGTH: Tuple[int, int] = (220, 300)
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+@dataclass(frozen=True)
+class BenchmarkData:
+    """
+    Paths of one generated dataset.
+
+    Attributes:
+        n_sequences (int): Number of reference sequences.
+        taxonomy (str): Taxonomy header file ('>ID lineage' per line).
+        ipcr_json (str): ipcr-style JSON array of amplicon records.
+        vsearch_tsv (str): Canned VSEARCH BLAST6 table (several hits per amplicon).
+        summary_csv (str): Per-sequence differentiation summary.
+        taxonomy_summary_csv (str): Per-node taxonomy stats, as read by the Streamlit app.
+    """
+    n_sequences: int
+    taxonomy: str
+    ipcr_json: str
+    vsearch_tsv: str
+    summary_csv: str
+    taxonomy_summary_csv: str
+
+def parse_scale(scale: str) -> int:
+    """
+    Parses a scale such as '10k', '250k' or '2M' into a number of sequences.
+    """
+    scale = scale.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(scale[-1:], 1)
+    return int(float(scale.rstrip("km")) * factor)
+
+def _lineages(rng: np.random.Generator, n_species: int) -> List[str]:
+    """
+    Builds a random taxonomy tree with n_species leaves, SILVA-like in shape: each rank has
+    a few times fewer taxa than the one below it, and ~15% of species are placeholders.
+    """
+    # Taxa per rank, phylum to genus; the domain is Bacteria or Archaea.
+    n_taxa = [max(2, n_species // d) for d in (2000, 400, 80, 20, 5)]
+    parents = [rng.integers(0, len(DOMAINS) - 1, n_taxa[0])]
+    parents += [rng.integers(0, n_taxa[i - 1], n_taxa[i]) for i in range(1, len(n_taxa))]
+    genus_of_species = rng.integers(0, n_taxa[-1], n_species)
+    placeholder = rng.random(n_species) < 0.15
+    lineages: List[str] = []
+    for s in range(n_species):
+        taxon = int(genus_of_species[s])
+        path: List[str] = []
+        for rank in range(len(n_taxa) - 1, -1, -1):
+            path.append(f"{RANK_PREFIXES[rank + 1]}{taxon}")
+            taxon = int(parents[rank][taxon])
+        path.append(DOMAINS[taxon])
+        path.reverse()
+        epithet = "sp." if placeholder[s] else f"species{s}"
+        lineages.append(";".join(path + [f"{path[-1]} {epithet}"]))
+    return lineages
+
+def _mutate(base: np.ndarray, rng: np.random.Generator, max_sites: int) -> np.ndarray:
+    seq = base.copy()
+    n_sites = int(rng.integers(0, max_sites + 1))
+    if n_sites:
+        seq[rng.integers(0, len(seq), n_sites)] = BASES[rng.integers(0, 4, n_sites)]
+    return seq
+
+def generate_dataset(out_dir: str, n_sequences: int, seed: int = 0) -> BenchmarkData:
+    """
+    Writes a deterministic synthetic dataset of n_sequences reference sequences.
+
+    The same (n_sequences, seed) always gives byte-identical files. Files already present
+    in out_dir are reused.
+
+    Args:
+        out_dir: Output directory (created if missing).
+        n_sequences: Number of reference sequences.
+        seed: Random seed.
+
+    Returns:
+        BenchmarkData with the paths of the generated files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    data = BenchmarkData(
+        n_sequences=n_sequences,
+        taxonomy=os.path.join(out_dir, "taxonomy.results.txt"),
+        ipcr_json=os.path.join(out_dir, "results.json"),
+        vsearch_tsv=os.path.join(out_dir, "all_amplicons.vsearch.tsv"),
+        summary_csv=os.path.join(out_dir, "differentiation_summary.vsearch.csv"),
+        taxonomy_summary_csv=os.path.join(out_dir, "taxonomy_summary.csv"),
+    )
+    marker = os.path.join(out_dir, ".complete")
+    if os.path.exists(marker):
+        return data
+
+    rng = np.random.default_rng(seed)
+    n_species = max(10, n_sequences // 4)
+    lineages = _lineages(rng, n_species)
+    # Skewed abundance: a few species have many sequences, most have one or two.
+    weights = 1.0 / np.arange(1, n_species + 1) ** 0.8
+    species = rng.choice(n_species, size=n_sequences, p=weights / weights.sum())
+    eukaryote = rng.random(n_sequences) < EUKARYOTE_FRACTION
+    ids = [f"AB{i:07d}.1.{1400 + i % 200}" for i in range(n_sequences)]
+    seq_lineages = [
+        ("Eukaryota;" + lineages[s].split(";", 1)[1]) if euk else lineages[s]
+        for s, euk in zip(species, eukaryote)
+    ]
+    with open(data.taxonomy, "w") as fh:
+        for seq_id, lineage in zip(ids, seq_lineages):
+            fh.write(f">{seq_id} {lineage}\n")
+
+    # Amplicons: one base sequence per species, with a few point mutations per sequence,
+    # so identical amplicons are shared within (and occasionally across) species.
+    lengths = rng.integers(AMPLICON_LENGTH[0], AMPLICON_LENGTH[1], n_species)
+    base_seqs = [BASES[rng.integers(0, 4, n)] for n in lengths]
+    amplifies = rng.random(n_sequences) < AMPLIFY_FRACTION
+    amplified: List[int] = []
+    with open(data.ipcr_json, "w") as fh:
+        fh.write("[\n")
+        first = True
+        for i in range(n_sequences):
+            if not amplifies[i]:
+                continue
+            seq = _mutate(base_seqs[species[i]], rng, 2).tobytes().decode()
+            record = {
+                "sequence_id": f"{ids[i]}:1-{len(seq)}", "start": 0, "end": len(seq), "length": len(seq),
+                "type": "forward", "fwd_mm": 0, "rev_mm": 0, "seq": seq,
+            }
+            fh.write(("  " if first else ",\n  ") + json.dumps(record))
+            first = False
+            amplified.append(i)
+        fh.write("\n]\n")
+
+    # Canned VSEARCH output: each query hits itself at 100% plus up to four other sequences
+    # (often of the same species) at lower identity, in shuffled file order.
+    by_species: Dict[int, List[int]] = {}
+    for i, s in enumerate(species):
+        by_species.setdefault(int(s), []).append(i)
+    with open(data.vsearch_tsv, "w") as fh:
+        for q in amplified:
+            length = len(base_seqs[species[q]])
+            mates = by_species[int(species[q])]
+            subjects = [q] + [
+                int(mates[rng.integers(0, len(mates))]) if rng.random() < 0.6 else int(rng.integers(0, n_sequences))
+                for _ in range(int(rng.integers(0, 5)))
+            ]
+            idents = [100.0] + [float(np.round(rng.uniform(90.0, 100.0), 1)) for _ in subjects[1:]]
+            for k in rng.permutation(len(subjects)):
+                mismatch = int(round(length * (100.0 - idents[k]) / 100.0))
+                fh.write(
+                    f"{ids[q]}\t{ids[subjects[k]]}\t{idents[k]:.1f}\t{length}\t{mismatch}\t0"
+                    f"\t1\t{length}\t1\t{length}\t-1\t0\n"
+                )
+
+    # Per-sequence summary in the pipeline's output format, then the per-node stats the UI reads.
+    keep = ~eukaryote
+    ranks = np.array(["species", "genus", "family", "order"], dtype=object)
+    deepest = np.full(n_sequences, None, dtype=object)
+    deepest[amplifies] = ranks[rng.choice(4, int(amplifies.sum()), p=[0.7, 0.2, 0.07, 0.03])]
+    summary = pd.DataFrame({
+        "sequence_id": ids,
+        "expected_taxonomy": seq_lineages,
+        "amplifies": amplifies,
+        "differentiable": deepest == "species",
+        "deepest_rank": deepest,
+        "top_vsearch_taxonomy": np.where(amplifies, np.array(seq_lineages, dtype=object), None),
+        "top_vsearch_pident": np.where(amplifies, 100.0, np.nan),
+        "top_vsearch_sseqid": np.where(amplifies, np.array(ids, dtype=object), None),
+        "shared_by_taxa": pd.array([None] * n_sequences, dtype="Int64"),
+    })[keep]
+    summary.to_csv(data.summary_csv, index=False)
+    taxonomy_stats(summary, data.taxonomy_summary_csv, logging.getLogger("benchmarks.generate"))
+
+    with open(marker, "w") as fh:
+        fh.write(f"{n_sequences} {seed}\n")
+    return data
+# ---
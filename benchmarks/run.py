@@ -0,0 +1,248 @@
+# benchmarks/run.py
+"""
+Times and memory-profiles the pipeline and UI stages on a synthetic dataset.
+
+    python -m benchmarks.run --scale 100k
+    python -m benchmarks.run --scale 10k --update-baseline
+
+Runs offline: VSEARCH is replaced by the canned BLAST6 table from the generator.
+"""
+import argparse
+import functools
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+from amplicon_tester._taxonomy import LineageTable, Taxonomy
+from amplicon_tester._io_utils import load_expected_taxonomy, load_amplicon_json, iter_amplicon_json, write_fasta
+from amplicon_tester._vsearch import parse_vsearch, load_best_hits_frame
+from amplicon_tester._derep import dereplicate_to_fasta
+from amplicon_tester._summary import summarize_frame
+from amplicon_tester._stats import taxonomy_stats
+from benchmarks.generate import BenchmarkData, generate_dataset, parse_scale
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines.json")
+# A stage regresses when it is this much slower, or uses this much more memory, than its baseline.
+TOLERANCE = 0.25
+
+logger = logging.getLogger("benchmarks")
+
+@dataclass
+class StageResult:
+    """
+    Measurements of one benchmark stage.
+
+    Attributes:
+        stage (str): Stage name.
+        records (int): Records processed (for throughput).
+        seconds (float): Best wall time over the repeats.
+        peak_mb (Optional[float]): Peak traced Python allocation in MiB (one extra run under
+            tracemalloc), or None when memory was not measured.
+    """
+    stage: str
+    records: int
+    seconds: float
+    peak_mb: Optional[float]
+
+    @property
+    def records_per_sec(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+def _stages(data: BenchmarkData, work_dir: str) -> List[Any]:
+    """
+    Returns the stages as (name, function, record count) tuples, in run order.
+
+    Each function takes the shared context dict, may store its result there for later
+    stages, and returns nothing. The fresh LineageTable per call keeps repeats independent.
+    """
+    def expected_taxonomy(ctx: Dict[str, Any]) -> None:
+        taxonomy = functools.partial(Taxonomy, table=LineageTable())
+        ctx["expected"] = load_expected_taxonomy(data.taxonomy, taxonomy, logger)
+
+    def amplicon_json(ctx: Dict[str, Any]) -> None:
+        ctx["amplicons"] = load_amplicon_json(data.ipcr_json, logger)
+
+    def amplicon_json_stream(ctx: Dict[str, Any]) -> None:
+        for _ in iter_amplicon_json(data.ipcr_json, logger):
+            pass
+
+    def fasta(ctx: Dict[str, Any]) -> None:
+        write_fasta(ctx["amplicons"], os.path.join(work_dir, "all_amplicons.fasta"), logger)
+
+    def dereplicate(ctx: Dict[str, Any]) -> None:
+        dereplicate_to_fasta(ctx["amplicons"], os.path.join(work_dir, "derep.fasta"), logger)
+
+    def vsearch_parse(ctx: Dict[str, Any]) -> None:
+        parse_vsearch(data.vsearch_tsv, ctx["expected"], logger)
+
+    def vsearch_frame(ctx: Dict[str, Any]) -> None:
+        ctx["hits"] = load_best_hits_frame(data.vsearch_tsv, logger)
+
+    def summarize(ctx: Dict[str, Any]) -> None:
+        ctx["summary"] = summarize_frame(ctx["expected"], ctx["amplicons"].keys(), ctx["hits"], logger)
+
+    def stats(ctx: Dict[str, Any]) -> None:
+        taxonomy_stats(ctx["summary"], os.path.join(work_dir, "taxonomy_summary.csv"), logger)
+
+    n = data.n_sequences
+    stages = [
+        ("load_expected_taxonomy", expected_taxonomy, n),
+        ("load_amplicon_json", amplicon_json, n),
+        ("iter_amplicon_json", amplicon_json_stream, n),
+        ("write_fasta", fasta, n),
+        ("dereplicate_to_fasta", dereplicate, n),
+        ("parse_vsearch", vsearch_parse, n),
+        ("load_best_hits_frame", vsearch_frame, n),
+        ("summarize", summarize, n),
+        ("taxonomy_stats", stats, n),
+    ]
+    try:
+        from primer_tester_ui.data_io import load_data
+        from primer_tester_ui.taxonomy import TaxonomySearchIndex, add_is_real_species_column, filter_taxonomy
+    except ImportError as e:
+        logger.warning(f"Skipping UI stages ({e})")
+        return stages
+
+    def ui_load(ctx: Dict[str, Any]) -> None:
+        ctx["ui_df"] = add_is_real_species_column(load_data(data.taxonomy_summary_csv))
+
+    def ui_index(ctx: Dict[str, Any]) -> None:
+        ctx["ui_index"] = TaxonomySearchIndex(ctx["ui_df"]["Taxonomy"].tolist())
+
+    def ui_filter(ctx: Dict[str, Any]) -> None:
+        for query in ("", "bacteria", "g1", "species12", "archaea;p0"):
+            filter_taxonomy(ctx["ui_df"], query, ctx["ui_index"])
+
+    def ui_filter_scan(ctx: Dict[str, Any]) -> None:
+        df = ctx["ui_df"].drop(columns=["IsRealSpecies"])
+        for query in ("", "bacteria", "g1", "species12"):
+            filter_taxonomy(df, query)
+
+    stages += [
+        ("ui_load_data", ui_load, n),
+        ("ui_search_index", ui_index, n),
+        ("ui_filter_taxonomy", ui_filter, n),
+        ("ui_filter_taxonomy_scan", ui_filter_scan, n),
+    ]
+    return stages
+
+def run_stage(
+    name: str,
+    fn: Callable[[Dict[str, Any]], None],
+    records: int,
+    ctx: Dict[str, Any],
+    repeats: int,
+    memory: bool = True
+) -> StageResult:
+    """
+    Runs a stage `repeats` times for timing, then (with `memory`) once more under tracemalloc
+    for peak memory. Tracing slows Python code several-fold, so it never affects the timings.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        fn(ctx)
+        best = min(best, time.perf_counter() - start)
+    if not memory:
+        return StageResult(name, records, best, None)
+    gc.collect()
+    tracemalloc.start()
+    fn(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return StageResult(name, records, best, peak / 2**20)
+
+def compare(results: List[StageResult], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """
+    Returns one message per stage that is slower or larger than its baseline by more than `tolerance`.
+    """
+    regressions: List[str] = []
+    for r in results:
+        base = baseline.get(r.stage)
+        if not base:
+            continue
+        if r.seconds > base["seconds"] * (1 + tolerance):
+            regressions.append(f"{r.stage}: {r.seconds:.3f}s vs baseline {base['seconds']:.3f}s")
+        if r.peak_mb is not None and r.peak_mb > base["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{r.stage}: {r.peak_mb:.1f} MiB vs baseline {base['peak_mb']:.1f} MiB")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="10k", help="Number of reference sequences, e.g. 10k, 500k, 2M (default: 10k)")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per stage; the best is kept (default: 3)")
+    parser.add_argument("--stages", nargs="*", help="Time only these stages (earlier stages still run, untimed, to provide inputs)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help=f"Allowed slowdown vs baseline (default: {TOLERANCE})")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file (default: benchmarks/baselines.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline for this scale")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run (much faster at large scales)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    if args.update_baseline and args.no_memory:
+        parser.error("--update-baseline needs the memory measurements; drop --no-memory")
+
+    logging.basicConfig(format='[%(asctime)s] %(levelname)s: %(message)s', level=logging.INFO)
+    n = parse_scale(args.scale)
+    data_dir = os.path.join(DATA_DIR, f"{n}-seed{args.seed}")
+    logger.info(f"Generating (or reusing) {n} sequences in {data_dir}")
+    data = generate_dataset(data_dir, n, args.seed)
+    work_dir = os.path.join(data_dir, "work")
+    os.makedirs(work_dir, exist_ok=True)
+
+    logger.setLevel(logging.WARNING)
+    ctx: Dict[str, Any] = {}
+    results: List[StageResult] = []
+    stages = _stages(data, work_dir)
+    wanted = set(args.stages or [name for name, _, _ in stages])
+    unknown = wanted - {name for name, _, _ in stages}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    last = max(i for i, (name, _, _) in enumerate(stages) if name in wanted)
+    for name, fn, records in stages[:last + 1]:
+        if name in wanted:
+            results.append(run_stage(name, fn, records, ctx, args.repeats, memory=not args.no_memory))
+            r = results[-1]
+            peak = f"{r.peak_mb:10.1f} MiB" if r.peak_mb is not None else f"{'-':>10s} MiB"
+            print(f"{name:26s} {r.seconds:9.3f} s {peak} {r.records_per_sec:14,.0f} rec/s", flush=True)
+        else:
+            fn(ctx)
+
+    baselines: Dict[str, Dict[str, Dict[str, float]]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baselines = json.load(fh)
+    scale_key = str(n)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"scale": n, "seed": args.seed, "results": [asdict(r) for r in results]}, fh, indent=2)
+    if args.update_baseline:
+        baselines.setdefault(scale_key, {}).update(
+            {r.stage: {"seconds": round(r.seconds, 6), "peak_mb": round(r.peak_mb, 4)} for r in results}
+        )
+        with open(args.baseline, "w") as fh:
+            json.dump(baselines, fh, indent=2, sort_keys=True)
+        print(f"Baseline for {n} sequences written to {args.baseline}")
+        return 0
+    if scale_key not in baselines:
+        print(f"No baseline for {n} sequences in {args.baseline}; nothing to compare.")
+        return 0
+    regressions = compare(results, baselines[scale_key], args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions against the baseline (tolerance {args.tolerance:.0%}).")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+# ---
@@ -0,0 +1,84 @@
+# primer_tester_ui/compare.py
+import os
+from dataclasses import dataclass
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from primer_tester_ui.config import COMPARE_CACHE_ENTRIES
+from primer_tester_ui.data_io import load_columns
+from primer_tester_ui.dataset import file_signature
+
+COMPARE_METRICS: Tuple[str, ...] = ("Entries", "Amplifies", "Differentiable")
+
+@dataclass(frozen=True)
+class PrimerCounts:
+    """
+    The per-node counts of one primer file, indexed by lineage.
+
+    Attributes:
+        name (str): Primer pair name (file name without extension).
+        lineages (pd.Index): Taxonomy string of each row (hash-indexed).
+        counts (np.ndarray): (n_rows, len(COMPARE_METRICS)) int64 counts.
+    """
+    name: str
+    lineages: pd.Index
+    counts: np.ndarray
+
+def primer_name(path: str) -> str:
+    """
+    Returns the primer pair name of a primer file ('<REGION>_<FWD>_<REV>').
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+@st.cache_resource(max_entries=COMPARE_CACHE_ENTRIES, show_spinner=False)
+def _load_primer_counts(path: str, signature: Tuple[Tuple[str, int, int], ...]) -> PrimerCounts:
+    df = load_columns(path, ["Taxonomy", *COMPARE_METRICS])
+    return PrimerCounts(
+        name=primer_name(path),
+        lineages=pd.Index(df["Taxonomy"].to_numpy(dtype=object)),
+        counts=df[list(COMPARE_METRICS)].to_numpy(dtype=np.int64),
+    )
+
+def get_primer_counts(path: str) -> PrimerCounts:
+    """
+    Returns the counts of a primer file from the process-wide cache.
+
+    Only the Taxonomy and count columns are read (column by column from the Parquet copy
+    when there is one), and a file is read the first time it is compared, not before.
+    Args:
+        path: Primer file path.
+    Returns:
+        PrimerCounts for the current version of the file.
+    """
+    return _load_primer_counts(path, file_signature(path))
+
+def compare_primers(lineages: List[str], paths: List[str]) -> pd.DataFrame:
+    """
+    Looks up the counts of the given lineages in every primer file.
+    Args:
+        lineages: Taxonomy strings to compare.
+        paths: Primer files to compare.
+    Returns:
+        Long DataFrame with 'Taxonomy', 'Primer' and one column per COMPARE_METRICS
+        (nullable integers; missing where a file has no such node), in lineage then file order.
+    """
+    frames: List[pd.DataFrame] = []
+    for path in paths:
+        primer = get_primer_counts(path)
+        rows = primer.lineages.get_indexer(lineages)
+        found = rows >= 0
+        frame = pd.DataFrame({"Taxonomy": lineages, "Primer": primer.name})
+        for i, metric in enumerate(COMPARE_METRICS):
+            values = pd.array(np.zeros(len(lineages), dtype=np.int64), dtype="Int64")
+            values[found] = primer.counts[rows[found], i]
+            values[~found] = pd.NA
+            frame[metric] = values
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["Taxonomy", "Primer", *COMPARE_METRICS])
+    long = pd.concat(frames, ignore_index=True)
+    order = {t: i for i, t in enumerate(lineages)}
+    return long.sort_values("Taxonomy", key=lambda s: s.map(order), kind="stable", ignore_index=True)
+# ---
@@ -1,4 +1,10 @@
 # primer_tester_ui/config.py
 
 PRIMER_DIR: str = "primers"
+# Prepared primer datasets kept in the process-wide cache (shared by all sessions).
+DATASET_CACHE_ENTRIES: int = 8
+# Rows per page in the search results table and the tree browser.
+PAGE_SIZE: int = 100
+# Primer files whose count columns are kept for the comparison view.
+COMPARE_CACHE_ENTRIES: int = 16
 # ---
\ No newline at end of file
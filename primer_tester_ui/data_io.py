@@ -4,33 +4,109 @@ import pandas as pd
 import ast
 from typing import List, Dict, Tuple
 
+PRIMER_EXTENSIONS: Tuple[str, ...] = (".csv", ".parquet")
+RANK_COUNT_PREFIX: str = "Rank "
+
 def get_primer_files(primer_dir: str = "primers") -> Tuple[List[str], Dict[str, str]]:
     """
-    Returns a sorted list of CSV files in the specified directory, and a mapping from basename to full path.
+    Returns a sorted list of primer files in the specified directory, and a mapping from basename to full path.
+
+    A primer exported as both CSV and Parquet is listed once, under its CSV name;
+    `load_data` picks up the Parquet copy.
     Args:
-        primer_dir: Directory to search for primer CSV files.
+        primer_dir: Directory to search for primer files.
     Returns:
         A tuple:
-            - List of full CSV file paths (sorted).
+            - List of full primer file paths (sorted).
             - Dictionary mapping file basename to full path.
     """
-    files: List[str] = []
-    for f in os.listdir(primer_dir):
+    by_stem: Dict[str, str] = {}
+    for f in sorted(os.listdir(primer_dir)):
+        stem, ext = os.path.splitext(f)
         full_path = os.path.join(primer_dir, f)
-        if f.endswith(".csv") and os.path.isfile(full_path):
-            files.append(full_path)
+        if ext in PRIMER_EXTENSIONS and os.path.isfile(full_path):
+            if stem not in by_stem or ext == ".csv":
+                by_stem[stem] = full_path
+    files: List[str] = list(by_stem.values())
     basename_to_path: Dict[str, str] = {os.path.basename(f): f for f in files}
     return sorted(files), basename_to_path
 
+def rank_count_columns(df: pd.DataFrame) -> List[str]:
+    """
+    Returns the integer per-rank count columns ('Rank species', 'Rank none', ...) of a taxonomy summary.
+    """
+    return [c for c in df.columns if c.startswith(RANK_COUNT_PREFIX) and c != "Rank Summary"]
+
+def format_rank_summary(df: pd.DataFrame) -> pd.Series:
+    """
+    Builds the 'Rank Summary' lists (e.g. ['species (67)', 'genus (12)']) from the rank count columns.
+    Args:
+        df: Rows of a taxonomy summary with rank count columns.
+    Returns:
+        Series of lists, aligned with df.
+    """
+    columns = rank_count_columns(df)
+    labels = [c[len(RANK_COUNT_PREFIX):] for c in columns]
+    counts = df[columns].fillna(0).to_numpy(dtype="int64")
+    return pd.Series(
+        [[f"{label} ({n})" for label, n in zip(labels, row) if n] for row in counts],
+        index=df.index, dtype=object
+    )
+
+def _parquet_sibling(path: str) -> str:
+    """
+    Returns the Parquet copy of a CSV primer file if it exists and is at least as new, else "".
+    """
+    stem, ext = os.path.splitext(path)
+    candidate = stem + ".parquet"
+    if ext == ".csv" and os.path.isfile(candidate) and os.path.getmtime(candidate) >= os.path.getmtime(path):
+        return candidate
+    return ""
+
 def load_data(path: str) -> pd.DataFrame:
     """
-    Loads a taxonomy summary CSV file and parses the 'Rank Summary' column as a list.
+    Loads a taxonomy summary file.
+
+    Parquet files (or the Parquet copy next to a CSV) are read as typed columns with
+    integer rank counts, so nothing is parsed per row. CSV files with rank count columns
+    are read as-is; older CSV files only have the stringified 'Rank Summary' list, which
+    is parsed.
     Args:
-        path: Path to the CSV file.
+        path: Path to the CSV or Parquet file.
     Returns:
-        DataFrame with parsed data.
+        DataFrame with the taxonomy summary.
     """
+    parquet = path if path.endswith(".parquet") else _parquet_sibling(path)
+    if parquet:
+        try:
+            return pd.read_parquet(parquet)
+        except ImportError:
+            if parquet == path:
+                raise
     df: pd.DataFrame = pd.read_csv(path)
+    if rank_count_columns(df):
+        return df.drop(columns=["Rank Summary"], errors="ignore")
     df["Rank Summary"] = df["Rank Summary"].apply(ast.literal_eval)
     return df
-# ---
\ No newline at end of file
+
+def load_columns(path: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Loads only the given columns of a taxonomy summary file.
+
+    The Parquet copy (if present and up to date) is read column by column; for CSV files
+    only the requested columns are converted.
+    Args:
+        path: Path to the CSV or Parquet file.
+        columns: Columns to load.
+    Returns:
+        DataFrame with just those columns.
+    """
+    parquet = path if path.endswith(".parquet") else _parquet_sibling(path)
+    if parquet:
+        try:
+            return pd.read_parquet(parquet, columns=columns)
+        except ImportError:
+            if parquet == path:
+                raise
+    return pd.read_csv(path, usecols=columns)[columns]
+# ---
@@ -0,0 +1,76 @@
+# primer_tester_ui/dataset.py
+import os
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+import pandas as pd
+import streamlit as st
+
+from primer_tester_ui.config import DATASET_CACHE_ENTRIES
+from primer_tester_ui.data_io import load_data
+from primer_tester_ui.taxonomy import (
+    TaxonomySearchIndex, TaxonomyTree, add_is_real_species_column, add_taxonomy_list_column,
+    get_hash_to_taxlist_map, visible_rows
+)
+
+@dataclass(frozen=True)
+class PrimerDataset:
+    """
+    A primer file prepared for the app, shared read-only between reruns and sessions.
+
+    Attributes:
+        path (str): Primer file path.
+        df (pd.DataFrame): Taxonomy summary with the 'Taxonomy List' and 'IsRealSpecies' columns added.
+        taxonomy_lists (List[List[str]]): Lineage of each row, split on ';'.
+        hash_to_taxlist (Dict[str, List[str]]): SHA-1 hash -> lineage list, for URL selections.
+        search_index (TaxonomySearchIndex): Token index over the rows of df.
+        tree (TaxonomyTree): Parent/child links between the visible rows of df.
+    """
+    path: str
+    df: pd.DataFrame
+    taxonomy_lists: List[List[str]]
+    hash_to_taxlist: Dict[str, List[str]]
+    search_index: TaxonomySearchIndex
+    tree: TaxonomyTree
+
+def file_signature(path: str) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Returns (path, mtime_ns, size) for a primer file and its Parquet copy, if any.
+    Args:
+        path: Primer file path.
+    Returns:
+        Tuple that changes whenever either file is rewritten.
+    """
+    candidates = [path, os.path.splitext(path)[0] + ".parquet"]
+    signature = []
+    for f in dict.fromkeys(candidates):
+        if os.path.isfile(f):
+            st_ = os.stat(f)
+            signature.append((f, st_.st_mtime_ns, st_.st_size))
+    return tuple(signature)
+
+@st.cache_resource(max_entries=DATASET_CACHE_ENTRIES, show_spinner="Loading primer file...")
+def _prepare_dataset(path: str, signature: Tuple[Tuple[str, int, int], ...]) -> PrimerDataset:
+    df = add_is_real_species_column(add_taxonomy_list_column(load_data(path)))
+    return PrimerDataset(
+        path=path,
+        df=df,
+        taxonomy_lists=df["Taxonomy List"].tolist(),
+        hash_to_taxlist=get_hash_to_taxlist_map(df),
+        search_index=TaxonomySearchIndex(df["Taxonomy"].tolist()),
+        tree=TaxonomyTree(df["Taxonomy"].tolist(), visible_rows(df)),
+    )
+
+def get_primer_dataset(path: str) -> PrimerDataset:
+    """
+    Returns the prepared dataset for a primer file from the process-wide cache.
+
+    The cache is keyed by path, mtime and size, so a rewritten primer file is reloaded
+    on the next rerun, and holds at most DATASET_CACHE_ENTRIES datasets (least recently
+    used first out). The returned dataset is shared: callers must not modify it in place.
+    Args:
+        path: Primer file path.
+    Returns:
+        PrimerDataset for the current version of the file.
+    """
+    return _prepare_dataset(path, file_signature(path))
+# ---
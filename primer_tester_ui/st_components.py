@@ -2,6 +2,11 @@
 import streamlit as st
 from typing import List, Dict, Optional
 from primer_tester_ui.utils import update_query_params
+from primer_tester_ui.data_io import format_rank_summary
+from primer_tester_ui.dataset import PrimerDataset
+from primer_tester_ui.taxonomy import TaxonomyTree
+from primer_tester_ui.config import PAGE_SIZE
+from primer_tester_ui.compare import compare_primers
 import pandas as pd
 
 def primer_picker_dialog(
@@ -39,19 +44,56 @@ def primer_picker_dialog(
 
     return st.session_state.get("primer_file")
 
+def paginate(n_rows: int, page_size: int, key: str) -> slice:
+    """
+    Shows a page picker when there are more rows than fit on one page.
+    Args:
+        n_rows: Number of rows to page through.
+        page_size: Rows per page.
+        key: Widget key (one page position is remembered per key).
+    Returns:
+        Slice of the rows on the current page.
+    """
+    n_pages = max(1, -(-n_rows // page_size))
+    if n_pages == 1:
+        return slice(0, n_rows)
+    if st.session_state.get(key, 1) > n_pages:
+        st.session_state[key] = 1
+    page = st.number_input(f"Page (of {n_pages}, {n_rows} rows)", min_value=1, max_value=n_pages, step=1, key=key)
+    start = (int(page) - 1) * page_size
+    return slice(start, min(start + page_size, n_rows))
+
+def _add_selections(
+    selected_now: List[List[str]],
+    selected_lists: List[List[str]],
+    primer_basename: str
+) -> List[List[str]]:
+    """
+    Appends newly ticked taxonomy lists to the selection, updating the URL, and reruns if anything changed.
+    """
+    prev_tuples = {tuple(x) for x in selected_lists}
+    new = [list(x) for x in selected_now if tuple(x) not in prev_tuples]
+    if new:
+        updated = selected_lists + new
+        update_query_params(updated, primer_basename)
+        st.session_state["selected_taxonomy_lists"] = updated
+        st.rerun()
+    return st.session_state["selected_taxonomy_lists"]
+
 def taxonomy_selector(
     filtered: pd.DataFrame, 
     selected_lists: List[List[str]], 
     primer_basename: str
 ) -> List[List[str]]:
     """
-    Displays a taxonomy selector table with checkboxes. Ensures 'Taxonomy List' column is present.
+    Displays a taxonomy selector table with checkboxes, one page at a time. Ensures 'Taxonomy List' column is present.
     """
-    if "Taxonomy List" not in filtered.columns:
-        filtered = filtered.copy()
-        filtered["Taxonomy List"] = filtered["Taxonomy"].str.split(";")
     if filtered.empty:
         return selected_lists
+    page = paginate(len(filtered), PAGE_SIZE, key="search_page")
+    filtered = filtered.iloc[page].copy()
+    if "Taxonomy List" not in filtered.columns:
+        filtered["Taxonomy List"] = filtered["Taxonomy"].str.split(";")
     filtered.loc[:, "Select"] = False
     editor_cols = ["Select", "Taxonomy List"]
     edited = st.data_editor(
@@ -62,20 +104,79 @@ def taxonomy_selector(
         },
         hide_index=True,
         use_container_width=True,
-        key="taxonomy_editor",
+        key=f"taxonomy_editor_{page.start}",
     )
-    selected_now = edited[edited["Select"]]["Taxonomy List"].apply(tuple).tolist()
-    prev_tuples = [tuple(x) for x in selected_lists]
-    new = [list(x) for x in selected_now if x not in prev_tuples]
-    if new:
-        updated = selected_lists + new
-        update_query_params(updated, primer_basename)
-        st.session_state["selected_taxonomy_lists"] = updated
+    selected_now = edited[edited["Select"]]["Taxonomy List"].tolist()
+    return _add_selections(selected_now, selected_lists, primer_basename)
+
+def taxonomy_browser(
+    dataset: PrimerDataset,
+    selected_lists: List[List[str]],
+    primer_basename: str
+) -> List[List[str]]:
+    """
+    Displays the taxonomy as a tree: a breadcrumb to the current node and one page of its
+    children, with checkboxes to select a child or open it. Only the rows on screen are
+    sent to the browser.
+    """
+    tree, df = dataset.tree, dataset.df
+    path = st.session_state.get("browse_path", "")
+    node = tree.row_of.get(path, TaxonomyTree.ROOT) if path else TaxonomyTree.ROOT
+    if node == TaxonomyTree.ROOT:
+        path = ""
+
+    parts = path.split(";") if path else []
+    crumbs = [("All", "")] + [(name, ";".join(parts[:i + 1])) for i, name in enumerate(parts)]
+    for i, (col, (label, target)) in enumerate(zip(st.columns(len(crumbs)), crumbs)):
+        if col.button(label, key=f"crumb_{i}", disabled=target == path, use_container_width=True):
+            st.session_state["browse_path"] = target
+            st.rerun()
+
+    children = tree.children(node)
+    if not len(children):
+        st.caption("No child taxa.")
+        return selected_lists
+    page = paginate(len(children), PAGE_SIZE, key=f"browse_page:{path}")
+    rows = children[page]
+    view = df.iloc[rows]
+    selected = {tuple(x) for x in selected_lists}
+    table = pd.DataFrame({
+        "Select": [tuple(x) in selected for x in view["Taxonomy List"]],
+        "Open": False,
+        "Taxon": [x[-1] for x in view["Taxonomy List"]],
+        "Entries": view["Entries"].to_numpy(),
+        "Amplifies": view["Amplifies"].to_numpy(),
+        "Differentiable": view["Differentiable"].to_numpy(),
+        "Children": tree.n_children(rows),
+    })
+    edited = st.data_editor(
+        table,
+        column_config={
+            "Select": st.column_config.CheckboxColumn(label="✓"),
+            "Open": st.column_config.CheckboxColumn(label="Open"),
+        },
+        disabled=["Taxon", "Entries", "Amplifies", "Differentiable", "Children"],
+        hide_index=True,
+        use_container_width=True,
+        key=f"tree_editor:{path}:{page.start}",
+    )
+    opened = edited["Open"].to_numpy(dtype=bool) & (table["Children"].to_numpy() > 0)
+    if opened.any():
+        st.session_state["browse_path"] = view["Taxonomy"].iloc[int(opened.argmax())]
         st.rerun()
-    return st.session_state["selected_taxonomy_lists"]
+    selected_now = view["Taxonomy List"][edited["Select"].to_numpy(dtype=bool)].tolist()
+    return _add_selections(selected_now, selected_lists, primer_basename)
 
-def show_selected_table(selected_lists: List[List[str]], df: pd.DataFrame) -> None:
-    """Display details table with robust % calculations."""
+def show_selected_table(
+    selected_lists: List[List[str]],
+    df: pd.DataFrame,
+    row_of: Optional[Dict[str, int]] = None
+) -> None:
+    """Display details table with robust % calculations.
+
+    With `row_of` (Taxonomy string -> row position, see TaxonomyTree) only the selected
+    rows are looked up; otherwise the whole frame is joined against the selection.
+    """
     if not selected_lists:
         return
 
@@ -83,9 +184,15 @@ def show_selected_table(selected_lists: List[List[str]], df: pd.DataFrame) -> No
 
     # --- build the rows we need ------------------------------------------------
     sel_df = pd.DataFrame({"Taxonomy List": selected_lists})
-    df = df.copy()
-    df["Taxonomy Tuple"] = df["Taxonomy List"].apply(tuple)
     sel_df["Taxonomy Tuple"] = sel_df["Taxonomy List"].apply(tuple)
+    if row_of is not None:
+        rows = [row_of.get(";".join(x), -1) for x in selected_lists]
+        found = [r for r in rows if r >= 0]
+        df = df.iloc[found].drop(columns=["Taxonomy List"])
+        df["Taxonomy Tuple"] = [tuple(x) for x, r in zip(selected_lists, rows) if r >= 0]
+    else:
+        df = df.copy()
+        df["Taxonomy Tuple"] = df["Taxonomy List"].apply(tuple)
     detailed = sel_df.merge(df, on="Taxonomy Tuple", how="left")
 
     # --- helper: extract the integer count from either int or "9 (81.8%)" -----
@@ -118,6 +225,8 @@ def show_selected_table(selected_lists: List[List[str]], df: pd.DataFrame) -> No
         ),
         axis=1,
     )
+    if "Rank Summary" not in detailed.columns:
+        detailed.loc[:, "Rank Summary"] = format_rank_summary(detailed)
 
     st.dataframe(
         detailed[["Taxonomy", "Amplifies (n %)", "Differentiable (n %)", "Rank Summary"]],
@@ -125,4 +234,32 @@ def show_selected_table(selected_lists: List[List[str]], df: pd.DataFrame) -> No
         hide_index=True,
     )
 
+def show_primer_comparison(selected_lists: List[List[str]], primer_files: List[str]) -> None:
+    """Display the selected taxa against every primer file, one column per primer pair."""
+    if not selected_lists:
+        return
+
+    st.markdown("### Compare Primer Pairs")
+    metric = st.radio(
+        "Show", ["Amplifies (n %)", "Differentiable (n %)", "Entries"], horizontal=True, key="compare_metric"
+    )
+    with st.spinner(f"Loading {len(primer_files)} primer files..."):
+        long = compare_primers([";".join(x) for x in selected_lists], primer_files)
+
+    entries = long["Entries"].astype("Float64")
+    amplifies = long["Amplifies"].astype("Float64")
+    if metric == "Entries":
+        cells = long["Entries"].astype("string")
+    elif metric == "Amplifies (n %)":
+        pct = (amplifies / entries.where(entries > 0)).astype("float64")
+        cells = long["Amplifies"].astype("string") + pct.map(lambda p: f" ({p:.1%})" if p == p else "")
+    else:
+        pct = (long["Differentiable"].astype("Float64") / amplifies.where(amplifies > 0)).astype("float64")
+        cells = long["Differentiable"].astype("string") + pct.map(lambda p: f" ({p:.1%})" if p == p else "")
+    long["Cell"] = cells.fillna("—")
+
+    wide = long.pivot(index="Taxonomy", columns="Primer", values="Cell")
+    wide = wide.reindex(index=list(dict.fromkeys(long["Taxonomy"])), columns=list(dict.fromkeys(long["Primer"])))
+    st.dataframe(wide, use_container_width=True)
+
 # ---
\ No newline at end of file
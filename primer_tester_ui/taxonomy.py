@@ -1,7 +1,8 @@
 # primer_tester_ui/taxonomy.py
 import pandas as pd
+import numpy as np
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
 import streamlit as st
 
 def is_real_species(tax: str) -> bool:
@@ -19,15 +20,170 @@ def is_real_species(tax: str) -> bool:
     genus, species = binomial.split(" ", 1)
     return g == genus and not any(species.startswith(bw) for bw in {"sp", "bacterium", "metagenome", "uncultured"})
 
-def filter_taxonomy(df: pd.DataFrame, query: str) -> pd.DataFrame:
+class TaxonomySearchIndex:
+    """
+    Token index over the lineage components of a taxonomy summary, built once per primer file.
+
+    Every row is indexed under each of its lineage components and each word in them,
+    lower-cased ('fungi', 'fusarium oxysporum', 'oxysporum', ...), so a row also matches
+    the names of all its ancestors. Tokens are kept sorted with their row positions in
+    one flat array; a search scans the distinct tokens, which are far fewer than the rows.
+
+    Attributes:
+        tokens (List[str]): Sorted distinct tokens.
+        offsets (np.ndarray): Row positions of tokens[i] are rows[offsets[i]:offsets[i + 1]].
+        rows (np.ndarray): Row positions grouped by token.
+        n_rows (int): Number of rows in the indexed frame.
+    """
+
+    def __init__(self, taxonomies: List[str]):
+        """
+        Args:
+            taxonomies: Taxonomy string of each row, in frame order.
+        """
+        token_ids: Dict[str, int] = {}
+        pair_tokens: List[int] = []
+        pair_rows: List[int] = []
+        for row, tax in enumerate(taxonomies):
+            row_tokens = set()
+            for part in tax.lower().split(";"):
+                part = part.strip()
+                if part:
+                    row_tokens.add(part)
+                    row_tokens.update(part.split())
+            for token in row_tokens:
+                pair_tokens.append(token_ids.setdefault(token, len(token_ids)))
+                pair_rows.append(row)
+        vocab = sorted(token_ids)
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[[token_ids[t] for t in vocab]] = np.arange(len(vocab))
+        codes = rank[np.asarray(pair_tokens, dtype=np.int64)]
+        order = np.argsort(codes, kind="stable")
+        self.tokens: List[str] = vocab
+        self.rows: np.ndarray = np.asarray(pair_rows, dtype=np.int64)[order]
+        self.offsets: np.ndarray = np.searchsorted(codes[order], np.arange(len(vocab) + 1))
+        self.n_rows: int = len(taxonomies)
+        # All tokens in one newline-separated string, so a term is found with one C-level scan.
+        self._text: str = "\n".join(vocab)
+        widths = np.fromiter((len(t) + 1 for t in vocab), dtype=np.int64, count=len(vocab))
+        self._starts: np.ndarray = np.concatenate([[0], np.cumsum(widths)[:-1]])
+
+    def _term_rows(self, term: str) -> np.ndarray:
+        # Substring match over the token vocabulary, like the row-wise str.contains search:
+        # 'bacter' matches 'bacteroidetes' as well as 'proteobacteria'.
+        positions = [m.start() for m in re.finditer(re.escape(term), self._text)]
+        hits = np.unique(np.searchsorted(self._starts, positions, side="right") - 1)
+        slices = [self.rows[self.offsets[i]:self.offsets[i + 1]] for i in hits]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def search(self, query: str) -> np.ndarray:
+        """
+        Returns a boolean row mask for a query.
+
+        The query is split on ';'; each part must occur in a token (as a substring, so
+        'bacter' matches 'proteobacteria') and the parts are combined with AND.
+        Args:
+            query: Search text, any case.
+        Returns:
+            Boolean array of length n_rows.
+        """
+        mask = np.ones(self.n_rows, dtype=bool)
+        for term in (t.strip() for t in query.lower().split(";")):
+            if not term:
+                continue
+            term_mask = np.zeros(self.n_rows, dtype=bool)
+            term_mask[self._term_rows(term)] = True
+            mask &= term_mask
+        return mask
+
+class TaxonomyTree:
+    """
+    Parent/child structure of the nodes in a taxonomy summary, built once per primer file.
+
+    Each node is a row; its parent is the row whose Taxonomy is the node's lineage minus
+    the last component. Only visible rows are linked, and visible rows whose parent is
+    missing are treated as roots. Children are ordered by name.
+
+    Attributes:
+        row_of (Dict[str, int]): Taxonomy string -> row position.
+    """
+    ROOT: int = -1
+
+    def __init__(self, taxonomies: List[str], visible: np.ndarray):
+        """
+        Args:
+            taxonomies: Taxonomy string of each row, in frame order.
+            visible: Boolean mask of the rows to include.
+        """
+        self.row_of: Dict[str, int] = {t: i for i, t in enumerate(taxonomies)}
+        children: Dict[int, List[int]] = {}
+        for row in np.flatnonzero(visible):
+            tax = taxonomies[row]
+            parent = self.row_of.get(tax.rsplit(";", 1)[0], self.ROOT) if ";" in tax else self.ROOT
+            if parent != self.ROOT and not visible[parent]:
+                parent = self.ROOT
+            children.setdefault(parent, []).append(row)
+        self._children: Dict[int, np.ndarray] = {
+            parent: np.array(sorted(rows, key=taxonomies.__getitem__), dtype=np.int64)
+            for parent, rows in children.items()
+        }
+
+    def children(self, row: int = ROOT) -> np.ndarray:
+        """
+        Returns the row positions of a node's children (the roots for ROOT).
+        """
+        return self._children.get(row, np.empty(0, dtype=np.int64))
+
+    def n_children(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the number of children of each given row.
+        """
+        return np.array([len(self._children.get(r, ())) for r in rows], dtype=np.int64)
+
+def add_is_real_species_column(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds a boolean 'IsRealSpecies' column (False for rows above species level).
+    Args:
+        df: Input DataFrame.
+    Returns:
+        DataFrame with 'IsRealSpecies' column added.
+    """
+    df = df.copy()
+    is_real = np.zeros(len(df), dtype=bool)
+    if "Level" in df:
+        lvl7 = (df["Level"] == 7).to_numpy()
+        is_real[lvl7] = [is_real_species(t) for t in df["Taxonomy"].to_numpy()[lvl7]]
+    df["IsRealSpecies"] = is_real
+    return df
+
+def visible_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the mask of rows shown in the app: every node above species level, and
+    species only when 'IsRealSpecies' (see `add_is_real_species_column`).
+    """
+    if "Level" not in df:
+        return np.ones(len(df), dtype=bool)
+    return (df["Level"] != 7).to_numpy() | df["IsRealSpecies"].to_numpy(dtype=bool)
+
+def filter_taxonomy(
+    df: pd.DataFrame,
+    query: str,
+    index: Optional[TaxonomySearchIndex] = None
+) -> pd.DataFrame:
     """
     Filters a taxonomy DataFrame by a query and applies species-level filtering.
     Args:
         df: Input DataFrame.
         query: Substring to search for in the Taxonomy column.
+        index: Prebuilt search index for df; when given (and df has a precomputed
+            'IsRealSpecies' column) nothing is scanned per row.
     Returns:
         Filtered DataFrame.
     """
+    if index is not None and "IsRealSpecies" in df:
+        mask = index.search(query) if query else np.ones(len(df), dtype=bool)
+        mask &= visible_rows(df)
+        return df.iloc[np.flatnonzero(mask)].copy()
     if query:
         df = df[df["Taxonomy"].str.contains(query, case=False)].copy()
     else:
@@ -1,12 +1,12 @@
 # streamlit_app.py
 import streamlit as st
 from primer_tester_ui.config import PRIMER_DIR
-from primer_tester_ui.data_io import get_primer_files, load_data
-from primer_tester_ui.taxonomy import (
-    filter_taxonomy, add_taxonomy_list_column, get_hash_to_taxlist_map,
-    load_selected_taxonomies_from_queryparams
+from primer_tester_ui.data_io import get_primer_files
+from primer_tester_ui.dataset import get_primer_dataset
+from primer_tester_ui.taxonomy import filter_taxonomy, load_selected_taxonomies_from_queryparams
+from primer_tester_ui.st_components import (
+    primer_picker_dialog, taxonomy_selector, taxonomy_browser, show_selected_table, show_primer_comparison
 )
-from primer_tester_ui.st_components import primer_picker_dialog, taxonomy_selector, show_selected_table
 from primer_tester_ui.utils import update_query_params
 
 def main():
@@ -16,9 +16,9 @@ def main():
     primer_file = primer_picker_dialog(primer_files, basename_to_path)
     if not primer_file:
         st.stop()
-    df = load_data(primer_file)
-    df = add_taxonomy_list_column(df)
-    hash_to_taxlist = get_hash_to_taxlist_map(df)
+    dataset = get_primer_dataset(primer_file)
+    df = dataset.df
+    hash_to_taxlist = dataset.hash_to_taxlist
 
     st.info(f"**Current primer file:** `{primer_file}`")
 
@@ -28,16 +28,23 @@ def main():
         st.session_state["selected_taxonomy_lists"] = selected_lists
 
     query = st.text_input("Search taxonomy (any level):").strip()
-    filtered = filter_taxonomy(df, query)
-    available = filtered[~filtered["Taxonomy List"].apply(lambda x: x in st.session_state["selected_taxonomy_lists"])]
+    mode = "Table" if query else st.radio("Browse", ["Tree", "Table"], horizontal=True, key="browse_mode")
 
     if st.button("Clear Selections"):
         st.session_state["selected_taxonomy_lists"] = []
         update_query_params([], primer_file)
         st.rerun()
 
-    taxonomy_selector(available, st.session_state["selected_taxonomy_lists"], primer_file)
-    show_selected_table(st.session_state["selected_taxonomy_lists"], df)
+    if mode == "Tree":
+        taxonomy_browser(dataset, st.session_state["selected_taxonomy_lists"], primer_file)
+    else:
+        filtered = filter_taxonomy(df, query, dataset.search_index)
+        selected = {tuple(x) for x in st.session_state["selected_taxonomy_lists"]}
+        available = filtered[[tuple(x) not in selected for x in filtered["Taxonomy List"]]]
+        taxonomy_selector(available, st.session_state["selected_taxonomy_lists"], primer_file)
+    show_selected_table(st.session_state["selected_taxonomy_lists"], df, dataset.tree.row_of)
+    if st.session_state["selected_taxonomy_lists"] and st.toggle("Compare all primer pairs", key="compare_primers"):
+        show_primer_comparison(st.session_state["selected_taxonomy_lists"], primer_files)
 
 if __name__ == "__main__":
     main()
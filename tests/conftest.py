@@ -0,0 +1,13 @@
+import logging
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    return logging.getLogger("amplicon_tester.tests")
+# ---
@@ -0,0 +1,24 @@
+import pytest
+
+from amplicon_tester._batch import load_primer_jobs, share_per_job
+
+@pytest.mark.parametrize("total, workers, n_jobs, share", [
+    (24, 4, 10, 6),
+    (24, 4, 2, 12),   # only two jobs run at once
+    (8, 3, 3, 2),
+    (2, 4, 4, 1),     # never below one
+    (24, 0, 5, 24),
+])
+def test_share_per_job(total, workers, n_jobs, share):
+    assert share_per_job(total, workers, n_jobs) == share
+
+def test_load_primer_jobs(tmp_path):
+    path = tmp_path / "jobs.tsv"
+    path.write_text("# region\tforward\treverse\n\nITS\tctacc\tGAGAT\nV3V4\tCCTAC\tGACTA\tresults.json\n")
+    jobs = load_primer_jobs(str(path))
+    assert [job.name for job in jobs] == ["ITS_CTACC_GAGAT", "V3V4_CCTAC_GACTA"]
+    assert [job.ipcr_json for job in jobs] == [None, "results.json"]
+    path.write_text("ITS\tCTACC\n")
+    with pytest.raises(ValueError):
+        load_primer_jobs(str(path))
+# ---
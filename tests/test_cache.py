@@ -0,0 +1,39 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from amplicon_tester._cache import StageCache
+
+def test_file_digest_is_hashed_once_across_threads(tmp_path, logger, caplog):
+    cache = StageCache(str(tmp_path / "cache"), 1 << 30, logger)
+    data = tmp_path / "refs.fasta"
+    data.write_bytes(b">r1\nACGT\n" * 200_000)
+    inputs = [tmp_path / f"amplicons{i}.fasta" for i in range(8)]
+    for i, path in enumerate(inputs):
+        path.write_text(f">a{i}\nACGT\n")
+
+    caplog.set_level("INFO")
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        digests = list(executor.map(cache.file_digest, [str(data)] * 16 + [str(p) for p in inputs]))
+    assert set(digests[:16]) == {hashlib.sha256(data.read_bytes()).hexdigest()}
+    assert caplog.text.count(f"Hashing {data}") == 1
+    # Concurrent updates of the index keep every entry.
+    with open(tmp_path / "cache" / StageCache.DIGEST_INDEX) as fh:
+        index = json.load(fh)
+    assert set(index) == {os.path.realpath(p) for p in [data] + inputs}
+
+def test_file_digest_prunes_missing_files(tmp_path, logger):
+    cache = StageCache(str(tmp_path / "cache"), 1 << 30, logger)
+    old, new = tmp_path / "old.fasta", tmp_path / "new.fasta"
+    old.write_text(">a\nA\n")
+    new.write_text(">b\nC\n")
+    cache.file_digest(str(old))
+    old.unlink()
+    cache.file_digest(str(new))
+    with open(tmp_path / "cache" / StageCache.DIGEST_INDEX) as fh:
+        assert list(json.load(fh)) == [os.path.realpath(new)]
+    # A changed file is hashed again.
+    new.write_text(">b\nCC\n")
+    assert cache.file_digest(str(new)) == hashlib.sha256(b">b\nCC\n").hexdigest()
+# ---
@@ -0,0 +1,64 @@
+import pytest
+
+from amplicon_tester._derep import (
+    dereplicate_to_fasta, expand_hits, iter_unique_amplicons, load_members, member_ids, save_members,
+    strip_size_label
+)
+from amplicon_tester._io_utils import iter_fasta
+from amplicon_tester._vsearch import VsearchHit
+
+AMPLICONS = [
+    ("a", {"seq": "ACGTACGT"}),
+    ("b", {"seq": "TTTT"}),
+    ("c", {"seq": "acgtacgt"}),  # same amplicon as 'a', different case
+    ("a", {"seq": "GGGG"}),      # repeated ID keeps its first amplicon
+    ("d", {"seq": "CCCC"}),
+    ("e", {"seq": "TTTT"}),
+    ("f", {"seq": "ACGTACGT"}),
+]
+EXPECTED_MEMBERS = {"a": ["a", "c", "f"], "b": ["b", "e"], "d": ["d"]}
+
+def test_iter_unique_amplicons_streams_representatives():
+    members = {}
+    unique = list(iter_unique_amplicons(iter(AMPLICONS), members))
+    assert unique == [("a", "ACGTACGT"), ("b", "TTTT"), ("d", "CCCC")]
+    assert members == EXPECTED_MEMBERS
+
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_dereplicate_round_trip(tmp_path, logger, suffix):
+    fasta = str(tmp_path / f"derep.fasta{suffix}")
+    members = dereplicate_to_fasta(AMPLICONS, fasta, logger)
+    assert members == EXPECTED_MEMBERS
+    # Most abundant first, sizes annotated.
+    assert list(iter_fasta(fasta)) == [("a;size=3", "ACGTACGT"), ("b;size=2", "TTTT"), ("d;size=1", "CCCC")]
+    assert dereplicate_to_fasta(dict(AMPLICONS[:3]), str(tmp_path / "dict.fasta"), logger) == {
+        "a": ["a", "c"], "b": ["b"]
+    }
+
+    path = str(tmp_path / f"members.tsv{suffix}")
+    save_members(members, path, logger)
+    assert load_members(path, logger) == members
+    assert member_ids(members) == {"a", "b", "c", "d", "e", "f"}
+
+def make_hit(qseqid, sseqid="ref1"):
+    fields = [qseqid, sseqid, "99.5", "120", "1", "0", "1", "120", "1", "120", "1e-50", "230"]
+    return VsearchHit(fields, {})
+
+def test_expand_hits_relabels_members():
+    hits = {strip_size_label(label): make_hit(label) for label in ["a;size=3", "d;size=1"]}
+    hits["b"] = make_hit("b", "ref2")
+    expanded = expand_hits(hits, EXPECTED_MEMBERS)
+    assert set(expanded) == {"a", "b", "c", "d", "e", "f"}
+    assert {seq_id: hit.qseqid for seq_id, hit in expanded.items()} == {
+        "a": "a", "c": "c", "f": "f", "b": "b", "e": "e", "d": "d",
+    }
+    assert expanded["b"] is hits["b"]
+    assert expanded["e"] is not hits["b"] and expanded["e"].sseqid == "ref2"
+    assert expanded["f"].pident == hits["a"].pident
+    # Representatives are left untouched by the copies.
+    assert hits["a"].qseqid == "a;size=3"
+
+def test_expand_hits_without_members():
+    hit = make_hit("x")
+    assert expand_hits({"x": hit}, {}) == {"x": hit}
+# ---
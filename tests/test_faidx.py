@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+
+from amplicon_tester._faidx import FastaIndex, FastaScan, ensure_fasta_index
+
+RECORDS = {
+    "r1": "ACGT" * 50,
+    "r2;size=3": "GGCCTTAA" * 11 + "G",
+    "r3": "T",
+}
+
+def write_wrapped(path, width=60, newline="\n"):
+    with open(path, "w", newline="") as fh:
+        for name, seq in RECORDS.items():
+            fh.write(f">{name} description{newline}")
+            for i in range(0, len(seq), width):
+                fh.write(seq[i:i + width] + newline)
+
+@pytest.fixture
+def fasta(tmp_path):
+    path = tmp_path / "refs.fasta"
+    write_wrapped(path)
+    return str(path)
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_fetch_matches_records(tmp_path, logger, newline):
+    path = str(tmp_path / "refs.fasta")
+    write_wrapped(path, width=17, newline=newline)
+    index = ensure_fasta_index(path, logger)
+    assert isinstance(index, FastaIndex)
+    for name, seq in RECORDS.items():
+        assert index.fetch(name) == seq
+    assert index.fetch("r2") == RECORDS["r2;size=3"]
+    assert list(index.fetch_many(["r3", "missing", "r1"])) == [("r3", "T"), ("missing", None), ("r1", RECORDS["r1"])]
+    index.close()
+
+def test_index_falls_back_to_writable_dir(fasta, tmp_path, logger):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    unwritable = str(blocker / "refs.fasta.fai")
+    fallback = str(tmp_path / "cache" / ".faidx")
+    index = ensure_fasta_index(fasta, logger, unwritable, fallback)
+    assert isinstance(index, FastaIndex) and index.fai.startswith(fallback)
+    assert index.fetch("r1") == RECORDS["r1"]
+    # The fallback index is reused on the next call.
+    assert ensure_fasta_index(fasta, logger, unwritable, fallback).fai == index.fai
+
+def test_scan_when_no_index_can_be_written(fasta, tmp_path, logger):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    lookup = ensure_fasta_index(fasta, logger, str(blocker / "x.fai"), str(blocker / "cache"))
+    assert isinstance(lookup, FastaScan)
+    assert dict(lookup.fetch_many(["r2", "r3", "nope"])) == {"r2": RECORDS["r2;size=3"], "r3": "T", "nope": None}
+
+def test_scan_compressed_fasta(fasta, tmp_path, logger):
+    gz = str(tmp_path / "refs.fasta.gz")
+    with open(fasta, "rb") as src, gzip.open(gz, "wb") as dst:
+        dst.write(src.read())
+    lookup = ensure_fasta_index(gz, logger)
+    assert isinstance(lookup, FastaScan)
+    assert dict(lookup.fetch_many(["r1"])) == {"r1": RECORDS["r1"]}
+# ---
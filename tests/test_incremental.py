@@ -0,0 +1,173 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from amplicon_tester._derep import dereplicate_to_fasta
+from amplicon_tester._incremental import RunFingerprint, amplicon_hashes, changed_summary_rows, reference_hashes
+from amplicon_tester._io_utils import iter_fasta
+from amplicon_tester._stats import patch_taxonomy_stats, taxonomy_stats
+from amplicon_tester._summary import summarize_frame
+from amplicon_tester._taxonomy import Taxonomy
+from amplicon_tester._vsearch import VsearchHit, load_best_hits_frame
+
+FAMILY = "Bacteria;Firmicutes;Bacilli;Lactobacillales;Lactobacillaceae"
+SPECIES = [
+    f"{FAMILY};Lactobacillus;acidophilus",
+    f"{FAMILY};Lactobacillus;casei",
+    f"{FAMILY};Pediococcus;pentosaceus",
+    "Bacteria;Firmicutes;Bacilli;Lactobacillales;Streptococcaceae;Streptococcus;mutans",
+]
+AMPLICON = slice(10, 70)
+MIN_PIDENT = 75.0
+PARAMS = {"identity": MIN_PIDENT / 100}
+
+def fake_align(top_k, calls):
+    """An exhaustive aligner: the best `top_k` hits per query, ranked like VSEARCH hits, database order breaking ties."""
+    def align(queries, db_path, tsv_out):
+        refs = list(iter_fasta(db_path))
+        calls.append((sorted(label for label, _ in iter_fasta(queries)), [ref_id for ref_id, _ in refs]))
+        with open(tsv_out, "w") as out:
+            for label, seq in iter_fasta(queries):
+                hits = []
+                for order, (ref_id, ref) in enumerate(refs):
+                    target = ref[AMPLICON]
+                    pident = round(100 * sum(a == b for a, b in zip(seq, target)) / len(seq), 1)
+                    if len(target) == len(seq) and pident >= MIN_PIDENT:
+                        hits.append((VsearchHit.rank_key(1e-30, pident, len(seq)), order, ref_id, pident))
+                for _, _, ref_id, pident in sorted(hits)[:top_k]:
+                    out.write(f"{label}\t{ref_id}\t{pident}\t{len(seq)}\t0\t0\t1\t{len(seq)}\t11\t70\t1e-30\t100.0\n")
+    return align
+
+def mutate(rng, seq, n):
+    seq = list(seq)
+    for pos in rng.sample(range(len(seq)), n):
+        seq[pos] = "ACGT"[("ACGT".index(seq[pos]) + 1) % 4]
+    return "".join(seq)
+
+def write_db(path, refs):
+    with open(path, "w") as fh:
+        for ref_id, (seq, _) in refs.items():
+            fh.write(f">{ref_id}\n{seq}\n")
+    return str(path)
+
+def scenario(seed):
+    """A reference database, its update, and extra (environmental) amplicons that only hit it."""
+    rng = random.Random(seed)
+    base = ["".join(rng.choice("ACGT") for _ in range(80)) for _ in range(6)]
+    refs = {}
+    for i in range(12):
+        # Close relatives of a few founders, so queries have several candidate hits.
+        refs[f"r{i}"] = (mutate(rng, base[i % 6], rng.randint(0, 6)), SPECIES[i % len(SPECIES)])
+    refs["r3"] = (refs["r1"][0], SPECIES[2])  # same sequence as r1, other species: a tie
+    environmental = {
+        "e1": mutate(rng, refs["r5"][0][AMPLICON], 3),
+        "e2": mutate(rng, refs["r7"][0][AMPLICON], 2),
+        "e3": mutate(rng, refs["r9"][0][AMPLICON], 4),
+    }
+
+    updated = {"r13": (refs["r2"][0], SPECIES[3])}  # added first: wins its ties on database order
+    updated.update(refs)
+    updated["r4"] = (mutate(rng, refs["r4"][0], 5), refs["r4"][1])  # changed
+    del updated["r7"]  # removed; e2 hit it
+    e1 = environmental["e1"]
+    updated["r12"] = ("A" * 10 + e1 + "C" * 10, SPECIES[1])  # added: a better hit for e1
+    return refs, updated, environmental
+
+def run_full(refs, environmental, db, tmp, top_k, logger):
+    """What a full pipeline run produces: amplicons, hits, summary and stats."""
+    amplicons = [(ref_id, {"seq": seq[AMPLICON]}) for ref_id, (seq, _) in refs.items()]
+    amplicons += [(seq_id, {"seq": seq}) for seq_id, seq in environmental.items()]
+    fasta = os.path.join(tmp, "amplicons.fasta")
+    members = dereplicate_to_fasta(amplicons, fasta, logger)
+    tsv = os.path.join(tmp, "hits.tsv")
+    fake_align(top_k, [])(fasta, db, tsv)
+    expected = {ref_id: Taxonomy(lineage) for ref_id, (_, lineage) in refs.items()}
+    return fasta, members, tsv, expected
+
+def summarize(expected, members, tsv, top_k, logger):
+    hits = load_best_hits_frame(tsv, logger, top_k=top_k)
+    amplified = {seq_id for ids in members.values() for seq_id in ids}
+    return hits, summarize_frame(expected, amplified, hits, logger, members=members)
+
+def fingerprinted_run(refs, environmental, tmp, top_k, logger):
+    """A full run against `refs` that records its fingerprint; returns (amplicon FASTA, members, fingerprint, stats CSV)."""
+    db = write_db(tmp / "refs.fasta", refs)
+    fasta, members, tsv, expected = run_full(refs, environmental, db, str(tmp), top_k, logger)
+    hits, summary = summarize(expected, members, tsv, top_k, logger)
+    stats_csv = str(tmp / "taxonomy_stats.csv")
+    taxonomy_stats(summary, stats_csv, logger)
+    fingerprint = RunFingerprint(str(tmp / ".incremental"))
+    fingerprint.save(reference_hashes(db, logger), amplicon_hashes(fasta, members), summary, hits, PARAMS, stats_csv, logger)
+    return fasta, members, fingerprint, stats_csv
+
+def sorted_stats(path):
+    return pd.read_csv(path).sort_values("Taxonomy").reset_index(drop=True)
+
+@pytest.mark.parametrize("top_k", [1, 3])
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_update_matches_full_run(tmp_path, logger, seed, top_k):
+    refs, updated, environmental = scenario(seed)
+    first, second, full = (tmp_path / name for name in ("first", "second", "full"))
+    for d in (first, second, full):
+        d.mkdir()
+
+    # First run, fingerprinted.
+    _, _, fingerprint, stats_csv = fingerprinted_run(refs, environmental, first, top_k, logger)
+    assert fingerprint.matches(PARAMS) and fingerprint.stats_current(stats_csv)
+
+    # Full run against the updated database.
+    db2 = write_db(second / "refs.fasta", updated)
+    fasta2, members2, full_tsv, expected2 = run_full(updated, environmental, db2, str(full), top_k, logger)
+    full_hits, full_summary = summarize(expected2, members2, full_tsv, top_k, logger)
+    taxonomy_stats(full_summary, str(full / "taxonomy_stats.csv"), logger)
+
+    # Incremental run against the updated database.
+    calls = []
+    inc_tsv = str(second / "hits.tsv")
+    assert fingerprint.update_hits(fasta2, db2, inc_tsv, fake_align(top_k, calls), logger, top_k=top_k)
+    assert not os.path.exists(f"{inc_tsv}.incremental")
+    # Only the touched amplicons see the whole database; the rest only the new and changed references.
+    realigned = {label for queries, db in calls if len(db) == len(updated) for label in queries}
+    assert {"e2;size=1", "r4;size=1"} <= realigned and len(realigned) < len(members2)
+    assert [sorted(db) for _, db in calls if len(db) != len(updated)] == [["r12", "r13", "r4"]]
+    inc_hits, inc_summary = summarize(expected2, members2, inc_tsv, top_k, logger)
+
+    if top_k == 1:
+        assert pd.read_csv(inc_tsv, sep="\t", header=None).equals(pd.read_csv(full_tsv, sep="\t", header=None))
+    pd.testing.assert_frame_equal(inc_hits, full_hits)
+    pd.testing.assert_frame_equal(inc_summary, full_summary)
+    if top_k > 1:
+        assert inc_summary["ambiguous"].any()
+
+    removed, added = changed_summary_rows(fingerprint.load_fingerprint(), inc_summary)
+    patch_taxonomy_stats(stats_csv, removed, added, str(second / "taxonomy_stats.csv"), logger)
+    pd.testing.assert_frame_equal(sorted_stats(second / "taxonomy_stats.csv"), sorted_stats(full / "taxonomy_stats.csv"))
+
+def test_database_order_breaks_ties(tmp_path, logger):
+    refs = {"r0": ("A" * 10 + "ACGT" * 15 + "T" * 10, SPECIES[0]), "r1": ("G" * 80, SPECIES[1])}
+    fasta, _, fingerprint, _ = fingerprinted_run(refs, {}, tmp_path, 1, logger)
+
+    # An identical reference, added before and after the recorded hit.
+    for name, order in (("before", ["r2", "r0", "r1"]), ("after", ["r0", "r1", "r2"])):
+        updated = {"r2": refs["r0"], **refs}
+        db2 = write_db(tmp_path / f"{name}.fasta", {ref_id: updated[ref_id] for ref_id in order})
+        out = str(tmp_path / f"{name}.tsv")
+        assert fingerprint.update_hits(fasta, db2, out, fake_align(1, []), logger, max_changed=1.0)
+        assert pd.read_csv(out, sep="\t", header=None).set_index(0)[1].to_dict() == {"r0;size=1": order[0], "r1;size=1": "r1"}
+
+def test_too_large_update_writes_nothing(tmp_path, logger):
+    refs, _, environmental = scenario(0)
+    fasta, _, fingerprint, _ = fingerprinted_run(refs, environmental, tmp_path, 1, logger)
+
+    rng = random.Random(1)
+    rewritten = {ref_id: (mutate(rng, seq, 3), lineage) for ref_id, (seq, lineage) in refs.items()}
+    db2 = write_db(tmp_path / "rewritten.fasta", rewritten)
+    out = str(tmp_path / "incremental.tsv")
+    calls = []
+    assert not fingerprint.update_hits(fasta, db2, out, fake_align(1, calls), logger)
+    assert calls == []
+    assert not os.path.exists(out) and not os.path.exists(f"{out}.incremental")
+    assert sorted(os.listdir(tmp_path)) == sorted(["refs.fasta", "amplicons.fasta", "hits.tsv", "taxonomy_stats.csv", ".incremental", "rewritten.fasta"])
+# ---
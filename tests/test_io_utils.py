@@ -0,0 +1,109 @@
+import gzip
+import json
+import shutil
+
+import pytest
+
+from amplicon_tester import _io_utils
+from amplicon_tester._io_utils import (
+    compression_of, iter_amplicon_json, iter_fasta, load_amplicon_json, open_text, partial_path,
+    strip_compression_suffix, write_fasta
+)
+
+HAVE_ZSTD = bool(shutil.which("zstd")) or _io_utils.zstandard is not None
+CODEC_SUFFIXES = [".txt", ".gz", pytest.param(".zst", marks=pytest.mark.skipif(not HAVE_ZSTD, reason="no zstd"))]
+TEXT = "".join(f"line {i}\tvalue\n" for i in range(50_000))
+
+RECORDS = [
+    {"sequence_id": "s1:10-150", "seq": "ACGTACGTAA", "start": 10},
+    {"sequence_id": "s2:5-90", "seq": "TTTTGG", "note": 'brace } and "quote" in a string'},
+    {"sequence_id": "s2:7-200", "seq": "CCCCCCCCCC", "start": 7},  # second product of s2
+    {"sequence_id": "s3:1-50", "seq": "G" * 300, "nested": {"a": [1, 2, {"b": None}]}},
+]
+
+@pytest.fixture
+def amplicon_json(tmp_path):
+    path = tmp_path / "results.json"
+    path.write_text(" \n[\n" + ",\n  ".join(json.dumps(r) for r in RECORDS) + "\n]\n", encoding="utf-8")
+    return str(path)
+
+@pytest.mark.parametrize("chunk_size", list(range(1, 41)) + [1 << 20])
+def test_iter_amplicon_json_chunk_boundaries(amplicon_json, logger, chunk_size):
+    streamed = list(iter_amplicon_json(amplicon_json, logger, fields=None, chunk_size=chunk_size))
+    assert streamed == list(load_amplicon_json(amplicon_json, logger).items())
+
+def test_iter_amplicon_json_keeps_last_product(amplicon_json, logger):
+    streamed = dict(iter_amplicon_json(amplicon_json, logger, chunk_size=7))
+    assert streamed == {"s1": {"seq": "ACGTACGTAA"}, "s2": {"seq": "CCCCCCCCCC"}, "s3": {"seq": "G" * 300}}
+
+def test_iter_amplicon_json_non_adjacent_repeat(tmp_path, logger, caplog):
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps([RECORDS[0], RECORDS[3], {"sequence_id": "s1:0-5", "seq": "A"}]))
+    streamed = dict(iter_amplicon_json(str(path), logger))
+    assert streamed == {"s1": {"seq": "ACGTACGTAA"}, "s3": {"seq": "G" * 300}}
+    assert "Skipped 1 products" in caplog.text
+
+@pytest.mark.parametrize("text", ["", "{}", "[{\"sequence_id\": \"s1\", \"seq\": \"A\"}"])
+def test_iter_amplicon_json_malformed(tmp_path, logger, text):
+    path = tmp_path / "results.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_amplicon_json(str(path), logger, chunk_size=4))
+
+def test_write_fasta_round_trip(amplicon_json, tmp_path, logger):
+    fasta = str(tmp_path / "amplicons.fasta")
+    written = write_fasta(iter_amplicon_json(amplicon_json, logger), fasta, logger)
+    assert written == {"s1", "s2", "s3"}
+    assert dict(iter_fasta(fasta)) == {"s1": "ACGTACGTAA", "s2": "CCCCCCCCCC", "s3": "G" * 300}
+
+@pytest.mark.parametrize("suffix", CODEC_SUFFIXES)
+def test_open_text_round_trip(tmp_path, suffix):
+    path = str(tmp_path / f"data{suffix}")
+    with open_text(path, "w") as fh:
+        fh.write(TEXT)
+    with open_text(path) as fh:
+        assert fh.read() == TEXT
+    with open_text(path) as fh:  # closing before the end is not an error
+        assert next(fh) == "line 0\tvalue\n"
+    expected = {".txt": None, ".gz": "gzip", ".zst": "zstd"}[suffix]
+    assert compression_of(path) == expected
+    # Compressed content is recognized without its suffix.
+    plain_name = str(tmp_path / "renamed")
+    shutil.copy(path, plain_name)
+    assert compression_of(plain_name) == expected
+    with open_text(plain_name) as fh:
+        assert fh.read() == TEXT
+
+def test_open_text_gzip_module_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(_io_utils.shutil, "which", lambda tool: None)
+    path = str(tmp_path / "data.tsv.gz")
+    with open_text(path, "w") as fh:
+        fh.write(TEXT)
+    with gzip.open(path, "rt") as fh:
+        assert fh.read() == TEXT
+
+@pytest.mark.skipif(not shutil.which("zstd"), reason="needs the zstd tool")
+def test_open_text_truncated_zstd_fails(tmp_path):
+    path = tmp_path / "data.zst"
+    with open_text(str(path), "w") as fh:
+        fh.write(TEXT)
+    path.write_bytes(path.read_bytes()[:2000])
+    with pytest.raises(OSError):
+        with open_text(str(path)) as fh:
+            fh.read()
+
+def test_compressed_path_helpers():
+    assert strip_compression_suffix("summary.csv.gz") == "summary.csv"
+    assert strip_compression_suffix("summary.csv") == "summary.csv"
+    assert partial_path("hits.tsv.zst") == "hits.tsv.part.zst"
+    assert partial_path("hits.tsv") == "hits.tsv.part"
+
+@pytest.mark.parametrize("suffix", CODEC_SUFFIXES)
+def test_fasta_and_json_through_codecs(amplicon_json, tmp_path, logger, suffix):
+    compressed_json = str(tmp_path / f"results.json{suffix}")
+    with open(amplicon_json) as src, open_text(compressed_json, "w") as dst:
+        dst.write(src.read())
+    fasta = str(tmp_path / f"amplicons.fasta{suffix}")
+    write_fasta(iter_amplicon_json(compressed_json, logger, chunk_size=5), fasta, logger)
+    assert dict(iter_fasta(fasta)) == {"s1": "ACGTACGTAA", "s2": "CCCCCCCCCC", "s3": "G" * 300}
+# ---
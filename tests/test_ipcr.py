@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from amplicon_tester._ipcr import (
+    IUPAC, PrimerPair, _base_masks, _find_sites, find_amplicons, reverse_complement
+)
+
+def brute_force_sites(seq, primer, max_mismatches):
+    sites = {}
+    for pos in range(len(seq) - len(primer) + 1):
+        mm = sum(
+            1 for s, p in zip(seq[pos:pos + len(primer)], primer.upper())
+            if s.upper().replace("U", "T") not in IUPAC.get(p, "")
+        )
+        if mm <= max_mismatches:
+            sites[pos] = mm
+    return sites
+
+@pytest.mark.parametrize("max_mismatches", [0, 1, 2, 3])
+def test_find_sites_matches_brute_force(max_mismatches):
+    rng = random.Random(max_mismatches)
+    for _ in range(200):
+        seq = "".join(rng.choice("ACGTACGTACGTNacgtU") for _ in range(rng.randint(0, 90)))
+        primer = "".join(rng.choice("ACGTACGTRYN") for _ in range(rng.randint(1, 8)))
+        # Plant a near-copy of the primer so matches are not all accidental.
+        if len(seq) > len(primer):
+            at = rng.randrange(len(seq) - len(primer) + 1)
+            planted = "".join(rng.choice(IUPAC[c]) for c in primer)
+            seq = seq[:at] + planted + seq[at + len(primer):]
+        assert _find_sites(_base_masks(seq), len(seq), primer, max_mismatches) == \
+            brute_force_sites(seq, primer, max_mismatches), (seq, primer)
+
+def test_find_sites_short_target():
+    assert _find_sites(_base_masks("ACG"), 3, "ACGT", 1) == {}
+    assert _find_sites(_base_masks(""), 0, "A", 0) == {}
+
+def test_find_amplicons_both_strands():
+    pair = PrimerPair(forward="ACGTTG", reverse="GGATCC")
+    product = "ACGTTG" + "T" * 40 + reverse_complement("GGATCC")
+    seq = "AAAA" + product + "CCCC" + reverse_complement(product) + "GG"
+    amplicons = find_amplicons("s1", seq, pair, min_length=10, max_length=len(product))
+    assert [(a["type"], a["start"], a["end"], a["seq"]) for a in amplicons] == [
+        ("forward", 4, 4 + len(product), product),
+        ("revcomp", 8 + len(product), 8 + 2 * len(product), product),
+    ]
+# ---
@@ -0,0 +1,85 @@
+import random
+import shutil
+
+import pytest
+
+from amplicon_tester import _io_utils
+from amplicon_tester._io_utils import open_text
+from amplicon_tester._kmer import MAX_K, KmerIndex, classify_kmer, ensure_kmer_index, kmer_codes, kmer_identity
+
+K = 11
+
+def random_seq(rng, n):
+    return "".join(rng.choice("ACGT") for _ in range(n))
+
+@pytest.fixture
+def references(tmp_path, logger):
+    rng = random.Random(7)
+    conserved = random_seq(rng, 60)
+    seqs = {f"r{i}": conserved + random_seq(rng, 120) for i in range(3)}
+    fasta = tmp_path / "refs.fasta"
+    with open(fasta, "w") as fh:
+        fh.writelines(f">{seq_id}\n{seq}\n" for seq_id, seq in seqs.items())
+    index = ensure_kmer_index(str(fasta), str(tmp_path / "refs.kmi"), K, logger, processes=1)
+    return seqs, conserved, index, rng
+
+def test_top_hits_exact_match(references):
+    seqs, _, index, _ = references
+    n_kmers, hits = index.top_hits(seqs["r1"], max_hits=2)
+    assert n_kmers == len(kmer_codes(seqs["r1"], K))
+    assert hits[0] == (index.ids.index("r1"), n_kmers)
+
+def test_top_hits_skipped_kmers_are_not_credited(references):
+    seqs, conserved, index, rng = references
+    query = conserved + random_seq(rng, 120)  # shares only the conserved region
+    n_all, _ = index.top_hits(query, max_hits=3)
+    n_scored, hits = index.top_hits(query, max_hits=3, max_postings=2)
+    # The conserved k-mers occur in all three references, so they are left out of the score.
+    assert n_scored < n_all
+    assert all(shared <= n_scored for _, shared in hits)
+    best = hits[0][1] if hits else 0
+    assert kmer_identity(best, n_scored, K) < 90.0
+
+def test_top_hits_without_shared_kmers(references):
+    _, _, index, rng = references
+    assert index.top_hits(random_seq(rng, 80))[1] == []
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_index_matches_brute_force(tmp_path, logger, chunk_size):
+    rng = random.Random(chunk_size)
+    seqs = [random_seq(rng, rng.randint(0, 60)) + rng.choice(["", "N", "NNRY"]) + random_seq(rng, 20) for _ in range(40)]
+    fasta = tmp_path / "refs.fasta"
+    with open(fasta, "w") as fh:
+        fh.writelines(f">r{i}\n{seq}\n" for i, seq in enumerate(seqs))
+    index = KmerIndex.build(str(fasta), str(tmp_path / "refs.kmi"), 5, logger, processes=2, chunk_size=chunk_size)
+    expected = {}
+    for i, seq in enumerate(seqs):
+        for code in kmer_codes(seq, 5):
+            expected.setdefault(int(code), []).append(i)
+    assert index.offsets[-1] == sum(len(refs) for refs in expected.values())
+    for code in range(4 ** 5):
+        assert index.postings[index.offsets[code]:index.offsets[code + 1]].tolist() == expected.get(code, [])
+    assert index.ids == [f"r{i}" for i in range(len(seqs))]
+
+def test_index_rejects_large_k(tmp_path, logger):
+    with pytest.raises(ValueError):
+        KmerIndex.build(str(tmp_path / "refs.fasta"), str(tmp_path / "refs.kmi"), MAX_K + 1, logger)
+
+@pytest.mark.skipif(not shutil.which("zstd") and _io_utils.zstandard is None, reason="no zstd")
+def test_classify_kmer_compressed_output(references, tmp_path, logger):
+    seqs, _, index, _ = references
+    queries = str(tmp_path / "queries.fasta")
+    with open(queries, "w") as fh:
+        fh.writelines(f">q{i}\n{seq}\n" for i, seq in enumerate(seqs.values()))
+    plain, zst = str(tmp_path / "hits.tsv"), str(tmp_path / "hits.tsv.zst")
+    for out in (plain, zst):
+        classify_kmer(queries, index, out, logger, identity=0.97, processes=2, chunk_size=1)
+    with open_text(zst) as fh:
+        rows = fh.read()
+    with open(plain) as fh:
+        assert rows == fh.read()
+    assert [line.split("\t")[:3] for line in rows.splitlines()] == [
+        ["q0", "r0", "100.0"], ["q1", "r1", "100.0"], ["q2", "r2", "100.0"]
+    ]
+    assert open(zst, "rb").read(4) == b"\x28\xb5\x2f\xfd"
+# ---
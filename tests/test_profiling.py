@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from amplicon_tester._profiling import RunProfiler
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc")
+def test_stage_peak_rss_is_per_stage(logger):
+    profiler = RunProfiler("test", logger)
+    with profiler.stage("heavy"):
+        block = bytearray(200 * 2**20)
+        block[::4096] = b"\1" * len(block[::4096])  # touch every page
+        del block
+    with profiler.stage("light"):
+        pass
+    heavy, light = profiler.stages
+    assert heavy.peak_rss_mb - light.peak_rss_mb > 150
+    # The lifetime high-water mark carries over; the stage peak does not.
+    assert light.rss_high_water_mb - light.peak_rss_mb > 150
+# ---
@@ -0,0 +1,104 @@
+import pandas as pd
+import pytest
+
+from amplicon_tester._summary import summarize_frame, SUMMARY_COLUMNS
+from amplicon_tester._taxonomy import Taxonomy, core_species_name, deepest_matching_rank
+from amplicon_tester._vsearch import VsearchHit
+
+PREFIX = "Bacteria;Firmicutes;Bacilli;Lactobacillales;Lactobacillaceae"
+
+LINEAGES = {
+    "a1": f"{PREFIX};Lactobacillus;acidophilus",
+    "a2": f"{PREFIX};Lactobacillus;acidophilus strain X",
+    "b1": f"{PREFIX};Lactobacillus;casei",
+    "c1": f"{PREFIX};Lactobacillus;",
+    "d1": "Bacteria;Proteobacteria;Gammaproteobacteria;Enterobacterales;Enterobacteriaceae;Escherichia;Escherichia coli",
+    "e1": f"{PREFIX};Pediococcus;Pediococcus pentosaceus",
+}
+
+# query, subject, pident
+HITS = [
+    ("a1", "a2", 99.0),  # genus match upgraded to species by core name
+    ("a2", "b1", 98.0),  # same genus, different species
+    ("b1", "c1", 97.5),  # trailing ';' (empty species) on the hit
+    ("c1", "a1", 97.5),  # trailing ';' on the query
+    ("d1", "e1", 97.1),  # different phylum
+]
+
+COMPARED = [
+    "sequence_id", "expected_taxonomy", "amplifies", "differentiable", "deepest_rank",
+    "top_vsearch_taxonomy", "top_vsearch_pident", "top_vsearch_sseqid",
+]
+
+def blast6(qseqid, sseqid, pident):
+    return [qseqid, sseqid, pident, 200, 0, 0, 1, 200, 1, 200, 1e-50, 350.0]
+
+@pytest.fixture
+def expected():
+    return {seq_id: Taxonomy(lineage) for seq_id, lineage in LINEAGES.items()}
+
+def row_summary(expected, amplicons, vsearch_hits):
+    """The row-by-row summary `summarize_frame` replaced, kept as its reference."""
+    summary = []
+    for seq_id, exp_tax in expected.items():
+        out = {
+            "sequence_id": seq_id,
+            "expected_taxonomy": str(exp_tax),
+            "amplifies": False,
+            "differentiable": False,
+            "deepest_rank": None,
+            "top_vsearch_taxonomy": None,
+            "top_vsearch_pident": None,
+            "top_vsearch_sseqid": None,
+        }
+        top = vsearch_hits.get(seq_id)
+        if seq_id in amplicons:
+            out["amplifies"] = True
+            if top and top.taxonomy:
+                out["top_vsearch_taxonomy"] = str(top.taxonomy)
+                out["top_vsearch_pident"] = top.pident
+                out["top_vsearch_sseqid"] = top.sseqid
+                match_rank = deepest_matching_rank(top.taxonomy, exp_tax)
+                out["deepest_rank"] = match_rank
+                out["differentiable"] = match_rank in {"species"}
+        summary.append(out)
+    # Genus matches are upgraded to species when the core names agree.
+    for row in summary:
+        if row["amplifies"] and row.get("deepest_rank") == "genus":
+            exp_core = core_species_name(row["expected_taxonomy"])
+            hit_core = core_species_name(row["top_vsearch_taxonomy"] or "")
+            if exp_core and hit_core and exp_core == hit_core:
+                row["deepest_rank"] = "species"
+                row["differentiable"] = True
+    return summary
+
+def normalize(records):
+    frame = pd.DataFrame(records)[COMPARED]
+    return frame.astype(object).where(frame.notna(), None).sort_values("sequence_id").reset_index(drop=True)
+
+def test_core_species_name_empty_species_field():
+    assert core_species_name(f"{PREFIX};Lactobacillus;") == ""
+    assert core_species_name(f"{PREFIX};Lactobacillus; ") == ""
+    assert core_species_name(LINEAGES["a2"]) == "Lactobacillus acidophilus"
+
+def test_summarize_frame_matches_row_summary(expected, logger):
+    amplicons = {"a1", "a2", "b1", "c1", "d1"}  # e1 does not amplify
+    hits = {q: VsearchHit(blast6(q, s, p), expected) for q, s, p in HITS}
+
+    old = normalize(row_summary(expected, amplicons, hits))
+    from_dict = summarize_frame(expected, amplicons, hits, logger)
+    frame_hits = pd.DataFrame([blast6(q, s, p)[:3] for q, s, p in HITS], columns=["qseqid", "sseqid", "pident"])
+    from_frame = summarize_frame(expected, amplicons, frame_hits, logger)
+
+    assert list(from_dict.columns) == SUMMARY_COLUMNS
+    pd.testing.assert_frame_equal(normalize(from_dict), old)
+    pd.testing.assert_frame_equal(normalize(from_frame), old)
+    ranks = dict(zip(old["sequence_id"], old["deepest_rank"]))
+    assert ranks == {"a1": "species", "a2": "genus", "b1": "genus", "c1": "genus", "d1": "domain", "e1": None}
+
+def test_summarize_frame_trailing_semicolon_lineages(expected, logger):
+    hits = {"c1": VsearchHit(blast6("c1", "c1", 100.0), expected)}
+    summary = summarize_frame(expected, {"c1"}, hits, logger).set_index("sequence_id")
+    assert summary.loc["c1", "deepest_rank"] == "genus"
+    assert not summary.loc["c1", "differentiable"]
+# ---
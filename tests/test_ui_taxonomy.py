@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from primer_tester_ui.taxonomy import TaxonomySearchIndex
+
+TAXONOMIES = [
+    "Bacteria",
+    "Bacteria;Bacteroidetes",
+    "Bacteria;Proteobacteria",
+    "Bacteria;Proteobacteria;Gammaproteobacteria",
+    "Bacteria;Cyanobacteria",
+    "Unassigned;Proteobacteria",
+    "Eukaryota;Fungi;Ascomycota;Sordariomycetes;Hypocreales;Nectriaceae;Fusarium;Fusarium oxysporum",
+    "Eukaryota;Fungi;Basidiomycota",
+]
+
+@pytest.fixture(scope="module")
+def index():
+    return TaxonomySearchIndex(TAXONOMIES)
+
+@pytest.mark.parametrize("term", [
+    "bacter", "BACTER", "proteo", "bacteria", "mycota", "fusarium oxy", "oxysporum", "a", "xyz", "cyano",
+])
+def test_search_matches_substring_filter(index, term):
+    expected = pd.Series(TAXONOMIES).str.contains(term, case=False, regex=False).to_numpy()
+    np.testing.assert_array_equal(index.search(term), expected)
+
+def test_search_parts_are_combined(index):
+    rows = np.flatnonzero(index.search("fungi; mycota"))
+    assert [TAXONOMIES[r] for r in rows] == [TAXONOMIES[6], TAXONOMIES[7]]
+    assert not index.search("bacteroidetes;cyano").any()
+
+def test_search_empty_index():
+    assert len(TaxonomySearchIndex([]).search("bacter")) == 0
+# ---
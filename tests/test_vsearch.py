@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from amplicon_tester._summary import summarize_frame
+from amplicon_tester._taxonomy import Taxonomy
+from amplicon_tester._vsearch import (
+    VsearchHit, collect_top_hits, collect_top_k_hits, load_best_hits_frame, tied_top_hits
+)
+
+def random_rows(seed, n_rows=400, n_queries=12):
+    """BLAST6 rows with few distinct scores, so ties are common; every row has its own subject."""
+    rng = random.Random(seed)
+    rows = []
+    for n in range(n_rows):
+        query = f"q{rng.randrange(n_queries)}"
+        if rng.random() < 0.3:
+            query += f";size={rng.randint(1, 9)}"
+        rows.append([
+            query, f"r{n}", rng.choice(["97.0", "98.5", "100.0"]), str(rng.choice([150, 151])),
+            "0", "0", "1", "150", "1", "150", rng.choice(["1e-50", "1e-40"]), "250",
+        ])
+    return rows
+
+def brute_force_top_k(rows, k):
+    """Stable sort by the hit ordering (file order breaks ties), then the first k per query."""
+    ranked = sorted(rows, key=lambda f: VsearchHit.rank_key(float(f[10]), float(f[2]), int(f[3])))
+    top = {}
+    for fields in ranked:
+        hits = top.setdefault(fields[0].split(";size=")[0], [])
+        if len(hits) < k:
+            hits.append(fields[1])
+    return top
+
+def write_tsv(path, rows):
+    path.write_text("".join("\t".join(fields) + "\n" for fields in rows))
+    return str(path)
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5])
+@pytest.mark.parametrize("seed", range(3))
+def test_collect_top_k_hits_matches_brute_force(logger, seed, k):
+    rows = random_rows(seed)
+    top = collect_top_k_hits([list(f) for f in rows], k, logger)
+    assert {q: [h.sseqid for h in hits] for q, hits in top.items()} == brute_force_top_k(rows, k)
+    assert all(h.qseqid == q for q, hits in top.items() for h in hits)
+    best = collect_top_hits([list(f) for f in rows], {}, logger)
+    assert {q: h.sseqid for q, h in best.items()} == {q: hits[0].sseqid for q, hits in top.items()}
+
+def test_collect_top_k_hits_skips_incomplete_rows(logger, caplog):
+    rows = random_rows(0, n_rows=5) + [["q0", "short"]]
+    assert sum(len(hits) for hits in collect_top_k_hits(rows, 10, logger).values()) == 5
+    assert "Skipping incomplete VSEARCH line" in caplog.text
+
+def test_tied_top_hits(logger):
+    rows = random_rows(1)
+    for hits in collect_top_k_hits(rows, 50, logger).values():
+        key = VsearchHit.rank_key(hits[0].evalue, hits[0].pident, hits[0].length)
+        tied = tied_top_hits(hits)
+        assert tied == [h for h in hits if VsearchHit.rank_key(h.evalue, h.pident, h.length) == key]
+        assert tied[0] is hits[0]
+    assert tied_top_hits([]) == []
+
+@pytest.mark.parametrize("chunksize", [2, 7, 1000])
+@pytest.mark.parametrize("k", [1, 3])
+def test_load_best_hits_frame_top_k(tmp_path, logger, chunksize, k):
+    rows = random_rows(2, n_rows=120)
+    frame = load_best_hits_frame(write_tsv(tmp_path / "hits.tsv", rows), logger, chunksize=chunksize, top_k=k)
+    top = collect_top_k_hits([list(f) for f in rows], k, logger)
+    assert dict(zip(frame["qseqid"], frame["sseqid"])) == {q: hits[0].sseqid for q, hits in top.items()}
+    if k == 1:
+        assert "tied_sseqids" not in frame.columns
+    else:
+        tied = {q: [h.sseqid for h in tied_top_hits(hits)] for q, hits in top.items()}
+        assert dict(zip(frame["qseqid"], frame["tied_sseqids"])) == tied
+
+def test_load_best_hits_frame_empty(tmp_path, logger):
+    frame = load_best_hits_frame(write_tsv(tmp_path / "hits.tsv", []), logger, top_k=3)
+    assert frame.empty and "tied_sseqids" in frame.columns
+
+GENUS = "Bacteria;Firmicutes;Bacilli;Lactobacillales;Lactobacillaceae;Lactobacillus"
+LINEAGES = {
+    "q1": f"{GENUS};acidophilus",
+    "q2": f"{GENUS};casei",
+    "s1": f"{GENUS};acidophilus",
+    "s2": f"{GENUS};acidophilus",
+    "s3": f"{GENUS};casei",
+    "s5": f"{GENUS};casei",
+    "s4": "Bacteria;Firmicutes;Bacilli;Lactobacillales;Streptococcaceae;Streptococcus;mutans",
+}
+
+# query, subject, pident, evalue: q1 ties across species, q2 ties within one lineage.
+TIED_ROWS = [
+    ("q1", "s1", "100.0", "1e-50"),
+    ("q1", "s3", "100.0", "1e-50"),
+    ("q1", "s4", "99.0", "1e-50"),   # worse, not tied
+    ("q2", "s3", "99.0", "1e-50"),
+    ("q2", "s5", "99.0", "1e-50"),
+    ("q2", "s4", "99.0", "1e-40"),   # worse e-value, not tied
+]
+
+def test_summarize_frame_ambiguous(tmp_path, logger):
+    expected = {seq_id: Taxonomy(lineage) for seq_id, lineage in LINEAGES.items()}
+    rows = [[q, s, p, "150", "0", "0", "1", "150", "1", "150", e, "250"] for q, s, p, e in TIED_ROWS]
+    ranked = collect_top_k_hits([list(f) for f in rows], 5, logger, expected)
+    frame = load_best_hits_frame(write_tsv(tmp_path / "hits.tsv", rows), logger, top_k=5)
+
+    for hits in (ranked, frame):
+        summary = summarize_frame(expected, {"q1", "q2"}, hits, logger).set_index("sequence_id")
+        assert summary.loc["q1", "ambiguous"] and summary.loc["q1", "tied_taxa"] == 2
+        # The shallowest tied match decides the rank.
+        assert summary.loc["q1", "deepest_rank"] == "genus"
+        assert not summary.loc["q1", "differentiable"]
+        assert summary.loc["q1", "top_vsearch_sseqid"] == "s1"
+        assert not summary.loc["q2", "ambiguous"] and summary.loc["q2", "tied_taxa"] == 1
+        assert summary.loc["q2", "differentiable"]
+        assert not summary.loc["s1", "ambiguous"] and summary.isna().loc["s1", "tied_taxa"]
+
+    single = summarize_frame(expected, {"q1", "q2"}, load_best_hits_frame(str(tmp_path / "hits.tsv"), logger), logger)
+    assert not single["ambiguous"].any()
+    assert single.set_index("sequence_id").loc["q1", "differentiable"]
+# ---